@@ -0,0 +1,68 @@
+"""Measures instruction fetch throughput of MipsProgram.
+
+Compares the predecoded fetch, which issues an InFlightInstruction referencing the shared
+decoded opcode, against the previous fetch which deep copied the opcode and its operands.
+
+   python benchmarks/fetch_benchmark.py --fetches 200000
+"""
+import argparse
+import sys
+import time
+from copy import deepcopy
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'simulator'))
+
+from mips_virtualization.assembler import preprocess, assemble
+from lib.generics.mipsprogram import MipsProgram
+from lib.generics.vcpu import VCpu
+
+WORKLOADS = {
+   'BNEZ (2 operands)': "BNEZ R1, #0",
+   'LD (2 operands)': "LD R2, 8(R1)",
+   'DADD (3 operands)': "DADD R3, R2, R1",
+}
+
+class DeepCopyProgram(MipsProgram):
+   "Fetch as implemented before predecoding, kept here as the baseline"
+   def next_instruction(self, vcpu: VCpu):
+      pc = vcpu.get_pc()
+
+      if pc.value >= len(self.opcodes):
+         self.is_finished = True
+         return None
+
+      vcpu.set_pc(pc.value + 1)
+      copy = deepcopy(self.opcodes[pc.value])
+      copy.exe_id = self.exe_id
+      self.exe_id += 1
+      return copy
+
+def fetches_per_second(program: MipsProgram, fetches: int) -> float:
+   vcpu = VCpu({}, {}, 992)
+   length = len(program.opcodes)
+
+   start = time.perf_counter()
+   for _ in range(fetches // length):
+      vcpu.set_pc(0)
+      for _ in range(length):
+         program.next_instruction(vcpu)
+   elapsed = time.perf_counter() - start
+
+   return (fetches // length) * length / elapsed
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark MipsProgram instruction fetch.")
+   parser.add_argument('--fetches', type=int, default=200000, help='Number of fetches per measurement.')
+   parser.add_argument('--length', type=int, default=64, help='Number of instructions in each program.')
+   args = parser.parse_args()
+
+   print(f"{'workload':<20} {'deepcopy fetch/s':>18} {'predecoded fetch/s':>20} {'speedup':>8}")
+   for name, line in WORKLOADS.items():
+      opcodes = assemble(preprocess([line] * args.length))
+      before = fetches_per_second(DeepCopyProgram(opcodes), args.fetches)
+      after = fetches_per_second(MipsProgram(opcodes), args.fetches)
+      print(f"{name:<20} {before:>18,.0f} {after:>20,.0f} {after / before:>7.1f}x")
+
+if __name__ == '__main__':
+   main()
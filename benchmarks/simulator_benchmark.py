@@ -0,0 +1,232 @@
+"""Measures VCpuSimulator throughput on synthetic workloads.
+
+Each workload is generated from the scale, assembled and simulated to completion in its own
+process so peak memory is measured per workload. Results are written as JSON with sorted
+keys, and compared against a stored baseline to flag regressions.
+
+   python benchmarks/simulator_benchmark.py --output baseline.json
+   python benchmarks/simulator_benchmark.py --compare baseline.json --threshold 0.1
+"""
+from array import array
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'simulator'))
+
+from mips_virtualization.assembler import preprocess, assemble
+from mips_virtualization.impl.mips_stage import DEFAULT_PROFILE, PIPELINE_CORES, build_pipeline
+from lib.vcpu_simulator import VCpuSimulator, StreamingPipelineLogger, SimulationStatus
+from lib.generics.memory import FlatMemory
+from lib.generics.register import Register
+from lib.generics.vcpu import VCpu
+
+RESULTS_VERSION = 1
+DEFAULT_MAX_MEMORY_ADDR = 992
+
+class Workload():
+   """Program, initial registers and memory size of a benchmark, image_words is the number
+   of words of a memory image loaded before simulating, 0 for none
+   """
+   def __init__(self, code: List[str], registers: Dict[str, int], max_mem_addr: int = DEFAULT_MAX_MEMORY_ADDR, image_words: int = 0):
+      self.code = code
+      self.registers = registers
+      self.max_mem_addr = max_mem_addr
+      self.image_words = image_words
+
+def load_store_chain(scale: float) -> Workload:
+   "straight line LD/DADD/SD triples, each DADD waits for its load"
+   triples = max(1, int(2000 * scale))
+   code = []
+   for i in range(triples):
+      code += [f"LD R2, {i % 64}(R1)", "DADD R3, R2, R4", f"SD R3, {i % 64}(R1)"]
+   return Workload(code, {'R1': 128, 'R4': 3})
+
+def branch_loop(scale: float) -> Workload:
+   "two instruction loop, every iteration flushes the pipeline"
+   return Workload(["LOOP: SUB R1, R1, R2", "BNEZ R1, LOOP"], {'R1': max(1, int(5000 * scale)), 'R2': 1})
+
+def hazard_dense(scale: float) -> Workload:
+   "every instruction depends on the one before it, mostly through loads"
+   blocks = max(1, int(1500 * scale))
+   code = []
+   for _ in range(blocks):
+      code += ["LD R2, 0(R1)", "DADD R2, R2, R3", "SD R2, 8(R1)", "LD R5, 8(R1)", "SUB R6, R5, R2"]
+   return Workload(code, {'R1': 16, 'R3': 1})
+
+def hazard_free(scale: float) -> Workload:
+   "independent instructions which never stall"
+   instructions = max(1, int(6000 * scale))
+   code = [f"DADD R{1 + i % 8}, R{20 + i % 8}, R{28 + i % 4}" for i in range(instructions)]
+   return Workload(code, {})
+
+def large_memory(scale: float) -> Workload:
+   "loop striding loads and stores across a large memory image"
+   words = max(1024, int((1 << 20) * scale))
+   iterations = max(1, int(2000 * scale))
+   code = [
+      "LOOP: LD R2, 0(R1)",
+      "      DADD R2, R2, R3",
+      "      SD R2, 0(R1)",
+      "      DADD R1, R1, R5",
+      "      SUB R4, R4, R3",
+      "      BNEZ R4, LOOP"
+   ]
+   stride = max(1, (words - 1) // iterations)
+   return Workload(code, {'R3': 1, 'R4': iterations, 'R5': stride}, words - 1, words)
+
+WORKLOADS: Dict[str, Callable[[float], Workload]] = {
+   'load_store_chain': load_store_chain,
+   'branch_loop': branch_loop,
+   'hazard_dense': hazard_dense,
+   'hazard_free': hazard_free,
+   'large_memory': large_memory
+}
+
+def write_image(path: Path, words: int):
+   "writes an image of consecutive word values"
+   with open(path, 'wb') as f:
+      chunk = 1 << 16
+      for first in range(0, words, chunk):
+         f.write(array('q', range(first, min(first + chunk, words))).tobytes())
+
+def run_workload(workload: Workload, use_scoreboard: bool, forwarding: str = 'full', core: str = 'arrays') -> dict:
+   "simulates the workload to completion and returns its measurements"
+   with tempfile.TemporaryDirectory() as directory:
+      image_path = Path(directory) / 'image.bin'
+      if workload.image_words:
+         write_image(image_path, workload.image_words)
+
+      start = time.perf_counter()
+      opcodes = assemble(preprocess(list(workload.code)))
+      memory = FlatMemory(workload.max_mem_addr)
+      if workload.image_words:
+         memory.load_image(image_path)
+      vcpu = VCpu({name: Register(value) for name, value in workload.registers.items()}, memory, workload.max_mem_addr)
+      logger = StreamingPipelineLogger(os.devnull)
+      stages = build_pipeline(DEFAULT_PROFILE, use_scoreboard, DEFAULT_PROFILE.forwarding_network(forwarding), core)
+      simulator = VCpuSimulator(vcpu, stages, logger)
+      simulator.load_program(opcodes)
+      startup = time.perf_counter() - start
+
+      start = time.perf_counter()
+      status = simulator.simulate(max_cycles=None)
+      elapsed = time.perf_counter() - start
+      logger.close()
+
+   if status != SimulationStatus.Finished:
+      raise AssertionError(f"Workload stopped early: {status.value}")
+
+   cycles = simulator.cycle - 1
+   instructions = simulator.program.completed
+   return {
+      'cycles': cycles,
+      'instructions': instructions,
+      'seconds': elapsed,
+      'cycles_per_second': cycles / elapsed,
+      'instructions_per_second': instructions / elapsed,
+      'startup_seconds': startup,
+      'peak_memory_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+   }
+
+def measure(name: str, scale: float, repeat: int, use_scoreboard: bool, forwarding: str = 'full', core: str = 'arrays') -> dict:
+   "runs the workload repeat times in a new process each, keeping the fastest run and the largest peak memory"
+   runs = []
+   for _ in range(repeat):
+      command = [sys.executable, __file__, '--worker', name, '--scale', str(scale), '--forwarding', forwarding, '--core', core]
+      if not use_scoreboard:
+         command.append('--recursive-hazards')
+      result = subprocess.run(command, stdout=subprocess.PIPE, check=True, text=True)
+      runs.append(json.loads(result.stdout))
+
+   best = min(runs, key=lambda run: run['seconds'])
+   best['startup_seconds'] = min(run['startup_seconds'] for run in runs)
+   best['peak_memory_bytes'] = max(run['peak_memory_bytes'] for run in runs)
+   return best
+
+# metric name: True if larger values are better
+COMPARED_METRICS = {
+   'cycles_per_second': True,
+   'instructions_per_second': True,
+   'startup_seconds': False,
+   'peak_memory_bytes': False
+}
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+   "returns a description of every metric which is more than threshold worse than the baseline"
+   regressions = []
+   for name, workload in results['workloads'].items():
+      if name not in baseline['workloads']:
+         continue
+      for metric, larger_is_better in COMPARED_METRICS.items():
+         before = baseline['workloads'][name][metric]
+         after = workload[metric]
+         if before <= 0:
+            continue
+         change = (after - before) / before
+         if (larger_is_better and change < -threshold) or (not larger_is_better and change > threshold):
+            regressions.append(f"{name} {metric}: {before:,.4g} -> {after:,.4g} ({change:+.1%})")
+   return regressions
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark VCpuSimulator throughput on synthetic workloads.")
+   parser.add_argument('--workloads', nargs='+', choices=list(WORKLOADS.keys()), default=list(WORKLOADS.keys()), help='Workloads to run, all by default.')
+   parser.add_argument('--scale', type=float, default=1.0, help='Multiplies the size of every workload.')
+   parser.add_argument('--repeat', type=int, default=3, help='Number of runs per workload, the fastest is reported.')
+   parser.add_argument('--recursive-hazards', action='store_true', help='Detect hazards by recursing through the stages instead of the scoreboard.')
+   parser.add_argument('--forwarding', choices=DEFAULT_PROFILE.forwarding_networks, default='full', help='Forwarding network of the pipeline, compare the cycles of the workloads across networks.')
+   parser.add_argument('--core', choices=PIPELINE_CORES, default='arrays', help='Pipeline core, arrays simulates whole cycles over arrays of the stage state, stages ticks linked stages.')
+   parser.add_argument('--output', type=Path, default=None, help='Path to write the JSON results to, printed otherwise.')
+   parser.add_argument('--compare', type=Path, default=None, help='Baseline results to compare against, exits with status 1 on a regression.')
+   parser.add_argument('--threshold', type=float, default=0.1, help='Relative change of a metric reported as a regression.')
+   parser.add_argument('--worker', choices=list(WORKLOADS.keys()), default=None, help=argparse.SUPPRESS)
+   args = parser.parse_args()
+
+   if args.worker is not None:
+      print(json.dumps(run_workload(WORKLOADS[args.worker](args.scale), not args.recursive_hazards, args.forwarding, args.core)))
+      return
+
+   results = {
+      'version': RESULTS_VERSION,
+      'python': platform.python_version(),
+      'platform': platform.platform(),
+      'scale': args.scale,
+      'repeat': args.repeat,
+      'hazard_detection': 'recursive' if args.recursive_hazards else 'scoreboard',
+      'forwarding': args.forwarding,
+      'core': args.core,
+      'workloads': {}
+   }
+   for name in args.workloads:
+      results['workloads'][name] = measure(name, args.scale, args.repeat, not args.recursive_hazards, args.forwarding, args.core)
+      workload = results['workloads'][name]
+      print(
+         f"{name:<18} {workload['cycles']:>10,} cycles {workload['cycles_per_second']:>12,.0f} cycles/s {workload['instructions_per_second']:>12,.0f} instr/s "
+         f"{workload['startup_seconds'] * 1000:>8.1f} ms startup {workload['peak_memory_bytes'] / 2**20:>7.1f} MiB peak",
+         file=sys.stderr
+      )
+
+   output = json.dumps(results, indent=2, sort_keys=True)
+   if args.output is not None:
+      args.output.write_text(output + '\n')
+   else:
+      print(output)
+
+   if args.compare is not None:
+      regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+      for regression in regressions:
+         print(f"REGRESSION {regression}", file=sys.stderr)
+      if regressions:
+         sys.exit(1)
+      print(f"No regressions against {args.compare}", file=sys.stderr)
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,215 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from glob import glob
+from io import StringIO
+from itertools import repeat
+from pathlib import Path
+from typing import Dict, List, Tuple
+import math
+import os
+import time
+
+from simulation import simulate, simulate_lockstep
+from input_parser import load_toml, get_code
+from lib.vcpu_simulator import SimulationStatus
+
+INPUT_SUFFIX = '.toml'
+OUTPUT_SUFFIX = '.txt'
+
+# options of simulate which simulate_lockstep takes, the others only apply to pipeline mode
+LOCKSTEP_OPTIONS = ('max_cycles', 'timeout', 'memory_backend', 'program_cache', 'pipeline', 'trace_format')
+
+class BatchJob():
+   """Input file to simulate and the path its output is written to
+   """
+   def __init__(self, input: Path, output: Path):
+      self.input = Path(input)
+      self.output = Path(output)
+
+   def __repr__(self):
+      return f"BatchJob({self.input}, {self.output})"
+
+class BatchResult():
+   """Outcome of a single job, error is None if the simulation succeeded. A successful
+   simulation may still have been stopped by its cycle budget or timeout, see status
+   """
+   def __init__(self, job: BatchJob, wall_time: float, error: str = None, status: SimulationStatus = None):
+      self.job = job
+      self.wall_time = wall_time
+      self.error = error
+      self.status = status
+
+   @property
+   def passed(self) -> bool:
+      return self.error is None
+
+def output_path(input: Path, output_dir: Path = None) -> Path:
+   "returns the output path of an input, input_x.toml is written to output_x.txt next to the input unless output_dir is given"
+   stem = input.stem
+   if stem.startswith('input'):
+      stem = 'output' + stem[len('input'):]
+   else:
+      stem = stem + '_output'
+
+   directory = input.parent if output_dir is None else Path(output_dir)
+   return directory / (stem + OUTPUT_SUFFIX)
+
+def read_manifest(path: Path) -> List[BatchJob]:
+   """reads a manifest listing one 'input output' pair per line, relative paths are relative to the manifest.
+   Blank lines and lines starting with # are ignored, otherwise throws exception if a line is not a pair
+   """
+   jobs = []
+   with open(path) as f:
+      for line_number, line in enumerate(f, 1):
+         line = line.strip()
+         if line == '' or line.startswith('#'):
+            continue
+
+         paths = line.split()
+         if len(paths) != 2:
+            raise AssertionError(f"Manifest {path} line {line_number} is not an input output pair: \"{line}\"")
+         jobs.append(BatchJob(path.parent / paths[0], path.parent / paths[1]))
+
+   return jobs
+
+def collect_jobs(sources: List[str], output_dir: Path = None) -> List[BatchJob]:
+   """returns the jobs of each source, a source is either a directory whose .toml files are simulated,
+   a glob pattern of input files, a single input file or a manifest of input output pairs.
+   Throws exception if a source matches no inputs or two jobs would write the same output
+   """
+   jobs = []
+   for source in sources:
+      path = Path(source)
+      if path.is_dir():
+         inputs = sorted(path.glob('*' + INPUT_SUFFIX))
+      elif path.is_file() and path.suffix != INPUT_SUFFIX:
+         jobs.extend(read_manifest(path))
+         continue
+      else:
+         inputs = sorted(Path(match) for match in glob(source))
+
+      if not inputs:
+         raise AssertionError(f"Batch source {source} does not match any input files")
+      jobs.extend(BatchJob(input, output_path(input, output_dir)) for input in inputs)
+
+   outputs = set()
+   for job in jobs:
+      output = job.output.resolve()
+      if output in outputs:
+         raise AssertionError(f"Multiple batch jobs write to {job.output}")
+      outputs.add(output)
+
+   return jobs
+
+def run_job(job: BatchJob, options: dict) -> BatchResult:
+   """simulates a single job, failures are reported in the result instead of raised so they don't stop the batch.
+   Anything printed by the simulation is captured, the assembler reports source errors by printing then exiting
+   """
+   messages = StringIO()
+   start = time.perf_counter()
+   error = None
+   status = None
+   try:
+      job.output.parent.mkdir(parents=True, exist_ok=True)
+      with redirect_stdout(messages):
+         status = simulate(job.input, job.output, **options)
+   except SystemExit:
+      error = ' '.join(messages.getvalue().split('\n')).strip() or 'simulation exited'
+   except Exception as e:
+      error = f"{type(e).__name__}: {e}"
+
+   return BatchResult(job, time.perf_counter() - start, error, status)
+
+def lockstep_groups(jobs: List[BatchJob], workers: int) -> List[List[int]]:
+   """returns the indices of the jobs grouped by the code of their input, each group split across the workers.
+   Jobs whose input can't be read are a group of their own, so their error is reported by simulate
+   """
+   groups: Dict[Tuple[str, ...], List[int]] = {}
+   single = []
+   for idx, job in enumerate(jobs):
+      try:
+         code = tuple(line.strip() for line in get_code(load_toml(job.input)).strip().split('\n'))
+      except Exception:
+         single.append([idx])
+         continue
+      groups.setdefault(code, []).append(idx)
+
+   split = []
+   for group in groups.values():
+      size = math.ceil(len(group) / workers)
+      split.extend(group[start:start + size] for start in range(0, len(group), size))
+   return split + single
+
+def run_lockstep_group(jobs: List[BatchJob], options: dict) -> List[BatchResult]:
+   """simulates jobs sharing their code together with simulate_lockstep, the wall time is shared evenly between them.
+   If the group fails its jobs are rerun one by one, so only the failing jobs are reported as failed
+   """
+   messages = StringIO()
+   start = time.perf_counter()
+   try:
+      for job in jobs:
+         job.output.parent.mkdir(parents=True, exist_ok=True)
+      lockstep_options = {name: value for name, value in options.items() if name in LOCKSTEP_OPTIONS}
+      with redirect_stdout(messages):
+         statuses = simulate_lockstep([job.input for job in jobs], [job.output for job in jobs], **lockstep_options)
+   except (SystemExit, Exception):
+      return [run_job(job, options) for job in jobs]
+
+   wall_time = (time.perf_counter() - start) / len(jobs)
+   return [BatchResult(job, wall_time, status=status) for job, status in zip(jobs, statuses)]
+
+def run_batch(jobs: List[BatchJob], workers: int = None, lockstep: bool = False, **options) -> List[BatchResult]:
+   """simulates the jobs across a pool of worker processes, by default one per cpu, and returns the results in job order.
+   A single worker runs the jobs in this process. Options are passed to simulate.
+
+   lockstep simulates the jobs running the same code together in functional mode with
+   simulate_lockstep, a group of jobs per worker task instead of a job.
+   """
+   if workers is None:
+      workers = os.cpu_count() or 1
+   if workers < 1:
+      raise AssertionError(f"Batch needs at least 1 worker, got {workers}")
+
+   if lockstep:
+      if options.get('mode', 'pipeline') != 'functional':
+         raise AssertionError(f"Lockstep batches are only supported in functional mode, not {options.get('mode', 'pipeline')} mode")
+      groups = lockstep_groups(jobs, workers)
+      group_jobs = [[jobs[idx] for idx in group] for group in groups]
+      if workers == 1 or len(groups) <= 1:
+         group_results = [run_lockstep_group(group, options) for group in group_jobs]
+      else:
+         with ProcessPoolExecutor(max_workers=workers) as executor:
+            group_results = list(executor.map(run_lockstep_group, group_jobs, repeat(options)))
+
+      results = [None] * len(jobs)
+      for group, group_result in zip(groups, group_results):
+         for idx, result in zip(group, group_result):
+            results[idx] = result
+      return results
+
+   if workers == 1 or len(jobs) <= 1:
+      return [run_job(job, options) for job in jobs]
+
+   # hand out several small jobs at once so the pool isn't dominated by inter-process overhead
+   chunksize = max(1, len(jobs) // (workers * 4))
+   with ProcessPoolExecutor(max_workers=workers) as executor:
+      return list(executor.map(run_job, jobs, repeat(options), chunksize=chunksize))
+
+def format_summary(results: List[BatchResult], wall_time: float) -> str:
+   "returns a line per job with its wall time followed by the totals"
+   lines = []
+   for result in results:
+      if result.passed:
+         stopped = '' if result.status == SimulationStatus.Finished else f" ({result.status.value})"
+         lines.append(f"ok   {result.wall_time:8.3f}s {result.job.input} -> {result.job.output}{stopped}")
+      else:
+         lines.append(f"FAIL {result.wall_time:8.3f}s {result.job.input}: {result.error}")
+
+   failed = sum(1 for result in results if not result.passed)
+   stopped = sum(1 for result in results if result.passed and result.status != SimulationStatus.Finished)
+   job_time = sum(result.wall_time for result in results)
+   lines.append(
+      f"{len(results)} jobs, {len(results) - failed} passed, {failed} failed, {stopped} stopped early, "
+      f"{job_time:.3f}s simulating, {wall_time:.3f}s wall time"
+   )
+   return '\n'.join(lines)
@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple, Union
 from pathlib import Path
 import toml
 from lib.generics.register import Register
@@ -31,3 +31,63 @@ def get_initial_register_state(tomlContents: dict) -> Dict[str, Register]:
 def get_code(tomlContents: dict) -> List[str]:
    CODE_KEY = 'code'
    return tomlContents[CODE_KEY]['code']
+
+UNLIMITED_CYCLES = 'unlimited'
+
+def parse_cycle_budget(value: Union[int, str]) -> Union[int, str]:
+   "returns a positive number of cycles or 'unlimited', otherwise throws exception"
+   if isinstance(value, str):
+      if value.strip().lower() == UNLIMITED_CYCLES:
+         return UNLIMITED_CYCLES
+      if not value.strip().isdigit():
+         raise AssertionError(f"Cycle budget {value} is not a number of cycles or '{UNLIMITED_CYCLES}'")
+      value = int(value)
+
+   if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+      raise AssertionError(f"Cycle budget {value} is not a positive number of cycles or '{UNLIMITED_CYCLES}'")
+   return value
+
+def parse_timeout(value: Union[int, float, str]) -> float:
+   "returns a positive number of seconds, otherwise throws exception"
+   try:
+      seconds = float(value)
+   except (TypeError, ValueError):
+      raise AssertionError(f"Timeout {value} is not a number of seconds")
+
+   if not seconds > 0:
+      raise AssertionError(f"Timeout {value} is not a positive number of seconds")
+   return seconds
+
+def get_simulation_options(tomlContents: dict) -> dict:
+   "returns the max_cycles and timeout set in the optional simulation table"
+   SIMULATION_KEY = 'simulation'
+
+   options = {}
+   simulation_values = tomlContents.get(SIMULATION_KEY, {})
+
+   if 'max_cycles' in simulation_values:
+      options['max_cycles'] = parse_cycle_budget(simulation_values['max_cycles'])
+   if 'timeout' in simulation_values:
+      options['timeout'] = parse_timeout(simulation_values['timeout'])
+
+   return options
+
+CORES_KEY = 'cores'
+
+def is_multicore(tomlContents: dict) -> bool:
+   "True if the input describes several cores sharing the memory in [[cores]] tables"
+   return CORES_KEY in tomlContents
+
+def get_cores(tomlContents: dict) -> List[Tuple[Dict[str, Register], str]]:
+   """returns the initial registers and the code of each core in the [[cores]] tables, otherwise
+   throws exception if a core has no code
+   """
+   cores = []
+   for idx, core in enumerate(tomlContents[CORES_KEY]):
+      if 'code' not in core:
+         raise AssertionError(f"Core {idx} has no code")
+      registers = {key: Register(value) for key, value in core.get('registers', {}).items()}
+      cores.append((registers, core['code']))
+   if not cores:
+      raise AssertionError("Multi-core input has no [[cores]] tables")
+   return cores
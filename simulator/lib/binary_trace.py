@@ -0,0 +1,238 @@
+from pathlib import Path
+from typing import Iterator, List, Tuple
+import mmap
+import struct
+
+from lib.vcpu_simulator import PipelineLogger
+from lib.generics.mipsprogram import MipsProgram
+from lib.generics.pipelinestage import PipelineStage
+
+TRACE_MAGIC = b'MIPSTRCE'
+TRACE_VERSION = 1
+TRACE_HEADER = '<IIH' # version, stage slots, length of the stage names
+TRACE_FOOTER = '<QQ' # number of cycle records, length of the final state text
+RECORD_HEADER = '<QI' # cycle, bitmask of the stalled slots
+SLOT = 'I' # exe_id of the instruction in the stage, 0 for none
+
+class TraceRecord():
+   """One cycle of a binary trace, exe_ids and stalled flags by stage slot
+   """
+   def __init__(self, cycle: int, stalled: int, exe_ids: Tuple[int, ...]):
+      self.cycle = cycle
+      self.stalled = stalled
+      self.exe_ids = exe_ids
+
+   def slots(self, stage_names: List[str]) -> List[Tuple[int, str, bool]]:
+      "returns (exe_id, stage, stalled) of every stage holding an instruction, in log order"
+      return [
+         (exe_id, stage_names[idx], bool(self.stalled >> idx & 1))
+         for idx, exe_id in enumerate(self.exe_ids) if exe_id != 0
+      ]
+
+def record_struct(stage_count: int) -> struct.Struct:
+   return struct.Struct(RECORD_HEADER + SLOT * stage_count)
+
+def header_bytes(stage_names: List[str]) -> bytes:
+   names = ','.join(stage_names).encode()
+   return TRACE_MAGIC + struct.pack(TRACE_HEADER, TRACE_VERSION, len(stage_names), len(names)) + names
+
+class BinaryPipelineLogger(PipelineLogger):
+   """Writes the cycles to the output file as fixed size records while the simulation runs,
+   instead of the text lines of StreamingPipelineLogger
+
+   The file holds the magic, a header naming the stage of each slot in the order the text
+   lines list them, then per cycle its number, a bitmask of the stalled slots and the exe_id in
+   each slot, 0 for none or a noop. write_to_file appends the REGISTERS, MEMORY and STATISTICS
+   text and a footer with the number of records. Records have a fixed size and increasing
+   cycles, so TraceReader finds a cycle by seeking without an index of its own.
+
+   A logger resuming at a position keeps the first position bytes of an existing trace, which
+   must hold the header and cycles logged up to that position, like StreamingPipelineLogger.
+   """
+   def __init__(self, filepath: Path, chunk_records: int = 1024, position: int = None):
+      PipelineLogger.__init__(self)
+      self.filepath = Path(filepath)
+      self.chunk_records = chunk_records
+      self.buffer = bytearray()
+      self.buffered = 0
+      self.record = None # layout of the records, known once the header is written
+      self.header_size = 0
+      if position is None:
+         self.file = open(self.filepath, 'wb')
+      else:
+         if not self.filepath.is_file() or self.filepath.stat().st_size < position:
+            raise AssertionError(f"{self.filepath} does not hold the {position} bytes of cycles logged before resuming")
+         with open(self.filepath, 'r+b') as f:
+            f.truncate(position)
+            if position > 0:
+               self.header_size, stage_names = read_header_from(f)
+               self.record = record_struct(len(stage_names))
+         self.file = open(self.filepath, 'ab')
+
+   def start(self, stage_names: List[str]):
+      "writes the header naming the stages of the slots"
+      header = header_bytes(stage_names)
+      self.file.write(header)
+      self.header_size = len(header)
+      self.record = record_struct(len(stage_names))
+
+   def log(self, cycle: int, program: MipsProgram, stages: List[PipelineStage]):
+      if self.record is None:
+         self.start([stage.stage_id.name for stage in stages])
+      stalled = 0
+      exe_ids = []
+      for idx, stage in enumerate(stages):
+         instruction = stage.instruction
+         if instruction is None or instruction.noop:
+            exe_ids.append(0)
+            continue
+         exe_ids.append(instruction.exe_id)
+         if stage.stalled:
+            stalled |= 1 << idx
+      self.buffer += self.record.pack(cycle, stalled, *exe_ids)
+      self.buffered += 1
+      if self.buffered >= self.chunk_records:
+         self.flush()
+
+   def write_to_file(self, filepath: Path):
+      "completes the trace with the final registers and memory, filepath must be the file streamed to"
+      if Path(filepath) != self.filepath:
+         raise AssertionError(f"Binary logger writes to {self.filepath}, not {filepath}")
+
+      if self.record is None: # no cycle logged, the header has no stages
+         self.start([])
+      self.flush()
+      records = (self.file.tell() - self.header_size) // self.record.size
+
+      final_state = ['REGISTERS\n'] + self.registers + ['MEMORY\n'] + self.memory
+      if self.statistics:
+         final_state += ['STATISTICS\n'] + self.statistics
+      text = ''.join(final_state).encode()
+      self.file.write(text)
+      self.file.write(struct.pack(TRACE_FOOTER, records, len(text)))
+      self.close()
+
+   def position(self) -> int:
+      "returns the number of bytes of the header and cycles logged, everything logged so far is written first"
+      self.flush()
+      return self.file.tell()
+
+   def flush(self):
+      if not self.file.closed:
+         self.file.write(self.buffer)
+         self.buffer.clear()
+         self.buffered = 0
+         self.file.flush()
+
+   def close(self):
+      if not self.file.closed:
+         self.flush()
+         self.file.close()
+
+def read_header(data) -> Tuple[int, List[str]]:
+   "returns the size of the header and the stage names of a trace, otherwise throws exception"
+   fixed_size = len(TRACE_MAGIC) + struct.calcsize(TRACE_HEADER)
+   if len(data) < fixed_size or bytes(data[:len(TRACE_MAGIC)]) != TRACE_MAGIC:
+      raise AssertionError("not a binary trace")
+   version, count, names_length = struct.unpack_from(TRACE_HEADER, data, len(TRACE_MAGIC))
+   if version != TRACE_VERSION:
+      raise AssertionError(f"binary trace version {version}, only version {TRACE_VERSION} is supported")
+   names = bytes(data[fixed_size:fixed_size + names_length]).decode()
+   stage_names = names.split(',') if count else []
+   return fixed_size + names_length, stage_names
+
+def read_header_from(f) -> Tuple[int, List[str]]:
+   "reads the header at the start of an open trace"
+   header = f.read(len(TRACE_MAGIC) + struct.calcsize(TRACE_HEADER))
+   if len(header) == len(TRACE_MAGIC) + struct.calcsize(TRACE_HEADER):
+      header += f.read(struct.unpack_from(TRACE_HEADER, header, len(TRACE_MAGIC))[2])
+   return read_header(header)
+
+class TraceReader():
+   """Random access to the cycles of a completed binary trace, read through a memory map
+
+   Records are found by cycle with a seek, cycles are logged one after the other, falling back
+   to a binary search over the increasing cycles.
+   """
+   def __init__(self, path: Path):
+      self.path = Path(path)
+      with open(self.path, 'rb') as f:
+         if f.seek(0, 2) == 0:
+            raise AssertionError(f"{self.path}: not a binary trace")
+         self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      try:
+         self.header_size, self.stage_names = read_header(self.map)
+         footer_size = struct.calcsize(TRACE_FOOTER)
+         if len(self.map) < self.header_size + footer_size:
+            raise AssertionError("binary trace is incomplete")
+         self.records, text_length = struct.unpack_from(TRACE_FOOTER, self.map, len(self.map) - footer_size)
+         self.record = record_struct(len(self.stage_names))
+         self.text_offset = self.header_size + self.records * self.record.size
+         if self.text_offset + text_length + footer_size != len(self.map):
+            raise AssertionError("binary trace is incomplete")
+      except AssertionError as e:
+         self.map.close()
+         raise AssertionError(f"{self.path}: {e}")
+
+   def __len__(self) -> int:
+      return self.records
+
+   def __getitem__(self, idx: int) -> TraceRecord:
+      "returns the idx-th record"
+      if not 0 <= idx < self.records:
+         raise IndexError(f"record {idx} not in the {self.records} records of {self.path}")
+      cycle, stalled, *exe_ids = self.record.unpack_from(self.map, self.header_size + idx * self.record.size)
+      return TraceRecord(cycle, stalled, tuple(exe_ids))
+
+   def __iter__(self) -> Iterator[TraceRecord]:
+      for values in self.record.iter_unpack(memoryview(self.map)[self.header_size:self.text_offset]):
+         yield TraceRecord(values[0], values[1], values[2:])
+
+   def index(self, cycle: int) -> int:
+      "returns the index of the first record of the cycle or a later one, len(self) if there is none"
+      if self.records == 0:
+         return 0
+      first = struct.unpack_from('<Q', self.map, self.header_size)[0]
+      idx = cycle - first
+      if 0 <= idx < self.records and self[idx].cycle == cycle:
+         return idx
+      low, high = 0, self.records
+      while low < high:
+         middle = (low + high) // 2
+         if self[middle].cycle < cycle:
+            low = middle + 1
+         else:
+            high = middle
+      return low
+
+   def cycle(self, cycle: int) -> TraceRecord:
+      "returns the record of the cycle, None if it wasn't logged"
+      idx = self.index(cycle)
+      if idx < self.records and self[idx].cycle == cycle:
+         return self[idx]
+      return None
+
+   def final_state(self) -> str:
+      "returns the REGISTERS, MEMORY and STATISTICS text following the cycles"
+      return bytes(self.map[self.text_offset:len(self.map) - struct.calcsize(TRACE_FOOTER)]).decode()
+
+   def close(self):
+      self.map.close()
+
+def format_record(record: TraceRecord, stage_names: List[str]) -> str:
+   "returns the text line PipelineLogger logs for the cycle"
+   line = f"c#{record.cycle} "
+   for exe_id, stage, stalled in record.slots(stage_names):
+      line += f"I{exe_id}-{'stall' if stalled else stage} "
+   return line + '\n'
+
+def convert_trace(trace_path: Path, text_path: Path):
+   "writes the binary trace as the text output the simulation writes without it"
+   reader = TraceReader(trace_path)
+   try:
+      with open(text_path, 'w') as f:
+         for record in reader:
+            f.write(format_record(record, reader.stage_names))
+         f.write(reader.final_state())
+   finally:
+      reader.close()
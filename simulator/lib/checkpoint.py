@@ -0,0 +1,225 @@
+from array import array
+from pathlib import Path
+from typing import List, Tuple
+import json
+import os
+import struct
+import zlib
+
+from lib.vcpu_simulator import VCpuSimulator
+from lib.generics.inflight import InFlightInstruction
+from lib.generics.memory import Memory, DictMemory, WordMemory
+from lib.generics.pipelinestage import PipelineStage
+from lib.generics.branch_predictor import BranchPredictor
+from lib.generics.cache import Cache
+
+CHECKPOINT_MAGIC = b'MIPSCKPT'
+CHECKPOINT_VERSION = 6
+
+class Checkpoint():
+   """Complete state of a pipeline simulation between two cycles
+
+   state holds everything but the memory words as plain values, memory holds the raw contents
+   of a WordMemory: the words, the touched flags and the touch order, one after the other.
+   """
+   def __init__(self, state: dict, memory: bytes):
+      self.state = state
+      self.memory = memory
+
+   @property
+   def cycle(self) -> int:
+      "next cycle to simulate"
+      return self.state['cycle']
+
+   @property
+   def log_position(self) -> int:
+      return self.state['log_position']
+
+   @property
+   def counters(self) -> dict:
+      "state of the performance counters, None if the simulation had none"
+      return self.state.get('counters')
+
+def pipeline_order(stages: List[PipelineStage]) -> List[PipelineStage]:
+   "returns the stages from first to last, the simulator reverses its list while simulating"
+   stage = next(stage for stage in stages if stage.prev is None)
+   ordered = []
+   while stage is not None:
+      ordered.append(stage)
+      stage = stage.next
+   return ordered
+
+def instruction_state(instruction: InFlightInstruction) -> list:
+   if instruction is None:
+      return None
+   return [
+      instruction.pc,
+      instruction.exe_id,
+      instruction.is_executing,
+      instruction.stalled,
+      instruction.noop,
+      instruction.target_instruction_addr,
+      instruction.predicted_target,
+      instruction.waiting,
+      instruction.cache is not None
+   ]
+
+def predictor_state(predictor: BranchPredictor) -> dict:
+   if predictor is None:
+      return None
+   return {'name': predictor.name, 'state': predictor.state()}
+
+def cache_state(cache: Cache) -> dict:
+   return None if cache is None else cache.state()
+
+def restore_cache(cache: Cache, state: dict, name: str):
+   "restores the lines and counters of the cache, otherwise throws exception if the configurations differ"
+   saved = None if state is None else state['config']
+   config = None if cache is None else cache.config.describe()
+   if saved != config:
+      raise AssertionError(f"Checkpoint was created with the {name} configuration {saved}, the simulation uses {config}")
+   if cache is not None:
+      cache.restore(state)
+
+def memory_state(memory: Memory) -> Tuple[dict, bytes]:
+   if isinstance(memory, WordMemory):
+      touch_order = array('q', memory.touch_order)
+      state = {
+         'backend': type(memory).__name__,
+         'max_mem_addr': memory.max_mem_addr,
+         'image_loaded': memory.image_loaded
+      }
+      return state, bytes(memory.byte_view()) + bytes(memory.touched) + touch_order.tobytes()
+   if isinstance(memory, DictMemory):
+      state = {
+         'backend': type(memory).__name__,
+         'max_mem_addr': memory.max_mem_addr,
+         'values': list(memory.values.items())
+      }
+      return state, b''
+
+   raise AssertionError(f"Memory backend {type(memory).__name__} does not support checkpoints")
+
+def create_checkpoint(simulator: VCpuSimulator, program_digest: str, counters: dict = None) -> Checkpoint:
+   """captures the state of the simulator between two cycles, program_digest identifies the
+   program so it can't be restored into a different one, counters is the state of the
+   simulation's PerformanceCounters if it has any
+   """
+   memory, memory_bytes = memory_state(simulator.vcpu.memory)
+   program = simulator.program
+   state = {
+      'version': CHECKPOINT_VERSION,
+      'program_digest': program_digest,
+      'cycle': simulator.cycle,
+      'log_position': simulator.logger.position(),
+      'program': [program.exe_id, program.in_flight, program.is_finished, program.squashed],
+      'register_file': simulator.vcpu.register_file,
+      'register_names': simulator.vcpu.register_names,
+      'stages': [[stage.stalled, instruction_state(stage.instruction)] for stage in pipeline_order(simulator.stages)],
+      'memory': memory,
+      'predictor': predictor_state(program.predictor),
+      'icache': cache_state(program.icache),
+      'dcache': cache_state(program.dcache),
+      'counters': counters
+   }
+   return Checkpoint(state, memory_bytes)
+
+def save_checkpoint(path: Path, checkpoint: Checkpoint):
+   """writes the checkpoint as the magic, the version, the length of the json state and then the
+   compressed state followed by the memory. The file is replaced atomically so a crash while
+   writing leaves the previous checkpoint in place
+   """
+   state = json.dumps(checkpoint.state, separators=(',', ':')).encode()
+   path = Path(path)
+   temp_path = path.with_name(path.name + '.tmp')
+   with open(temp_path, 'wb') as f:
+      f.write(CHECKPOINT_MAGIC)
+      f.write(struct.pack('<IQ', CHECKPOINT_VERSION, len(state)))
+      f.write(zlib.compress(state + checkpoint.memory, 1))
+   os.replace(temp_path, path)
+
+def load_checkpoint(path: Path) -> Checkpoint:
+   "reads a checkpoint written by save_checkpoint, otherwise throws exception"
+   with open(path, 'rb') as f:
+      magic = f.read(len(CHECKPOINT_MAGIC))
+      header = f.read(struct.calcsize('<IQ'))
+      if magic != CHECKPOINT_MAGIC or len(header) != struct.calcsize('<IQ'):
+         raise AssertionError(f"{path} is not a checkpoint")
+      version, state_length = struct.unpack('<IQ', header)
+      if version != CHECKPOINT_VERSION:
+         raise AssertionError(f"Checkpoint {path} has version {version}, only version {CHECKPOINT_VERSION} is supported")
+      try:
+         payload = zlib.decompress(f.read())
+      except zlib.error as e:
+         raise AssertionError(f"Checkpoint {path} is corrupt: {e}")
+
+   return Checkpoint(json.loads(payload[:state_length]), payload[state_length:])
+
+def restore_memory(memory: Memory, state: dict, memory_bytes: bytes):
+   if state['backend'] != type(memory).__name__ or state['max_mem_addr'] != memory.max_mem_addr:
+      raise AssertionError(
+         f"Checkpoint holds a {state['backend']} of {state['max_mem_addr'] + 1} words, "
+         f"the simulation uses a {type(memory).__name__} of {memory.max_mem_addr + 1} words"
+      )
+
+   if isinstance(memory, WordMemory):
+      view = memory.byte_view()
+      words_length = len(view)
+      touched_length = len(memory.touched)
+      view[:] = memory_bytes[:words_length]
+      memory.touched[:] = memory_bytes[words_length:words_length + touched_length]
+      memory.touch_order = array('q', memory_bytes[words_length + touched_length:]).tolist()
+      memory.image_loaded = state['image_loaded']
+   else:
+      memory.values = {addr: value for addr, value in state['values']}
+
+def restore_checkpoint(simulator: VCpuSimulator, checkpoint: Checkpoint, program_digest: str):
+   """restores the state onto a simulator built for the same program and memory, which has
+   loaded the program and not simulated any cycle yet, otherwise throws exception
+   """
+   state = checkpoint.state
+   if state['program_digest'] != program_digest:
+      raise AssertionError("Checkpoint was created for a different program")
+   stages = pipeline_order(simulator.stages)
+   if len(state['stages']) != len(stages):
+      raise AssertionError(f"Checkpoint holds {len(state['stages'])} pipeline stages, the simulation has {len(stages)}")
+
+   vcpu = simulator.vcpu
+   restore_memory(vcpu.memory, state['memory'], checkpoint.memory)
+   vcpu.register_file[:] = state['register_file']
+   vcpu.register_names = list(state['register_names'])
+
+   program = simulator.program
+   # restoring predictions into a different predictor would change the branches flushed
+   saved_predictor = state['predictor']
+   saved_name = None if saved_predictor is None else saved_predictor['name']
+   name = None if program.predictor is None else program.predictor.name
+   if saved_name != name:
+      raise AssertionError(f"Checkpoint was created with the {saved_name} branch predictor, the simulation uses the {name} branch predictor")
+   if program.predictor is not None:
+      program.predictor.restore(saved_predictor['state'])
+   restore_cache(program.icache, state['icache'], 'icache')
+   restore_cache(program.dcache, state['dcache'], 'dcache')
+   program.exe_id, program.in_flight, program.is_finished, program.squashed = state['program']
+
+   for stage, (stalled, instruction) in zip(stages, state['stages']):
+      stage.stalled = stalled
+      if instruction is None:
+         stage.instruction = None
+         continue
+
+      pc, exe_id, is_executing, instruction_stalled, noop, target_instruction_addr, predicted_target, waiting, looks_up_cache = instruction
+      restored = InFlightInstruction(program.opcodes[pc], pc, exe_id, program.timings[pc])
+      restored.is_executing = is_executing
+      restored.stalled = instruction_stalled
+      restored.noop = noop
+      restored.target_instruction_addr = target_instruction_addr
+      if program.branches[pc]:
+         restored.predictor = program.predictor
+      restored.predicted_target = predicted_target
+      restored.waiting = waiting
+      if looks_up_cache:
+         restored.cache = program.dcache
+      stage.instruction = restored # assigned last so a scoreboard sees the restored noop flag
+
+   simulator.cycle = state['cycle']
@@ -0,0 +1,168 @@
+from typing import Dict, List, Set, Tuple
+import time
+from lib.generics.opcode import Opcode
+from lib.generics.pipeline_profile import OpcodeTiming
+from lib.generics.register import PC_INDEX, REGISTER_NAMES
+from lib.generics.vcpu import VCpu
+from lib.generics.mipsprogram import MipsProgram
+from lib.vcpu_simulator import PipelineLogger, SimulationStatus, TIMEOUT_CHECK_CYCLES
+
+def access_stage(timing: OpcodeTiming) -> int:
+   "returns the stage an opcode reads its registers and accesses memory in, the latest it uses them"
+   return timing.executes if timing.executes is not None else timing.resolves
+
+def registers_used(opcode: Opcode) -> Tuple[Set[int], Set[int]]:
+   "returns the register indices the opcode reads and writes, the PC aside"
+   reads = {operand.register_index for operand in opcode.operands} - {None, PC_INDEX}
+   writes = {operand.register_index for operand in opcode.output_operands} - {None, PC_INDEX}
+   return reads, writes
+
+def is_store(opcode: Opcode) -> bool:
+   return opcode.accesses_memory and not opcode.output_operands
+
+def write_order_conflicts(opcodes: Dict[int, Opcode], timings: Dict[type, OpcodeTiming] = None) -> List[Tuple[int, int, str]]:
+   """returns the (older pc, younger pc, location) of every instruction which may write a
+   register or memory before an older instruction fetched shortly ahead of it has used it
+
+   An instruction k fetches behind an older one reaches its executes stage first when its
+   executes stage is more than k stages before the older one's, the pipeline then completes
+   them out of order while functional mode doesn't. Younger instructions reading a register the
+   older one writes are held until it is forwarded, they can't overtake it. Branches are
+   followed to both the next pc and their static target.
+   """
+   def timing(pc: int) -> OpcodeTiming:
+      return opcodes[pc].timing if timings is None else timings[type(opcodes[pc])]
+
+   count = len(opcodes)
+   stages = [access_stage(timing(pc)) for pc in range(count)]
+   used = [registers_used(opcodes[pc]) for pc in range(count)]
+   successors = []
+   for pc in range(count):
+      following = {pc + 1} if pc + 1 < count else set()
+      target = opcodes[pc].static_target() if opcodes[pc].is_branch else None
+      if target is not None and 0 <= target < count:
+         following.add(target)
+      successors.append(following)
+   executes = [timing(pc).executes for pc in range(count)]
+   window = max([stage for stage in stages if stage is not None], default=0) - min([stage for stage in executes if stage is not None], default=0)
+
+   conflicts = []
+   for older in range(count):
+      if stages[older] is None:
+         continue
+      reads, writes = used[older]
+      found = set()
+      reached = successors[older]
+      for distance in range(1, window):
+         for younger in reached:
+            stage = executes[younger]
+            if younger in found or stage is None or distance >= stages[older] - stage:
+               continue
+            younger_reads, younger_writes = used[younger]
+            if younger_reads & writes: # held until the older result is forwarded
+               continue
+            overwritten = sorted(younger_writes & (reads | writes))
+            if overwritten:
+               conflicts.append((older, younger, REGISTER_NAMES[overwritten[0]]))
+               found.add(younger)
+            elif opcodes[older].accesses_memory and opcodes[younger].accesses_memory and (is_store(opcodes[older]) or is_store(opcodes[younger])):
+               conflicts.append((older, younger, 'memory'))
+               found.add(younger)
+         reached = set().union(*(successors[pc] for pc in reached))
+   return conflicts
+
+def check_write_order(opcodes: Dict[int, Opcode], timings: Dict[type, OpcodeTiming] = None, source: List[str] = None):
+   "throws exception if the pipeline may complete the program's instructions out of order, see write_order_conflicts"
+   conflicts = write_order_conflicts(opcodes, timings)
+   if conflicts:
+      def name(pc: int) -> str:
+         return f"pc {pc}" if source is None else f"'{source[pc].strip()}'"
+      older, younger, location = conflicts[0]
+      raise AssertionError(
+         f"Functional mode can't reproduce the pipeline's final state, {name(younger)} may write {location} "
+         f"before {name(older)} has used it. Separate them by another instruction or simulate in pipeline mode"
+      )
+
+class FunctionalSimulator():
+   """Executes a program one instruction per step directly against the vcpu, without modelling
+   the pipeline. Each fetched instruction is ticked through every stage in order using the same
+   opcode implementations as the pipeline, no per cycle trace is produced.
+
+   Instructions complete in program order, so the final register and memory state match the
+   pipelined simulation. Programs the pipeline may complete out of order are rejected when
+   loaded, see write_order_conflicts.
+   """
+   def __init__(self, vcpu: VCpu, stage_ids: List[int], logger: PipelineLogger):
+      self.vcpu = vcpu
+      self.stage_ids = stage_ids
+      self.logger = logger
+
+   def load_program(self, opcodes: Dict[int, Opcode], timings: Dict[type, OpcodeTiming] = None, source: List[str] = None):
+      "source holds the source line of each pc naming the instructions of a rejected program, None to name them by pc"
+      check_write_order(opcodes, timings, source)
+      self.program = MipsProgram(opcodes, timings)
+
+   def step(self) -> bool:
+      "executes the next instruction, returns False once the program has finished"
+      instruction = self.program.next_instruction(self.vcpu)
+      if instruction is None:
+         return False
+
+      instruction.load()
+      tick = type(instruction.opcode).tick
+      for stage_id in self.stage_ids:
+         # a taken branch has already redirected the PC, nothing younger was fetched to flush
+         tick(instruction, stage_id, self.vcpu)
+      instruction.unload()
+      return True
+
+   def run(self, limit: int = None) -> int:
+      "executes up to limit instructions, None for unlimited, returns the number executed which is less only once the program has finished"
+      executed = 0
+      while (limit is None or executed < limit) and self.step():
+         executed += 1
+      return executed
+
+   def simulate(self, max_instructions: int = None, timeout: float = None) -> SimulationStatus:
+      """Executes the program until it has finished
+
+      Inputs:
+         max_instructions: number of instructions executed at most, None for unlimited.
+         timeout: seconds of wall-clock time after which execution is stopped, None for no timeout.
+
+      Returns:
+         whether the program finished or execution was stopped early
+      """
+      executed = 0
+      status = SimulationStatus.Finished
+      try:
+         deadline = None if timeout is None else time.perf_counter() + timeout
+         while True:
+            if max_instructions is not None and executed >= max_instructions:
+               if self.program.has_next_instruction(self.vcpu):
+                  status = SimulationStatus.CycleBudgetExhausted
+               break
+            if deadline is not None and time.perf_counter() > deadline:
+               status = SimulationStatus.TimedOut
+               break
+
+            # the timeout is checked every TIMEOUT_CHECK_CYCLES instructions
+            limit = None if deadline is None else TIMEOUT_CHECK_CYCLES
+            if max_instructions is not None:
+               remaining = max_instructions - executed
+               limit = remaining if limit is None else min(limit, remaining)
+            done = self.run(limit)
+            executed += done
+            if limit is None or done < limit:
+               break
+
+         # log final reg/mem states
+         self.logger.log_memory(self.vcpu)
+         self.logger.log_registers(self.vcpu)
+         return status
+
+      except:
+         # print current state of all items
+         print(self.vcpu.registers)
+         print(self.vcpu.memory)
+         raise
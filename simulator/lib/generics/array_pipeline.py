@@ -0,0 +1,186 @@
+from typing import List, Tuple
+from .inflight import InFlightInstruction
+from .mipsprogram import MipsProgram
+from .pipelineoperations import PipelineOperations
+from .scoreboard import Scoreboard, ScoreboardPipelineStage
+from .forwarding import ForwardingNetwork
+from .vcpu import VCpu
+
+class ArrayPipeline():
+   """Pipeline core holding the state of every stage in parallel arrays indexed by slot, the
+   stage's position in the pipeline, and simulating a whole cycle at once
+
+   Results are identical to ticking linked ScoreboardPipelineStages from the last stage to
+   the first. A stage stalled behind a stalled stage stays stalled, so the stalled slots are
+   always the first depth slots of the pipeline. Every stage after them takes the instruction
+   of the stage before it, which is a single shift of the instruction array by one slot from
+   the depth onwards, leaving a bubble behind the stalled stages. The last stage retires its
+   instruction before the shift. Hazards and execution then run from the last slot back to
+   the first, as a flush squashes the instructions behind the branch before their stages check
+   for hazards, and the first slot fetches once the second stage isn't stalled. An instruction
+   stalling its own stage, waiting for a cache miss, stalls the slots before it the same way.
+   """
+   def __init__(self, stage_ids: list, forwarding: ForwardingNetwork = None):
+      self.stage_ids = list(stage_ids)
+      count = len(self.stage_ids)
+      self.instructions: List[InFlightInstruction] = [None] * count
+      self.stalled: List[bool] = [False] * count
+      self.scoreboard = Scoreboard(forwarding)
+      # registers each slot blocks in the scoreboard, and forwards from it with a partial network
+      self.blocked: List[Tuple[int, ...]] = [()] * count
+      self.forwarded: List[Tuple[int, ...]] = [()] * count
+
+   def update(self, slot: int):
+      "updates the scoreboard after the instruction in the slot changed or was squashed"
+      scoreboard = self.scoreboard
+      position_bit = 1 << slot
+      if self.blocked[slot]:
+         scoreboard.release(position_bit, self.blocked[slot])
+         self.blocked[slot] = ()
+      if self.forwarded[slot]:
+         scoreboard.release(position_bit, self.forwarded[slot], scoreboard.forwarded)
+         self.forwarded[slot] = ()
+
+      instruction = self.instructions[slot]
+      if instruction is not None and instruction.output_operands:
+         if not instruction.output_operands_forwardable(self.stage_ids[slot]):
+            self.blocked[slot] = scoreboard.block(position_bit, instruction.output_operands)
+         elif scoreboard.forwarding is not None and not instruction.noop:
+            self.forwarded[slot] = scoreboard.block(position_bit, instruction.output_operands, scoreboard.forwarded)
+
+   def flush(self, slot: int) -> int:
+      """squashes the instructions in the slot and every slot before it
+
+      Returns:
+         number of instructions squashed which were not already noops
+      """
+      squashed = 0
+      instructions = self.instructions
+      for behind in range(slot, -1, -1):
+         instruction = instructions[behind]
+         if instruction is not None:
+            if not instruction.noop:
+               squashed += 1
+            instruction.noop = True
+            self.update(behind)
+      return squashed
+
+   def cycle(self, program: MipsProgram, vcpu: VCpu):
+      "simulates one cycle of every stage"
+      instructions = self.instructions
+      stalled = self.stalled
+      update = self.update
+      last = len(instructions) - 1
+
+      depth = 0
+      while depth <= last and stalled[depth]:
+         depth += 1
+
+      retiring = instructions[last]
+      if retiring is not None:
+         if not retiring.noop:
+            program.in_flight -= 1 # instruction has completed
+         retiring.unload()
+      if depth < last:
+         instructions[depth + 1:] = instructions[depth:last]
+         instructions[depth] = None
+         for slot in range(depth, last + 1):
+            update(slot)
+      else: # the stages before the last are stalled, the last stage empties once it has retired
+         instructions[last] = None
+         update(last)
+
+      stage_ids = self.stage_ids
+      is_hazard = self.scoreboard.is_hazard
+      for slot in range(last, -1, -1):
+         if slot < last:
+            if stalled[slot + 1]: # the stages behind a stalled stage stall and change nothing else
+               for behind in range(slot + 1):
+                  stalled[behind] = True
+               break
+            if slot == 0 and instructions[0] is None: # a stalled first stage keeps the instruction it fetched
+               fetched = program.next_instruction(vcpu)
+               instructions[0] = fetched
+               if fetched is not None:
+                  fetched.load()
+               update(0)
+            instruction = instructions[slot]
+            if instruction is not None:
+               stalled[slot] = is_hazard(slot + 1, instruction.operands_required_at_stage(stage_ids[slot]), slot)
+            else: # an empty stage left stalled would keep the stages before it from ever advancing
+               stalled[slot] = False
+
+         instruction = instructions[slot]
+         if instruction is not None and not stalled[slot]:
+            operations = instruction.tick(stage_ids[slot], vcpu)
+            if operations:
+               if PipelineOperations.Stall in operations: # the instruction keeps the stage
+                  stalled[slot] = True
+               if PipelineOperations.Flush in operations:
+                  squashed = self.flush(slot - 1) # flush starting with previous instruction
+                  program.in_flight -= squashed
+                  program.squashed += squashed
+
+class ArrayPipelineStage(ScoreboardPipelineStage):
+   """View of one slot of an ArrayPipeline with the PipelineStage API, for the logger,
+   checkpoints and tests. Its instruction, stalled flag and scoreboard entries are the slot's
+   entries in the core's arrays, so ticking the views one by one, as instrumentation which
+   wraps their methods requires, simulates the same pipeline as ArrayPipeline.cycle.
+   """
+   def __init__(self, core: ArrayPipeline, slot: int):
+      self.core = core
+      self.slot = slot
+      ScoreboardPipelineStage.__init__(self, core.stage_ids[slot], core.scoreboard)
+
+   @property
+   def instruction(self) -> InFlightInstruction:
+      return self.core.instructions[self.slot]
+
+   @instruction.setter
+   def instruction(self, instruction: InFlightInstruction):
+      self.core.instructions[self.slot] = instruction
+      self.core.update(self.slot)
+
+   @property
+   def _instruction(self) -> InFlightInstruction:
+      return self.core.instructions[self.slot]
+
+   @_instruction.setter
+   def _instruction(self, instruction: InFlightInstruction):
+      self.core.instructions[self.slot] = instruction
+
+   @property
+   def stalled(self) -> bool:
+      return self.core.stalled[self.slot]
+
+   @stalled.setter
+   def stalled(self, stalled: bool):
+      self.core.stalled[self.slot] = stalled
+
+   @property
+   def blocked(self) -> Tuple[int, ...]:
+      return self.core.blocked[self.slot]
+
+   @blocked.setter
+   def blocked(self, blocked: Tuple[int, ...]):
+      self.core.blocked[self.slot] = blocked
+
+   @property
+   def forwarded(self) -> Tuple[int, ...]:
+      return self.core.forwarded[self.slot]
+
+   @forwarded.setter
+   def forwarded(self, forwarded: Tuple[int, ...]):
+      self.core.forwarded[self.slot] = forwarded
+
+   def update_scoreboard(self):
+      self.core.update(self.slot)
+
+def build_array_pipeline(stage_ids: list, forwarding: ForwardingNetwork = None) -> List[ArrayPipelineStage]:
+   "returns the linked views of a new ArrayPipeline of the stages"
+   core = ArrayPipeline(stage_ids, forwarding)
+   stages = [ArrayPipelineStage(core, slot) for slot in range(len(core.stage_ids))]
+   for prev, next in zip(stages, stages[1:]):
+      prev.next = next
+      next.prev = prev
+   return stages
@@ -0,0 +1,172 @@
+from typing import Dict, List
+from .opcode import Opcode
+
+# entries of the branch history tables and target buffer, indexed by the branch pc modulo the size
+DEFAULT_TABLE_ENTRIES = 64
+
+def is_misprediction(taken: bool, target: int, predicted: int) -> bool:
+   """True if the instructions fetched after a branch predicted to continue at predicted, None for
+   not taken, must be flushed. A taken branch flushes unless predicted taken to its target, even
+   when the target is the next instruction
+   """
+   if taken:
+      return predicted != target
+   return predicted is not None
+
+class BranchPredictor():
+   """Predicts at fetch whether a branch is taken, consulted by MipsProgram.next_instruction
+
+   predict returns the pc fetched after the branch if it is predicted taken, None to fetch the
+   next instruction. The branch resolves with update, a misprediction redirects fetch and flushes
+   the younger instructions like any taken branch used to. Squashed branches never resolve.
+
+   The static and history predictors can only predict branches to an immediate target, which the
+   opcode holds from assembly, the target buffer also predicts register targets it has seen.
+   This base predictor predicts every branch not taken.
+   """
+   name = 'not-taken'
+
+   def __init__(self, entries: int = DEFAULT_TABLE_ENTRIES):
+      self.entries = entries
+      self.branches = 0
+      self.mispredictions = 0
+
+   def predict(self, pc: int, opcode: Opcode) -> int:
+      return None
+
+   def train(self, pc: int, taken: bool, target: int):
+      pass
+
+   def update(self, pc: int, taken: bool, target: int, predicted: int) -> bool:
+      "counts and learns the resolved branch, returns True if it was mispredicted"
+      self.branches += 1
+      mispredicted = is_misprediction(taken, target, predicted)
+      if mispredicted:
+         self.mispredictions += 1
+      self.train(pc, taken, target)
+      return mispredicted
+
+   @property
+   def accuracy(self) -> float:
+      "share of resolved branches predicted correctly, None before the first branch"
+      return 1 - self.mispredictions / self.branches if self.branches else None
+
+   def table_state(self) -> list:
+      return []
+
+   def restore_table(self, table: list):
+      pass
+
+   def state(self) -> dict:
+      "returns the counters and tables, for checkpoints"
+      return {'branches': self.branches, 'mispredictions': self.mispredictions, 'table': self.table_state()}
+
+   def restore(self, state: dict):
+      self.branches = state['branches']
+      self.mispredictions = state['mispredictions']
+      self.restore_table(state['table'])
+
+class NotTakenPredictor(BranchPredictor):
+   "Predicts every branch not taken, the pipeline without prediction"
+   name = 'not-taken'
+
+class BackwardTakenPredictor(BranchPredictor):
+   "Predicts branches to earlier instructions taken, as loops branch back until they end"
+   name = 'backward-taken'
+
+   def predict(self, pc: int, opcode: Opcode) -> int:
+      target = opcode.static_target()
+      if target is not None and target <= pc:
+         return target
+      return None
+
+class OneBitPredictor(BranchPredictor):
+   "Predicts each branch as it resolved last time"
+   name = '1-bit'
+
+   def __init__(self, entries: int = DEFAULT_TABLE_ENTRIES):
+      BranchPredictor.__init__(self, entries)
+      self.taken: List[bool] = [False] * entries
+
+   def predict(self, pc: int, opcode: Opcode) -> int:
+      if self.taken[pc % self.entries]:
+         return opcode.static_target()
+      return None
+
+   def train(self, pc: int, taken: bool, target: int):
+      self.taken[pc % self.entries] = taken
+
+   def table_state(self) -> list:
+      return list(self.taken)
+
+   def restore_table(self, table: list):
+      self.taken[:] = table
+
+class TwoBitPredictor(BranchPredictor):
+   """Predicts with a saturating counter per branch, taken from 2 up to 3, so a loop branch
+   mispredicts once per loop instead of twice. Counters start weakly not taken at 1
+   """
+   name = '2-bit'
+
+   def __init__(self, entries: int = DEFAULT_TABLE_ENTRIES):
+      BranchPredictor.__init__(self, entries)
+      self.counters: List[int] = [1] * entries
+
+   def predict(self, pc: int, opcode: Opcode) -> int:
+      if self.counters[pc % self.entries] >= 2:
+         return opcode.static_target()
+      return None
+
+   def train(self, pc: int, taken: bool, target: int):
+      idx = pc % self.entries
+      if taken:
+         self.counters[idx] = min(self.counters[idx] + 1, 3)
+      else:
+         self.counters[idx] = max(self.counters[idx] - 1, 0)
+
+   def table_state(self) -> list:
+      return list(self.counters)
+
+   def restore_table(self, table: list):
+      self.counters[:] = table
+
+class BranchTargetBuffer(BranchPredictor):
+   """Remembers the target of each branch last taken, tagged with its pc, and predicts it taken
+   to that target until it isn't taken
+   """
+   name = 'btb'
+
+   def __init__(self, entries: int = DEFAULT_TABLE_ENTRIES):
+      BranchPredictor.__init__(self, entries)
+      self.buffer: Dict[int, List[int]] = {} # index: [pc, target]
+
+   def predict(self, pc: int, opcode: Opcode) -> int:
+      entry = self.buffer.get(pc % self.entries)
+      if entry is not None and entry[0] == pc:
+         return entry[1]
+      return None
+
+   def train(self, pc: int, taken: bool, target: int):
+      idx = pc % self.entries
+      if taken:
+         self.buffer[idx] = [pc, target]
+      elif idx in self.buffer and self.buffer[idx][0] == pc:
+         del self.buffer[idx]
+
+   def table_state(self) -> list:
+      return [[idx, pc, target] for idx, (pc, target) in self.buffer.items()]
+
+   def restore_table(self, table: list):
+      self.buffer = {idx: [pc, target] for idx, pc, target in table}
+
+BRANCH_PREDICTORS = {
+   predictor.name: predictor
+   for predictor in [NotTakenPredictor, BackwardTakenPredictor, OneBitPredictor, TwoBitPredictor, BranchTargetBuffer]
+}
+
+def build_branch_predictor(name: str, entries: int = DEFAULT_TABLE_ENTRIES) -> BranchPredictor:
+   "returns a new predictor of the named kind, otherwise throws exception"
+   if name in BRANCH_PREDICTORS:
+      return BRANCH_PREDICTORS[name](entries)
+
+   raise AssertionError(f"branch predictor {name} not in supported predictors {list(BRANCH_PREDICTORS.keys())}")
@@ -0,0 +1,209 @@
+from pathlib import Path
+from typing import Dict, List
+import toml
+
+from .pipeline_profile import OpcodeTiming
+
+REPLACEMENT_POLICIES = ['lru', 'fifo']
+# write-back allocates a line on a write miss and writes dirty lines to memory when evicted,
+# write-through writes every store to memory and does not allocate on a write miss
+WRITE_POLICIES = ['write-back', 'write-through']
+# caches a configuration may define, the instruction cache is looked up when fetching, the data
+# cache by the loads and stores
+CACHE_NAMES = ['icache', 'dcache']
+CACHE_KEYS = ['size', 'line_size', 'associativity', 'replacement', 'write_policy', 'miss_penalty', 'write_penalty']
+
+class CacheConfig():
+   """Geometry and timing of a cache, sizes are in words, which for the instruction cache are
+   instructions
+
+   size: words the cache holds
+   line_size: words per line, the unit lines are filled and evicted in
+   associativity: lines per set, size / line_size for a fully associative cache
+   replacement: lru evicts the line of the set used longest ago, fifo the line filled first
+   write_policy: write-back or write-through, see WRITE_POLICIES
+   miss_penalty: cycles the stage accessing the cache stalls for on a miss
+   write_penalty: cycles a write to memory stalls for, each store of a write-through cache and each
+      dirty line evicted by a write-back cache, 0 for a write buffer absorbing them
+   """
+   def __init__(
+         self,
+         size: int,
+         line_size: int = 1,
+         associativity: int = 1,
+         replacement: str = 'lru',
+         write_policy: str = 'write-back',
+         miss_penalty: int = 10,
+         write_penalty: int = 0
+      ):
+      for key, value in [('size', size), ('line_size', line_size), ('associativity', associativity)]:
+         if not isinstance(value, int) or value < 1:
+            raise AssertionError(f"Cache {key} {value} is not a positive number of words or lines")
+      if size % (line_size * associativity) != 0:
+         raise AssertionError(f"Cache size {size} is not a multiple of the set size, {associativity} lines of {line_size} words")
+      if replacement not in REPLACEMENT_POLICIES:
+         raise AssertionError(f"Cache replacement {replacement} not in supported policies {REPLACEMENT_POLICIES}")
+      if write_policy not in WRITE_POLICIES:
+         raise AssertionError(f"Cache write policy {write_policy} not in supported policies {WRITE_POLICIES}")
+      for key, value in [('miss_penalty', miss_penalty), ('write_penalty', write_penalty)]:
+         if not isinstance(value, int) or value < 0:
+            raise AssertionError(f"Cache {key} {value} is not a number of cycles")
+      self.size = size
+      self.line_size = line_size
+      self.associativity = associativity
+      self.replacement = replacement
+      self.write_policy = write_policy
+      self.miss_penalty = miss_penalty
+      self.write_penalty = write_penalty
+
+   @property
+   def sets(self) -> int:
+      return self.size // (self.line_size * self.associativity)
+
+   def describe(self) -> dict:
+      return {key: getattr(self, key) for key in CACHE_KEYS}
+
+class Cache():
+   """Set-associative cache of the tags of the lines held, the data stays in the vcpu's memory
+
+   Lookups return the cycles the accessing stage stalls for, 0 on a hit, and count the accesses,
+   hits, misses, evictions of valid lines and writes to memory, the dirty lines written back or
+   the stores written through. Each set lists its lines in replacement order, the line evicted
+   next first, lines are identified by their address divided by the line size.
+   """
+   def __init__(self, name: str, config: CacheConfig):
+      self.name = name
+      self.config = config
+      self.line_size = config.line_size
+      self.associativity = config.associativity
+      self.set_count = config.sets
+      self.lru = config.replacement == 'lru'
+      self.write_back = config.write_policy == 'write-back'
+      self.miss_penalty = config.miss_penalty
+      self.write_penalty = config.write_penalty
+      self.sets: List[List[int]] = [[] for _ in range(self.set_count)]
+      self.dirty = set()
+      self.reads = 0
+      self.writes = 0
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+      self.memory_writes = 0
+
+   def lookup(self, line: int, dirty: bool) -> int:
+      "returns the stall cycles of accessing the line, filling it on a miss"
+      lines = self.sets[line % self.set_count]
+      if line in lines:
+         self.hits += 1
+         if self.lru:
+            lines.remove(line)
+            lines.append(line)
+         if dirty:
+            self.dirty.add(line)
+         return 0
+
+      self.misses += 1
+      stall = self.miss_penalty
+      if len(lines) == self.associativity:
+         evicted = lines.pop(0)
+         self.evictions += 1
+         if evicted in self.dirty:
+            self.dirty.discard(evicted)
+            self.memory_writes += 1
+            stall += self.write_penalty
+      lines.append(line)
+      if dirty:
+         self.dirty.add(line)
+      return stall
+
+   def read(self, addr: int) -> int:
+      "returns the stall cycles of reading the word at the address"
+      self.reads += 1
+      return self.lookup(addr // self.line_size, False)
+
+   def write(self, addr: int) -> int:
+      "returns the stall cycles of writing the word at the address"
+      self.writes += 1
+      line = addr // self.line_size
+      if self.write_back:
+         return self.lookup(line, True)
+
+      # write-through, a hit updates the line and every store goes to memory
+      self.memory_writes += 1
+      lines = self.sets[line % self.set_count]
+      if line in lines:
+         self.hits += 1
+         if self.lru:
+            lines.remove(line)
+            lines.append(line)
+      else:
+         self.misses += 1
+      return self.write_penalty
+
+   @property
+   def accesses(self) -> int:
+      return self.reads + self.writes
+
+   @property
+   def hit_rate(self) -> float:
+      "share of accesses which hit, None before the first access"
+      return self.hits / self.accesses if self.accesses else None
+
+   def counters(self) -> Dict[str, int]:
+      return {
+         'reads': self.reads,
+         'writes': self.writes,
+         'hits': self.hits,
+         'misses': self.misses,
+         'evictions': self.evictions,
+         'memory_writes': self.memory_writes
+      }
+
+   def state(self) -> dict:
+      "returns the configuration, counters and lines held, for checkpoints"
+      return {
+         'config': self.config.describe(),
+         'counters': self.counters(),
+         'sets': [list(lines) for lines in self.sets],
+         'dirty': sorted(self.dirty)
+      }
+
+   def restore(self, state: dict):
+      for counter, value in state['counters'].items():
+         setattr(self, counter, value)
+      self.sets = [list(lines) for lines in state['sets']]
+      self.dirty = set(state['dirty'])
+
+def parse_cache_config(contents: dict) -> Dict[str, CacheConfig]:
+   """returns the configuration of each cache described by an icache and a dcache table, a
+   cache without a table is not simulated, otherwise throws exception
+
+   Inputs:
+      contents: e.g. {'dcache': {'size': 256, 'line_size': 4, 'associativity': 2, 'miss_penalty': 8}}
+   """
+   configs = {}
+   for name, table in contents.items():
+      if name not in CACHE_NAMES:
+         raise AssertionError(f"Cache {name} not in supported caches {CACHE_NAMES}")
+      if not isinstance(table, dict):
+         raise AssertionError(f"Cache {name} must be a table of {CACHE_KEYS}")
+      for key in table:
+         if key not in CACHE_KEYS:
+            raise AssertionError(f"Cache {name} has unknown key {key}, supported keys {CACHE_KEYS}")
+      if 'size' not in table:
+         raise AssertionError(f"Cache {name} requires a size")
+      configs[name] = CacheConfig(**table)
+   return configs
+
+def load_cache_config(path: Path) -> Dict[str, CacheConfig]:
+   return parse_cache_config(toml.load(path))
+
+def build_caches(configs: Dict[str, CacheConfig]) -> Dict[str, Cache]:
+   "returns a new, empty cache of each configuration, by name"
+   return {name: Cache(name, config) for name, config in configs.items()}
+
+def validate_cache_stages(timings: Dict[type, OpcodeTiming], stage_count: int):
+   "throws exception if an opcode looking up the data cache executes in the last stage, which can't stall"
+   for opcode, timing in timings.items():
+      if opcode.accesses_memory and timing.executes == stage_count - 1:
+         raise AssertionError(f"{opcode.__name__} accesses memory in the last stage of the pipeline, which a cache miss can't stall")
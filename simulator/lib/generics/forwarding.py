@@ -0,0 +1,31 @@
+from typing import Set, Tuple
+
+class ForwardingNetwork():
+   """Bypass paths a result travels from the stage holding the instruction producing it to the
+   stage of an instruction requiring it as operand, by stage index.
+
+   A result can only be forwarded once its instruction has reached the first stage it is
+   forwardable in, and then only over a path of the network. The register file is written in
+   the first half of a cycle, so a result in the last stage, the writeback stage, is read
+   without a path. paths None forwards from every stage to every stage, the full network.
+   """
+   def __init__(self, name: str, stage_count: int, paths: Set[Tuple[int, int]] = None):
+      self.name = name
+      self.stage_count = stage_count
+      self.writeback = stage_count - 1
+      self.paths = paths
+
+   @property
+   def full(self) -> bool:
+      return self.paths is None
+
+   def forwards(self, source: int, destination: int) -> bool:
+      "True if a result forwardable in the source stage reaches the destination stage"
+      return self.paths is None or source == self.writeback or (source, destination) in self.paths
+
+   def unreachable(self, destination: int) -> int:
+      "returns the bitmask of the stages with no path to the destination stage"
+      return sum(1 << source for source in range(self.stage_count) if not self.forwards(source, destination))
+
+def path_name(source: str, destination: str) -> str:
+   return f"{source}->{destination}"
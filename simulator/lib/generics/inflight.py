@@ -0,0 +1,87 @@
+from typing import List
+from .opcode import Opcode
+from .operand import Operand
+from .pipelineoperations import PipelineOperations
+from .vcpu import VCpu
+from .pipeline_profile import OpcodeTiming
+from .cache import Cache
+
+STALL = [PipelineOperations.Stall]
+
+class InFlightInstruction():
+   """Per-execution state of an instruction travelling down the pipeline.
+
+   The decoded Opcode is shared by every fetch of the same PC and is never modified once
+   assembled, only the state which changes while the instruction is in flight lives here.
+   The opcode's behaviour is executed against this record in place of the opcode itself,
+   so fetching costs the same regardless of how many operands the instruction has.
+
+   timing holds the stages the opcode uses in the pipeline the instruction was fetched into,
+   by default those of the opcode. A branch fetched with a predictor holds it and the pc it was
+   predicted to continue at, None when predicted not taken.
+
+   A load or store fetched with a data cache holds it until it has looked up its access. waiting
+   counts the cycles the instruction still stalls its stage for a cache miss, a squashed
+   instruction stops waiting.
+   """
+   __slots__ = ('opcode', 'operands', 'output_operands', 'timing', 'pc', 'exe_id', 'is_executing', 'stalled', 'noop', 'target_instruction_addr', 'predictor', 'predicted_target', 'cache', 'waiting')
+
+   def __init__(self, opcode: Opcode, pc: int, exe_id: int, timing: OpcodeTiming = None):
+      self.opcode = opcode
+      # shared with the opcode, referenced here to spare a lookup on every hazard check
+      self.operands: List[Operand] = opcode.operands
+      self.output_operands: List[Operand] = opcode.output_operands
+      self.timing: OpcodeTiming = opcode.timing if timing is None else timing
+      self.pc = pc
+      self.exe_id = exe_id
+      self.is_executing = False
+      self.stalled = False
+      self.noop = False
+      self.target_instruction_addr = None
+      self.predictor = None
+      self.predicted_target = None
+      self.cache: Cache = None
+      self.waiting = 0
+
+   def tick(self, curr_stage_id, vcpu: VCpu) -> List[PipelineOperations]:
+      if self.waiting and not self.noop:
+         self.waiting -= 1
+         return STALL
+      return type(self.opcode).tick(self, curr_stage_id, vcpu)
+
+   def access_cache(self, reads: List[int], writes: List[int]) -> List[PipelineOperations]:
+      """looks up the addresses read and written in the data cache, once
+
+      Returns:
+         STALL if a miss stalls the stage, the access is then made after the penalty, otherwise None
+      """
+      cache = self.cache
+      self.cache = None
+      penalty = 0
+      for addr in reads:
+         penalty += cache.read(addr)
+      for addr in writes:
+         penalty += cache.write(addr)
+      if penalty:
+         self.waiting = penalty - 1 # this cycle is the first stalled
+         return STALL
+      return None
+
+   def operands_required_at_stage(self, curr_stage_id) -> List[Operand]:
+      return type(self.opcode).operands_required_at_stage(self, curr_stage_id)
+
+   def output_operands_forwardable(self, curr_stage_id) -> bool:
+      return type(self.opcode).output_operands_forwardable(self, curr_stage_id)
+
+   def load(self):
+      self.is_executing = True
+      self.stalled = False
+      self.noop = False
+
+   def unload(self):
+      self.is_executing = False
+      self.stalled = False
+      self.noop = False
+
+   def invalidate(self):
+      self.noop = True
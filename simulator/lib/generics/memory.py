@@ -0,0 +1,158 @@
+from abc import ABC, abstractmethod
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+import mmap
+
+WORD_SIZE = 8 # bytes per memory word, words are native byte order signed 64 bit integers
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+class Memory(ABC):
+   """Data memory backend of a VCpu, holds the words at addresses 0 to max_mem_addr
+   """
+   def __init__(self, max_mem_addr: int):
+      self.max_mem_addr = max_mem_addr
+
+   @abstractmethod
+   def read(self, addr: int) -> int:
+      "returns the word at addr, unwritten and out of range addresses read as 0"
+      pass
+
+   @abstractmethod
+   def write(self, addr: int, value: int):
+      "writes the word at addr, the caller is responsible for bounds checking"
+      pass
+
+   @abstractmethod
+   def items(self) -> Iterator[Tuple[int, int]]:
+      "yields (addr, value) of the initialized or written words"
+      pass
+
+   def load_values(self, initial: Dict[int, int]):
+      "writes the initial values by address, otherwise throws exception if an address is out of range"
+      for addr in initial:
+         if not 0 <= addr <= self.max_mem_addr:
+            raise AssertionError(f"Initial memory address {addr} outside of memory 0-{self.max_mem_addr}")
+         self.write(addr, initial[addr])
+
+   def __repr__(self):
+      return f"{type(self).__name__}({dict(self.items())})"
+
+class DictMemory(Memory):
+   """Sparse memory keeping only the written words in a dict
+   """
+   def __init__(self, max_mem_addr: int, initial: Dict[int, int] = None):
+      Memory.__init__(self, max_mem_addr)
+      self.values = {}
+      if initial is not None:
+         self.load_values(initial)
+
+   def read(self, addr: int) -> int:
+      return self.values.get(addr, 0)
+
+   def write(self, addr: int, value: int):
+      self.values[addr] = value
+
+   def items(self) -> Iterator[Tuple[int, int]]:
+      return iter(self.values.items())
+
+class WordMemory(Memory):
+   """Contiguous memory of max_mem_addr + 1 signed 64 bit words, writing a value outside
+   INT64_MIN to INT64_MAX throws exception
+
+   Only the touched words, i.e. the initial values and words written since, are listed by
+   items() so logging does not depend on the memory size. They are listed in the order they
+   were first touched, unless an image has been loaded in which case every non-zero or touched
+   word is listed in address order.
+   """
+   def __init__(self, max_mem_addr: int, words, initial: Dict[int, int] = None):
+      Memory.__init__(self, max_mem_addr)
+      self.words = words
+      self.touched = bytearray(max_mem_addr + 1)
+      self.touch_order: List[int] = []
+      self.image_loaded = False
+
+      if initial is not None:
+         self.load_values(initial)
+
+   def read(self, addr: int) -> int:
+      if 0 <= addr <= self.max_mem_addr:
+         return self.words[addr]
+      return 0
+
+   def write(self, addr: int, value: int):
+      try:
+         self.words[addr] = value
+      except (OverflowError, ValueError): # array and memoryview words respectively
+         raise word_overflow(addr, value) from None
+      if not self.touched[addr]:
+         self.touched[addr] = 1
+         self.touch_order.append(addr)
+
+   def items(self) -> Iterator[Tuple[int, int]]:
+      if self.image_loaded:
+         words = self.words
+         touched = self.touched
+         return ((addr, words[addr]) for addr in range(0, self.max_mem_addr + 1) if words[addr] != 0 or touched[addr])
+      return ((addr, self.words[addr]) for addr in self.touch_order)
+
+   def byte_view(self) -> memoryview:
+      return memoryview(self.words).cast('B')
+
+   def load_image(self, path: Path):
+      "copies a raw word image into memory starting at address 0"
+      view = self.byte_view()
+      with open(path, 'rb') as f:
+         size = f.seek(0, 2)
+         if size > len(view) or size % WORD_SIZE != 0:
+            raise AssertionError(f"Memory image {path} of {size} bytes does not fit {len(view) // WORD_SIZE} words")
+         f.seek(0)
+         f.readinto(view[0:size])
+      self.image_loaded = True
+
+   def dump_image(self, path: Path):
+      "writes the whole memory as a raw word image"
+      with open(path, 'wb') as f:
+         f.write(self.byte_view())
+
+class FlatMemory(WordMemory):
+   """Contiguous memory held in an array
+   """
+   def __init__(self, max_mem_addr: int, initial: Dict[int, int] = None):
+      WordMemory.__init__(self, max_mem_addr, array('q', bytes((max_mem_addr + 1) * WORD_SIZE)), initial)
+
+class MmapMemory(WordMemory):
+   """Contiguous memory held in an anonymous memory map, images are copied into the map
+   without any intermediate python objects so multi-megabyte images load quickly
+   """
+   def __init__(self, max_mem_addr: int, initial: Dict[int, int] = None):
+      self.map = mmap.mmap(-1, (max_mem_addr + 1) * WORD_SIZE)
+      WordMemory.__init__(self, max_mem_addr, memoryview(self.map).cast('q'), initial)
+
+   def byte_view(self) -> memoryview:
+      return memoryview(self.map)
+
+def word_overflow(addr: int, value: int) -> AssertionError:
+   "returns the exception thrown for a value written to addr which does not fit a 64 bit memory word"
+   return AssertionError(
+         f"Memory write of {value} to address {addr} does not fit a 64 bit memory word, "
+         f"the dict memory backend holds unbounded values"
+      )
+
+def image_words(path: Path) -> int:
+   "returns the number of words in a raw word image"
+   return Path(path).stat().st_size // WORD_SIZE
+
+MEMORY_BACKENDS = {
+   'flat': FlatMemory,
+   'mmap': MmapMemory,
+   'dict': DictMemory
+}
+
+def build_memory(backend: str, max_mem_addr: int, initial: Dict[int, int] = None) -> Memory:
+   "returns a new memory of the named backend, otherwise throws exception"
+   if backend in MEMORY_BACKENDS:
+      return MEMORY_BACKENDS[backend](max_mem_addr, initial)
+
+   raise AssertionError(f"memory backend {backend} not in supported backends {list(MEMORY_BACKENDS.keys())}")
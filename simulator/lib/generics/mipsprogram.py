@@ -1,23 +1,69 @@
-from typing import Dict
-from copy import deepcopy
+from typing import Dict, List
 from .vcpu import VCpu
 from .opcode import Opcode
+from .inflight import InFlightInstruction
+from .pipeline_profile import OpcodeTiming
+from .branch_predictor import BranchPredictor
+from .cache import Cache
 
 class MipsProgram():
-   def __init__(self, opcodes: Dict[int, Opcode]):
+   def __init__(
+         self,
+         opcodes: Dict[int, Opcode],
+         timings: Dict[type, OpcodeTiming] = None,
+         predictor: BranchPredictor = None,
+         icache: Cache = None,
+         dcache: Cache = None
+      ):
+      """timings holds the timing of each opcode class in the pipeline simulated, None to use the
+      opcodes' own timing. predictor predicts the branches fetched, None to fetch the instruction
+      following every branch as the functional simulators do. A miss in the instruction cache
+      stalls the first stage holding the instruction fetched, loads and stores look up the data
+      cache. None for no cache, every access then takes the stage's own cycle
+      """
       self.is_finished = False
       self.opcodes = opcodes
+      # timing of the instruction at each pc, None for the opcode's own
+      self.timings: List[OpcodeTiming] = [None if timings is None else timings[type(opcodes[pc])] for pc in range(len(opcodes))]
+      self.predictor = predictor
+      # branches consult the predictor when fetched
+      self.branches: List[bool] = [opcodes[pc].is_branch for pc in range(len(opcodes))]
+      self.icache = icache
+      self.dcache = dcache
+      # loads and stores hold the data cache until they have looked up their access
+      self.memory_accesses: List[bool] = [dcache is not None and opcodes[pc].accesses_memory for pc in range(len(opcodes))]
       self.exe_id = 1
+      # instructions fetched which have neither completed nor been squashed
+      self.in_flight = 0
+      self.squashed = 0
 
-   def next_instruction(self, vcpu: VCpu):
-      pc = vcpu.get_pc()
+   @property
+   def completed(self) -> int:
+      "number of instructions which have left the pipeline without being squashed"
+      return self.exe_id - 1 - self.in_flight - self.squashed
 
-      if pc.value >= len(self.opcodes):
+   def has_next_instruction(self, vcpu: VCpu) -> bool:
+      return vcpu.get_pc_value() < len(self.opcodes)
+
+   def next_instruction(self, vcpu: VCpu) -> InFlightInstruction:
+      pc = vcpu.get_pc_value()
+
+      if pc >= len(self.opcodes):
          self.is_finished = True
          return None
 
-      vcpu.set_pc(pc.value + 1)
-      copy = deepcopy(self.opcodes[pc.value])
-      copy.exe_id = self.exe_id
+      instruction = InFlightInstruction(self.opcodes[pc], pc, self.exe_id, self.timings[pc])
+      if self.branches[pc] and self.predictor is not None:
+         predicted = self.predictor.predict(pc, instruction.opcode)
+         instruction.predictor = self.predictor
+         instruction.predicted_target = predicted
+         vcpu.set_pc(pc + 1 if predicted is None else predicted)
+      else:
+         vcpu.set_pc(pc + 1)
+      if self.icache is not None:
+         instruction.waiting = self.icache.read(pc)
+      if self.memory_accesses[pc]:
+         instruction.cache = self.dcache
       self.exe_id += 1
-      return copy
+      self.in_flight += 1
+      return instruction
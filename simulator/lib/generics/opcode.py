@@ -5,6 +5,7 @@ from .operand import Operand
 from .addressing_modes import AddressingMode
 from .pipelineoperations import PipelineOperations
 from .vcpu import VCpu
+from .pipeline_profile import OpcodeTiming
 
 def split_in_out_operands(num_in, num_out, operands: List[Operand]) -> Tuple[List[Operand], List[Operand]]:
    expected = num_in + num_out
@@ -18,6 +19,24 @@ def split_in_out_operands(num_in, num_out, operands: List[Operand]) -> Tuple[Lis
    return (operands[num_out:], operands[0:num_out])
 
 class Opcode(ABC):
+   """Decoded instruction shared by every execution of its PC.
+
+   The pipeline runs the opcode methods against an InFlightInstruction, so implementations
+   must only modify the per-execution state it holds (noop, stalled, is_executing and latched
+   values such as target_instruction_addr) and leave the operands untouched.
+
+   timing holds the stages the opcode uses in the default pipeline, an InFlightInstruction
+   carries the timing of the pipeline it was fetched into.
+
+   Branches set is_branch, the program consults its branch predictor when fetching them. Loads
+   and stores set accesses_memory, they look up their accesses in the program's data cache.
+   """
+   timing: OpcodeTiming = None
+   # stages every pipeline profile must give the opcode
+   TIMING_KEYS: Tuple[str, ...] = ()
+   is_branch = False
+   accesses_memory = False
+
    def __init__(self, operands: List[Operand], output_operands: List[Operand]):
       self.operands = operands
       self.output_operands = output_operands
@@ -39,6 +58,17 @@ class Opcode(ABC):
          if op.mode is not AddressingMode.RegisterDirect:
             raise AssertionError(f"Output operand {op} must be register direct addressing mode.")
 
+   @classmethod
+   def validate_timing(cls, timing: OpcodeTiming):
+      "throws exception if the timing lacks a stage the opcode uses"
+      for key in cls.TIMING_KEYS:
+         if getattr(timing, key) is None:
+            raise AssertionError(f"{cls.__name__} requires a {key} stage")
+
+   def static_target(self) -> int:
+      "returns the pc a branch continues at when taken if known before executing it, otherwise None"
+      return None
+
    @abstractmethod
    def tick(self, curr_stage_id, vcpu: VCpu) -> List[PipelineOperations]:
       # implementation specific per opcode
@@ -2,12 +2,15 @@ from abc import ABC, abstractmethod
 from typing import List
 
 from .addressing_modes import AddressingMode
+from .register import register_index
 from .vcpu import VCpu
 
 class Operand(ABC):
    def __init__(self, mode: AddressingMode, register_id):
       self.register_id = register_id
       self.mode = mode
+      # resolve the register file slot once so reads and writes skip the name lookup
+      self.register_index = register_index(register_id) if register_id is not None else None
 
    @abstractmethod
    def read(self, vcpu: VCpu) -> int:
@@ -27,17 +30,17 @@ class RegisterOperand(Operand):
       Operand.__init__(self, AddressingMode.RegisterDirect, register_id)
 
    def read(self, vcpu: VCpu) -> int:
-      return vcpu.get_register(self.register_id).value
+      return vcpu.register_file[self.register_index]
 
    def write(self, value: int, vcpu: VCpu):
-      vcpu.set_register(self.register_id, value)
+      vcpu.register_file[self.register_index] = value
 
 class RegisterIndirectOperand(Operand):
    def __init__(self, register_id: str):
       Operand.__init__(self, AddressingMode.RegisterIndirect, register_id)
 
    def calc_addr(self, vcpu: VCpu) -> int:
-      return vcpu.get_register(self.register_id).value
+      return vcpu.register_file[self.register_index]
 
    def read(self, vcpu: VCpu) -> int:
       addr = self.calc_addr(vcpu)
@@ -52,7 +55,7 @@ class DisplacementOperand(Operand):
       Operand.__init__(self, AddressingMode.Displacement, register_id)
 
    def calc_addr(self, vcpu: VCpu) -> int:
-      return vcpu.get_register(self.register_id).value + self.offset
+      return vcpu.register_file[self.register_index] + self.offset
 
    def read(self, vcpu: VCpu) -> int:
       addr = self.calc_addr(vcpu)
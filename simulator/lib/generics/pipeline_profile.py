@@ -0,0 +1,128 @@
+from enum import IntEnum
+from pathlib import Path
+from typing import Dict, List, Set, Tuple, Type
+import toml
+
+from .forwarding import ForwardingNetwork
+
+# stages an opcode table may name, see OpcodeTiming
+TIMING_KEYS = ['operands', 'executes', 'forwardable', 'target', 'condition', 'resolves']
+# forwarding networks every profile has, full forwarding over every path and none over no path
+BUILTIN_FORWARDING = ['full', 'none']
+
+class OpcodeTiming():
+   """Stage indices at which an opcode uses the pipeline, None where the opcode has no such stage
+
+   operands: stage the input operands are required in, stalling until they can be forwarded
+   executes: stage the result is computed or the memory accessed in
+   forwardable: first stage the result can be forwarded from
+   target: stage a branch target is required in and read
+   condition: stage a branch condition is required in
+   resolves: stage a branch condition is read in and a taken branch flushes the younger instructions
+   """
+   def __init__(self, operands: int = None, executes: int = None, forwardable: int = None, target: int = None, condition: int = None, resolves: int = None):
+      self.operands = operands
+      self.executes = executes
+      self.forwardable = forwardable
+      self.target = target
+      self.condition = condition
+      self.resolves = resolves
+
+   def stages(self) -> Dict[str, int]:
+      "returns the stages set, by key"
+      return {key: getattr(self, key) for key in TIMING_KEYS if getattr(self, key) is not None}
+
+class PipelineProfile():
+   """Stages of a pipeline and the timing of each opcode in it, by opcode name, and the bypass
+   paths of the forwarding networks it defines besides full and none, by network name
+   """
+   def __init__(self, name: str, stages: List[str], timings: Dict[str, OpcodeTiming], forwarding: Dict[str, Set[Tuple[int, int]]] = None):
+      self.name = name
+      self.stages = stages
+      self.timings = timings
+      self.forwarding = {} if forwarding is None else forwarding
+      self.stage_ids: Type[IntEnum] = IntEnum('PipelineStageId', [(stage, idx) for idx, stage in enumerate(stages)])
+
+   @property
+   def forwarding_networks(self) -> List[str]:
+      return BUILTIN_FORWARDING + list(self.forwarding.keys())
+
+   def forwarding_network(self, name: str) -> ForwardingNetwork:
+      "returns the named forwarding network, otherwise throws exception"
+      if name == 'full':
+         return ForwardingNetwork(name, len(self.stages))
+      if name == 'none':
+         return ForwardingNetwork(name, len(self.stages), set())
+      if name not in self.forwarding:
+         raise AssertionError(f"Pipeline profile {self.name} has no forwarding network {name}, supported networks {self.forwarding_networks}")
+      return ForwardingNetwork(name, len(self.stages), self.forwarding[name])
+
+   def timing(self, opcode_name: str) -> OpcodeTiming:
+      "returns the timing of the opcode, otherwise throws exception"
+      if opcode_name not in self.timings:
+         raise AssertionError(f"Pipeline profile {self.name} has no timing for opcode {opcode_name}")
+      return self.timings[opcode_name]
+
+   def describe(self) -> dict:
+      "returns the stages, the timings and the forwarding networks by stage name as plain values, everything but the name"
+      return {
+         'stages': self.stages,
+         'opcodes': {
+            opcode: {key: self.stages[stage] for key, stage in timing.stages().items()}
+            for opcode, timing in self.timings.items()
+         },
+         'forwarding': {
+            network: sorted([self.stages[source], self.stages[destination]] for source, destination in paths)
+            for network, paths in self.forwarding.items()
+         }
+      }
+
+def parse_pipeline_profile(contents: dict) -> PipelineProfile:
+   """builds the profile described by a pipeline table listing the stage names in order, an
+   opcodes table of stage names per opcode and an optional forwarding table of the bypass paths
+   per network, otherwise throws exception
+
+   Inputs:
+      contents: e.g. {'pipeline': {'name': 'two', 'stages': ['IF', 'EX']}, 'opcodes': {'DADD': {'operands': 'EX', ...}},
+         'forwarding': {'alu': {'paths': [['MEM', 'EX']]}}}
+   """
+   pipeline = contents.get('pipeline', {})
+   name = pipeline.get('name', 'unnamed')
+   stages = pipeline.get('stages')
+   if not isinstance(stages, list) or len(stages) < 2:
+      raise AssertionError(f"Pipeline profile {name} must list at least two stages")
+   for stage in stages:
+      if not isinstance(stage, str) or not stage.isidentifier() or stage.startswith('_'):
+         raise AssertionError(f"Pipeline profile {name} stage {stage} is not a valid stage name")
+   if len(set(stages)) != len(stages):
+      raise AssertionError(f"Pipeline profile {name} lists a stage more than once")
+
+   timings = {}
+   for opcode, table in contents.get('opcodes', {}).items():
+      stage_indices = {}
+      for key, stage in table.items():
+         if key not in TIMING_KEYS:
+            raise AssertionError(f"Pipeline profile {name} opcode {opcode} has unknown key {key}, supported keys {TIMING_KEYS}")
+         if stage not in stages:
+            raise AssertionError(f"Pipeline profile {name} opcode {opcode} {key} stage {stage} is not one of the stages {stages}")
+         stage_indices[key] = stages.index(stage)
+      timings[opcode] = OpcodeTiming(**stage_indices)
+
+   forwarding = {}
+   for network, table in contents.get('forwarding', {}).items():
+      if network in BUILTIN_FORWARDING:
+         raise AssertionError(f"Pipeline profile {name} can't redefine the {network} forwarding network")
+      paths = set()
+      for path in table.get('paths', []):
+         if not isinstance(path, list) or len(path) != 2 or any(stage not in stages for stage in path):
+            raise AssertionError(f"Pipeline profile {name} forwarding network {network} path {path} is not a source and a destination of the stages {stages}")
+         source, destination = stages.index(path[0]), stages.index(path[1])
+         if source <= destination:
+            raise AssertionError(f"Pipeline profile {name} forwarding network {network} path {path} must forward to an earlier stage")
+         paths.add((source, destination))
+      forwarding[network] = paths
+
+   return PipelineProfile(name, stages, timings, forwarding)
+
+def load_pipeline_profile(path: Path) -> PipelineProfile:
+   return parse_pipeline_profile(toml.load(path))
@@ -2,3 +2,4 @@ from enum import IntEnum
 
 class PipelineOperations(IntEnum):
    Flush = 0
+   Stall = 1 # the instruction keeps its stage this cycle, e.g. waiting for a cache miss
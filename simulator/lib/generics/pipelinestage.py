@@ -7,6 +7,7 @@ from .pipelineoperations import PipelineOperations
 from .mipsprogram import MipsProgram
 from .opcode import Opcode
 from .operand import Operand
+from .forwarding import ForwardingNetwork
 
 class PipelineStage():
    def __init__(self, stage_id: int):
@@ -15,6 +16,8 @@ class PipelineStage():
       self._prev: 'PipelineStage' = None
       self.stalled: bool = False
       self._instruction: Opcode = None
+      # bypass paths of the pipeline, None for full forwarding
+      self.forwarding: ForwardingNetwork = None
 
    @property
    def next(self) -> 'PipelineStage':
@@ -40,7 +43,7 @@ class PipelineStage():
    def instruction(self, instruction: Opcode):
       self._instruction = instruction
 
-   def is_data_hazard(self, operands: List[Operand]) -> bool:
+   def is_data_hazard(self, operands: List[Operand], consumer_stage_id: int = None) -> bool:
       """Recurse through all next stages in pipeline to determine if their instruction
       possibly produces an output this current instruction depends upon and returns True
       if the operands cannot be forwarded to the current instruction
@@ -48,31 +51,46 @@ class PipelineStage():
       Inputs:
          registers: list of registers to evaluate for hazards in instructions which are 
             further along in pipeline.
+         consumer_stage_id: stage requiring the operands, None to check forwardability only.
 
       Returns:
          True if hazard exists, False if no hazard
       """
       if self.instruction is not None:
          for operand in operands:
-            if operand in self.instruction.output_operands and not self.instruction.output_operands_forwardable(self.stage_id):
+            if operand in self.instruction.output_operands and not self.can_forward(consumer_stage_id):
                return True
 
       if self.next == None:
          return False
 
-      return self.next.is_data_hazard(operands)
+      return self.next.is_data_hazard(operands, consumer_stage_id)
+
+   def can_forward(self, consumer_stage_id: int = None) -> bool:
+      "True if the instruction's outputs can be forwarded from this stage to the consumer stage"
+      if not self.instruction.output_operands_forwardable(self.stage_id):
+         return False
+      forwarding = self.forwarding
+      if forwarding is None or consumer_stage_id is None or self.instruction.noop:
+         return True
+      return forwarding.forwards(self.stage_id, consumer_stage_id)
    
-   def flush(self):
+   def flush(self) -> int:
       """Flush the pipeline starting with this stage
-      """
 
+      Returns:
+         number of instructions squashed which were not already noops
+      """
+      squashed = 0
       if self.instruction != None:
+         if not self.instruction.noop:
+            squashed = 1
          self.instruction.noop = True
 
       if self.prev is None:
-         return # early return if no previous stages
+         return squashed # early return if no previous stages
       
-      self.prev.flush()
+      return squashed + self.prev.flush()
 
    def check_for_upstream_stalls(self):
       if self.next != None:
@@ -82,9 +100,13 @@ class PipelineStage():
    def fetch_next_instruction(self, program: MipsProgram, vcpu: VCpu):
       if self.next == None: # end of pipeline should unload the instruction it executed last time
          if self.instruction != None:
+            if not self.instruction.noop:
+               program.in_flight -= 1 # instruction has completed
             self.instruction.unload()
+            self.instruction = None # stays empty while the stage before it is stalled
       if self.prev is None: # beginning of pipeline must fetch instruction from PC
-         if not self.stalled or not self.next.stalled:
+         # unless it is stalled holding the instruction it fetched, e.g. on an instruction cache miss
+         if self.instruction is None and (not self.stalled or not self.next.stalled):
             self.instruction = program.next_instruction(vcpu)
             if self.instruction != None:
                self.instruction.load()
@@ -93,15 +115,22 @@ class PipelineStage():
             self.instruction = self.prev.instruction
             self.prev.instruction = None
 
-   def handle_operations(self, operations):
+   def handle_operations(self, operations) -> int:
+      "returns the number of instructions squashed by the operations"
+      if PipelineOperations.Stall in operations: # the instruction keeps this stage, stalling the stages before it
+         self.stalled = True
       if PipelineOperations.Flush in operations:
-         self.prev.flush() # flush starting with previous instruction
+         return self.prev.flush() # flush starting with previous instruction
+      return 0
 
    def stall_for_hazards(self):
       if self.next is None: # end of pipeline can't have data hazards
          return
-      if not self.next.stalled and self.instruction is not None: # if next stage is not stalled, but we are
-         self.stalled = self.next.is_data_hazard(self.instruction.operands_required_at_stage(self.stage_id))
+      if not self.next.stalled: # if next stage is not stalled, but we are
+         if self.instruction is not None:
+            self.stalled = self.next.is_data_hazard(self.instruction.operands_required_at_stage(self.stage_id), self.stage_id)
+         else: # an empty stage left stalled would keep the stages before it from ever advancing
+            self.stalled = False
 
    def execute_instruction(self, program, vcpu):
       if self.stalled == False and self.instruction != None:
@@ -114,7 +143,10 @@ class PipelineStage():
       self.fetch_next_instruction(program, vcpu)
       self.stall_for_hazards()
       operations = self.execute_instruction(program, vcpu)
-      self.handle_operations(operations)
+      if operations:
+         squashed = self.handle_operations(operations)
+         program.in_flight -= squashed
+         program.squashed += squashed
 
    def reset(self):
       self.stalled = False
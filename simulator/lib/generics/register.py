@@ -1,5 +1,19 @@
-# from opcode import Opcode
+REG_PROGRAM_COUNTER = 'PC'
 
+NUM_REGISTERS = 32 # general purpose registers R0-R31
+PC_INDEX = NUM_REGISTERS # program counter is stored after the general purpose registers
+REGISTER_FILE_SIZE = NUM_REGISTERS + 1
+
+REGISTER_NAMES = [f'R{i}' for i in range(0, NUM_REGISTERS)]
+REGISTER_INDICES = {name: idx for idx, name in enumerate(REGISTER_NAMES)}
+REGISTER_INDICES[REG_PROGRAM_COUNTER] = PC_INDEX
+
+def register_index(name: str) -> int:
+   "returns the register file index of the named register, otherwise throws exception"
+   if name in REGISTER_INDICES:
+      return REGISTER_INDICES[name]
+
+   raise AssertionError(f"register {name} not in supported registers R0-R{NUM_REGISTERS-1}, {REG_PROGRAM_COUNTER}")
 
 class Register():
    def __init__(self, value: int):
@@ -0,0 +1,129 @@
+from typing import List, Tuple
+from .opcode import Opcode
+from .operand import Operand
+from .pipelinestage import PipelineStage
+from .register import REGISTER_FILE_SIZE
+from .forwarding import ForwardingNetwork
+
+class Scoreboard():
+   """Tracks, for every register, the pipeline positions holding an instruction whose output
+   to that register cannot be forwarded yet.
+
+   Positions are the integer stage ids, so each register is a bitmask with bit n set while
+   the instruction in stage n blocks it. Stages update their own position as instructions
+   advance, which lets hazard checks look at each operand once instead of walking the
+   downstream stages.
+
+   With a forwarding network other than full forwarding, forwarded holds the positions of
+   results which are forwardable but not written back, and a consumer is also blocked by
+   those at positions without a path to it.
+   """
+   def __init__(self, forwarding: ForwardingNetwork = None):
+      self.pending: List[int] = [0] * REGISTER_FILE_SIZE
+      self.forwarding = None if forwarding is None or forwarding.full else forwarding
+      self.forwarded: List[int] = [0] * REGISTER_FILE_SIZE
+      # positions without a path, by consumer position
+      self.unreachable: List[int] = []
+      if self.forwarding is not None:
+         self.unreachable = [self.forwarding.unreachable(destination) for destination in range(self.forwarding.stage_count)]
+
+   def block(self, position_bit: int, operands: List[Operand], pending: List[int] = None) -> Tuple[int, ...]:
+      "marks the operand registers blocked at the position and returns their indices"
+      pending = self.pending if pending is None else pending
+      blocked = tuple(operand.register_index for operand in operands)
+      for register_index in blocked:
+         pending[register_index] |= position_bit
+      return blocked
+
+   def release(self, position_bit: int, blocked: Tuple[int, ...], pending: List[int] = None):
+      "clears the registers previously blocked at the position"
+      pending = self.pending if pending is None else pending
+      for register_index in blocked:
+         pending[register_index] &= ~position_bit
+
+   def is_hazard(self, position: int, operands: List[Operand], consumer: int = None) -> bool:
+      """returns True if any operand is blocked at position or further along the pipeline, or
+      forwarded from there without a path to the consumer position
+      """
+      downstream = ~((1 << position) - 1)
+      if self.forwarding is not None and consumer is not None:
+         unforwarded = downstream & self.unreachable[consumer]
+         for operand in operands:
+            register_index = operand.register_index
+            if register_index is not None and (self.pending[register_index] & downstream or self.forwarded[register_index] & unforwarded):
+               return True
+         return False
+      for operand in operands:
+         if operand.register_index is not None and self.pending[operand.register_index] & downstream:
+            return True
+      return False
+
+class ScoreboardPipelineStage(PipelineStage):
+   """Pipeline stage answering hazard checks from a scoreboard shared by all stages of the
+   pipeline instead of recursing through the downstream stages. Results are identical to
+   PipelineStage, the scoreboard is updated whenever this stage's instruction changes or
+   is flushed.
+   """
+   def __init__(self, stage_id: int, scoreboard: Scoreboard):
+      self.scoreboard = scoreboard
+      self.position = int(stage_id)
+      self.position_bit = 1 << self.position
+      self.blocked: Tuple[int, ...] = ()
+      self.forwarded: Tuple[int, ...] = () # registers forwarded from this position, partial networks only
+      PipelineStage.__init__(self, stage_id)
+      self.forwarding = scoreboard.forwarding
+
+   @property
+   def instruction(self) -> Opcode:
+      return self._instruction
+
+   @instruction.setter
+   def instruction(self, instruction: Opcode):
+      self._instruction = instruction
+      self.update_scoreboard()
+
+   def update_scoreboard(self):
+      scoreboard = self.scoreboard
+      if self.blocked:
+         scoreboard.release(self.position_bit, self.blocked)
+         self.blocked = ()
+      if self.forwarded:
+         scoreboard.release(self.position_bit, self.forwarded, scoreboard.forwarded)
+         self.forwarded = ()
+
+      instruction = self._instruction
+      if instruction is not None and instruction.output_operands:
+         if not instruction.output_operands_forwardable(self.stage_id):
+            self.blocked = scoreboard.block(self.position_bit, instruction.output_operands)
+         elif self.forwarding is not None and not instruction.noop:
+            self.forwarded = scoreboard.block(self.position_bit, instruction.output_operands, scoreboard.forwarded)
+
+   def is_data_hazard(self, operands: List[Operand], consumer_stage_id: int = None) -> bool:
+      return self.scoreboard.is_hazard(self.position, operands, None if consumer_stage_id is None else int(consumer_stage_id))
+
+   def flush(self) -> int:
+      squashed = 0
+      if self._instruction is not None:
+         if not self._instruction.noop:
+            squashed = 1
+         self._instruction.noop = True
+         self.update_scoreboard()
+
+      if self._prev is None:
+         return squashed
+      return squashed + self._prev.flush()
+
+   def fetch_next_instruction(self, program, vcpu):
+      PipelineStage.fetch_next_instruction(self, program, vcpu)
+      if self._next is None: # unloading clears the noop flag of an instruction which may be kept
+         self.update_scoreboard()
+
+   def stall_for_hazards(self):
+      next = self._next
+      if next is None: # end of pipeline can't have data hazards
+         return
+      if not next.stalled: # if next stage is not stalled, but we are
+         if self._instruction is not None:
+            self.stalled = self.scoreboard.is_hazard(next.position, self._instruction.operands_required_at_stage(self.stage_id), self.position)
+         else: # an empty stage left stalled would keep the stages before it from ever advancing
+            self.stalled = False
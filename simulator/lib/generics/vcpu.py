@@ -1,35 +1,55 @@
-from typing import List, Dict
-from .register import Register
-
-REG_PROGRAM_COUNTER = 'PC'
+from typing import List, Dict, Union
+from .memory import Memory, FlatMemory
+from .register import Register, REG_PROGRAM_COUNTER, REGISTER_NAMES, REGISTER_FILE_SIZE, PC_INDEX, register_index
 
 class VCpu():
-   def __init__(self, registers: Dict[str, Register], memory: Dict[int, int], max_memory: int):
-      # convert registers list into a dict
-      self.registers = registers
-      self.registers[REG_PROGRAM_COUNTER] = Register(0)
-      self.memory = memory
+   def __init__(self, registers: Dict[str, Register], memory: Union[Dict[int, int], Memory], max_memory: int):
+      # registers are stored by index in a fixed size register file, PC has its own slot
+      self.register_file: List[int] = [0] * REGISTER_FILE_SIZE
+      # names in the order the registers view lists them, initial registers first
+      self.register_names: List[str] = []
+
+      for name in registers:
+         if name != REG_PROGRAM_COUNTER:
+            self.register_file[register_index(name)] = registers[name].value
+            self.register_names.append(name)
+      for name in REGISTER_NAMES:
+         if name not in registers:
+            self.register_names.append(name)
+      self.register_names.append(REG_PROGRAM_COUNTER)
+
+      # initial memory values are loaded into a flat memory unless a backend is given
+      if isinstance(memory, Memory):
+         self.memory = memory
+      else:
+         self.memory = FlatMemory(max_memory, memory)
       self.max_mem_addr = max_memory
 
-   def set_pc(self, value):
-      self.registers[REG_PROGRAM_COUNTER] = Register(value)
+   @property
+   def registers(self) -> Dict[str, Register]:
+      "dict view of the register file, changes to the view are not written back"
+      return {name: Register(self.register_file[register_index(name)]) for name in self.register_names}
+
+   def set_pc(self, value: int):
+      self.register_file[PC_INDEX] = value
+
+   def get_pc(self) -> Register:
+      return Register(self.register_file[PC_INDEX])
 
-   def get_pc(self) -> int:
-      return self.registers[REG_PROGRAM_COUNTER]
+   def get_pc_value(self) -> int:
+      return self.register_file[PC_INDEX]
 
    def get_register(self, name: str) -> Register:
-      return self.registers[name]
+      return Register(self.register_file[register_index(name)])
 
    def set_register(self, name: str, value: int):
-      self.registers[name] = Register(value)
+      self.register_file[register_index(name)] = value
 
    def get_memory_value(self, addr: int) -> int:
-      if addr in self.memory.keys():
-         return self.memory[addr]
-      return 0
+      return self.memory.read(addr)
 
    def set_memory_value(self, addr: int, value: int):
-      if addr <= self.max_mem_addr:
-         self.memory[addr] = value
+      if 0 <= addr <= self.max_mem_addr:
+         self.memory.write(addr, value)
       else:
          raise AssertionError(f"Memory writeback to invalid memory address {addr}")
@@ -0,0 +1,204 @@
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Iterator, List, Tuple
+import time
+
+from lib.vcpu_simulator import VCpuSimulator, SimulationStatus
+from lib.generics.memory import Memory, WordMemory, WORD_SIZE, INT64_MIN, INT64_MAX, word_overflow
+
+
+# control words of a SharedBlock: why the cores stop, then whether each core's program has finished
+STOP = 0
+STOP_STATUSES = [None, SimulationStatus.Finished, SimulationStatus.CycleBudgetExhausted, SimulationStatus.TimedOut]
+
+class CoreMemory(Memory):
+   """One core's view of the data memory all cores share
+
+   The core reads its own writes immediately, but they only reach the shared words, and so the
+   other cores, when the cores synchronize. Until then they are held in pending in the order
+   they were first written.
+   """
+   def __init__(self, max_mem_addr: int, words):
+      Memory.__init__(self, max_mem_addr)
+      self.words = words
+      self.pending: Dict[int, int] = {}
+
+   def read(self, addr: int) -> int:
+      value = self.pending.get(addr)
+      if value is not None:
+         return value
+      if 0 <= addr <= self.max_mem_addr:
+         return self.words[addr]
+      return 0
+
+   def write(self, addr: int, value: int):
+      if not INT64_MIN <= value <= INT64_MAX: # the shared words are 64 bit, as the flat memory's
+         raise word_overflow(addr, value)
+      self.pending[addr] = value
+
+   def items(self) -> Iterator[Tuple[int, int]]:
+      "yields (addr, value) of the writes not synchronized yet"
+      return iter(self.pending.items())
+
+def commit(memory: WordMemory, writes: Iterable[Tuple[int, int]]):
+   "writes a core's pending writes to the shared memory, keeping its touch order"
+   for addr, value in writes:
+      memory.write(addr, value)
+
+def stop_status(finished: bool, cycle: int, max_cycles: int, deadline: float) -> SimulationStatus:
+   "returns why the cores stop after synchronizing at the end of the cycle, None to continue"
+   if finished:
+      return SimulationStatus.Finished
+   if max_cycles is not None and cycle >= max_cycles:
+      return SimulationStatus.CycleBudgetExhausted
+   if deadline is not None and time.perf_counter() > deadline:
+      return SimulationStatus.TimedOut
+   return None
+
+def core_status(status: SimulationStatus, stop: SimulationStatus) -> SimulationStatus:
+   "returns the status of a core which ran with status until the cores stopped with stop"
+   return status if status == SimulationStatus.Finished else stop
+
+class MulticoreSimulator():
+   """Simulates several cores sharing one data memory in this process, each core a
+   VCpuSimulator of its own pipeline and program reading and writing through a CoreMemory
+
+   Cores run sync_cycles cycles one after the other, then synchronize: the writes of each core,
+   in core order, are applied to the shared memory, so a word written by several cores holds
+   the highest core's write. A core sees the writes of the other cores from the cycle after the
+   synchronization. The outcome does not depend on the order the cores run in, so simulating
+   every core in its own process, see run_core_process, produces the same final state.
+   """
+   def __init__(self, simulators: List[VCpuSimulator], memory: WordMemory, sync_cycles: int = 1):
+      if sync_cycles < 1:
+         raise AssertionError(f"Cores must synchronize every positive number of cycles, not {sync_cycles}")
+      self.simulators = simulators
+      self.memory = memory
+      self.sync_cycles = sync_cycles
+
+   def simulate(self, max_cycles: int = None, timeout: float = None) -> List[SimulationStatus]:
+      """Simulates the cores until every program has finished
+
+      Inputs:
+         max_cycles: last cycle simulated, None for unlimited.
+         timeout: seconds of wall-clock time after which the simulation is stopped, None for no timeout.
+
+      Returns:
+         whether each core's program finished or the simulation was stopped early
+      """
+      deadline = None if timeout is None else time.perf_counter() + timeout
+      cycle = 0
+      while True:
+         cycle += self.sync_cycles
+         if max_cycles is not None:
+            cycle = min(cycle, max_cycles)
+         statuses = [simulator.run(cycle) for simulator in self.simulators]
+         for simulator in self.simulators:
+            core_memory = simulator.vcpu.memory
+            commit(self.memory, core_memory.pending.items())
+            core_memory.pending.clear()
+
+         stop = stop_status(all(status == SimulationStatus.Finished for status in statuses), cycle, max_cycles, deadline)
+         if stop is not None:
+            return [core_status(status, stop) for status in statuses]
+
+class SharedBlock():
+   """Block of multiprocessing.shared_memory holding the words of the data memory shared by the
+   core processes, a mailbox per core, and control words, as 64 bit words
+
+   A core publishes its pending writes to its mailbox, a count followed by address and value
+   pairs, and the process coordinating the cores applies them at the synchronization. The
+   control words hold why the cores stop, 0 to continue, and a flag per core set once its
+   program has finished. Processes attach to the block of the coordinating process by name.
+   """
+   def __init__(self, words: int, cores: int, mailbox_size: int, name: str = None):
+      self.word_count = words
+      self.cores = cores
+      self.mailbox_size = mailbox_size
+      mailbox_words = 1 + 2 * mailbox_size
+      size = (words + cores * mailbox_words + 1 + cores) * WORD_SIZE
+      self.block = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+      self.view = self.block.buf[:size].cast('q')
+      self.words = self.view[:words]
+      self.mailboxes = [self.view[words + core * mailbox_words:words + (core + 1) * mailbox_words] for core in range(cores)]
+      self.control = self.view[words + cores * mailbox_words:]
+
+   @property
+   def name(self) -> str:
+      return self.block.name
+
+   def publish(self, core: int, writes: Dict[int, int]):
+      "copies a core's writes to its mailbox"
+      if len(writes) > self.mailbox_size:
+         raise AssertionError(f"Core {core} wrote {len(writes)} words since synchronizing, its mailbox holds {self.mailbox_size}")
+      mailbox = self.mailboxes[core]
+      mailbox[0] = len(writes)
+      idx = 1
+      for addr, value in writes.items():
+         mailbox[idx] = addr
+         mailbox[idx + 1] = value
+         idx += 2
+
+   def writes(self, core: int) -> Iterable[Tuple[int, int]]:
+      "yields the (addr, value) writes in a core's mailbox"
+      mailbox = self.mailboxes[core]
+      for idx in range(1, 1 + 2 * mailbox[0], 2):
+         yield mailbox[idx], mailbox[idx + 1]
+
+   def close(self):
+      "releases the views of the block and detaches from it"
+      for view in self.mailboxes + [self.words, self.control, self.view]:
+         view.release()
+      self.block.close()
+
+   def unlink(self):
+      self.block.unlink()
+
+def run_core_process(simulator: VCpuSimulator, block: SharedBlock, core: int, barrier, sync_cycles: int, max_cycles: int = None) -> SimulationStatus:
+   """Simulates a core in a process of its own, synchronizing with the other cores and
+   coordinate_core_processes through the barrier every sync_cycles cycles
+
+   Returns:
+      whether the core's program finished or the simulation was stopped early
+   """
+   core_memory = simulator.vcpu.memory
+   cycle = 0
+   try:
+      while True:
+         cycle += sync_cycles
+         if max_cycles is not None:
+            cycle = min(cycle, max_cycles)
+         status = simulator.run(cycle)
+         block.publish(core, core_memory.pending)
+         core_memory.pending.clear()
+         block.control[1 + core] = status == SimulationStatus.Finished
+         barrier.wait() # the coordinator applies the writes
+         barrier.wait()
+         stop = STOP_STATUSES[block.control[STOP]]
+         if stop is not None:
+            return core_status(status, stop)
+   except BaseException:
+      barrier.abort() # release the processes waiting for this one
+      raise
+
+def coordinate_core_processes(memory: WordMemory, block: SharedBlock, barrier, sync_cycles: int, max_cycles: int = None, timeout: float = None) -> SimulationStatus:
+   """Applies the writes the core processes publish to the memory over the block's words at each
+   synchronization, in core order, and decides when the cores stop
+
+   Returns:
+      why the cores stopped, otherwise throws threading.BrokenBarrierError once a core has failed
+   """
+   deadline = None if timeout is None else time.perf_counter() + timeout
+   cycle = 0
+   while True:
+      cycle += sync_cycles
+      if max_cycles is not None:
+         cycle = min(cycle, max_cycles)
+      barrier.wait()
+      for core in range(block.cores):
+         commit(memory, block.writes(core))
+      finished = all(block.control[1 + core] for core in range(block.cores))
+      stop = stop_status(finished, cycle, max_cycles, deadline)
+      block.control[STOP] = STOP_STATUSES.index(stop)
+      barrier.wait()
+      if stop is not None:
+         return stop
@@ -0,0 +1,192 @@
+from pathlib import Path
+from typing import Callable, Dict, List
+import json
+
+from lib.generics.pipelinestage import PipelineStage
+from lib.vcpu_simulator import VCpuSimulator
+from lib.generics.forwarding import path_name
+from lib.generics.operand import Operand
+
+class PerformanceCounters():
+   """Counters of the simulated cpu, collected while a VCpuSimulator runs
+
+   cycles counts the cycles with an instruction in the pipeline, the cycles of the trace.
+   stall_cycles counts per stage the cycles it ended stalled holding an instruction, the
+   'stall' entries of the trace. hazard_stalls counts the stalls caused by a data hazard,
+   by the opcode class producing the operand and the stage it was in, stalls which are only
+   passed on from a stalled next stage are not counted there. flushes counts the flushes per
+   opcode class causing them, squashed and retired instructions are read from the program and
+   the branches resolved and mispredicted from the program's branch predictor, if it has one, as
+   are the hits, misses and evictions of its caches.
+   forwarding counts the operands read over each bypass path, by source and destination stage,
+   when an instruction proceeds past the stage requiring them while the instruction producing
+   them has not been written back.
+
+   Like PipelineProfiler, attaching sets wrappers on the stage instances, simulations without
+   counters run the same code as before.
+   """
+   def __init__(self):
+      self.cycles = 0
+      self.stall_cycles: Dict[str, int] = {}
+      self.hazard_stalls: Dict[str, Dict[str, int]] = {}
+      self.flushes: Dict[str, int] = {}
+      self.forwarding: Dict[str, int] = {}
+      self.simulator: VCpuSimulator = None
+
+   def attach(self, simulator: VCpuSimulator):
+      "counts the simulator's cycles, the simulator must not have started simulating"
+      self.simulator = simulator
+      simulator.skip_stalled_stages = False # every tick is counted
+      stages = list(simulator.stages)
+      for stage in stages:
+         self.stall_cycles.setdefault(stage_name(stage), 0)
+         stage.stall_for_hazards = self.counted_hazards(stage, stage.stall_for_hazards)
+         stage.handle_operations = self.counted_flushes(stage, stage.handle_operations)
+
+      # the first stage ticks last, after it the cycle is complete
+      first = next(stage for stage in stages if stage.prev is None)
+      first.tick = self.counted_cycle(stages, first.tick)
+
+   def counted_cycle(self, stages: List[PipelineStage], tick: Callable) -> Callable:
+      stall_cycles = self.stall_cycles
+      names = [stage_name(stage) for stage in stages]
+      def counted(program, vcpu):
+         tick(program, vcpu)
+         if program.in_flight != 0:
+            self.cycles += 1
+            for name, stage in zip(names, stages):
+               instruction = stage.instruction
+               if stage.stalled and instruction is not None and not instruction.noop:
+                  stall_cycles[name] += 1
+      return counted
+
+   def counted_hazards(self, stage: PipelineStage, stall_for_hazards: Callable) -> Callable:
+      def counted():
+         next = stage.next
+         checked = next is not None and not next.stalled and stage.instruction is not None
+         stall_for_hazards()
+         if checked and stage.stalled:
+            producer = find_producer(stage)
+            if producer is not None:
+               by_stage = self.hazard_stalls.setdefault(type(producer.instruction.opcode).__name__, {})
+               by_stage[stage_name(producer)] = by_stage.get(stage_name(producer), 0) + 1
+         elif checked and not stage.instruction.noop:
+            for operand in stage.instruction.operands_required_at_stage(stage.stage_id):
+               source = find_source(stage, operand)
+               if source is not None and source.next is not None: # written back results are read from the register file
+                  path = path_name(stage_name(source), stage_name(stage))
+                  self.forwarding[path] = self.forwarding.get(path, 0) + 1
+      return counted
+
+   def counted_flushes(self, stage: PipelineStage, handle_operations: Callable) -> Callable:
+      def counted(operations):
+         squashed = handle_operations(operations)
+         if squashed and stage.instruction is not None:
+            name = type(stage.instruction.opcode).__name__
+            self.flushes[name] = self.flushes.get(name, 0) + 1
+         return squashed
+      return counted
+
+   def statistics(self) -> dict:
+      "returns the counters and the derived CPI, CPI is None until an instruction retired"
+      program = self.simulator.program
+      retired = program.completed
+      statistics = {
+         'cycles': self.cycles,
+         'retired_instructions': retired,
+         'cpi': self.cycles / retired if retired else None,
+         'squashed_instructions': program.squashed,
+         'flushes': dict(self.flushes),
+         'stall_cycles': dict(self.stall_cycles),
+         'hazard_stalls': {opcode: dict(by_stage) for opcode, by_stage in self.hazard_stalls.items()},
+         'forwarding': dict(self.forwarding)
+      }
+      predictor = program.predictor
+      if predictor is not None:
+         statistics['branch_prediction'] = {
+            'predictor': predictor.name,
+            'branches': predictor.branches,
+            'mispredictions': predictor.mispredictions,
+            'accuracy': predictor.accuracy
+         }
+      caches = [cache for cache in (program.icache, program.dcache) if cache is not None]
+      if caches:
+         statistics['caches'] = {cache.name: dict(cache.counters(), hit_rate=cache.hit_rate) for cache in caches}
+      return statistics
+
+   def lines(self) -> List[str]:
+      "returns the counters as the lines of the STATISTICS output section"
+      statistics = self.statistics()
+      lines = [
+         f"cycles {statistics['cycles']}\n",
+         f"retired {statistics['retired_instructions']}\n",
+         f"CPI {'-' if statistics['cpi'] is None else format(statistics['cpi'], '.3f')}\n",
+         f"squashed {statistics['squashed_instructions']}\n"
+      ]
+      lines += [f"flushes {opcode} {count}\n" for opcode, count in statistics['flushes'].items()]
+      lines += [f"stalls {stage} {count}\n" for stage, count in statistics['stall_cycles'].items()]
+      for opcode, by_stage in statistics['hazard_stalls'].items():
+         lines += [f"hazard_stalls {opcode} {stage} {count}\n" for stage, count in by_stage.items()]
+      lines += [f"forwarding {path} {count}\n" for path, count in statistics['forwarding'].items()]
+      prediction = statistics.get('branch_prediction')
+      if prediction is not None:
+         accuracy = prediction['accuracy']
+         lines += [
+            f"branch_predictor {prediction['predictor']}\n",
+            f"branches {prediction['branches']}\n",
+            f"mispredictions {prediction['mispredictions']}\n",
+            f"prediction_accuracy {'-' if accuracy is None else format(accuracy, '.3f')}\n"
+         ]
+      for cache, counters in statistics.get('caches', {}).items():
+         lines += [f"{cache} {counter} {count}\n" for counter, count in counters.items() if counter != 'hit_rate']
+         lines.append(f"{cache} hit_rate {'-' if counters['hit_rate'] is None else format(counters['hit_rate'], '.3f')}\n")
+      return lines
+
+   def write_json(self, path: Path):
+      Path(path).write_text(json.dumps(self.statistics(), indent=2) + '\n')
+
+   def state(self) -> dict:
+      "returns the counters collected so far, for checkpoints"
+      return {
+         'cycles': self.cycles,
+         'stall_cycles': self.stall_cycles,
+         'hazard_stalls': self.hazard_stalls,
+         'flushes': self.flushes,
+         'forwarding': self.forwarding
+      }
+
+   def restore(self, state: dict):
+      self.cycles = state['cycles']
+      self.stall_cycles.update(state['stall_cycles'])
+      self.hazard_stalls = {opcode: dict(by_stage) for opcode, by_stage in state['hazard_stalls'].items()}
+      self.flushes = dict(state['flushes'])
+      self.forwarding = dict(state['forwarding'])
+
+def stage_name(stage: PipelineStage) -> str:
+   return getattr(stage.stage_id, 'name', str(stage.stage_id))
+
+def find_producer(stage: PipelineStage) -> PipelineStage:
+   """returns the nearest downstream stage whose instruction produces an operand the stage's
+   instruction requires and can't forward it to the stage, not yet forwardable or without a
+   path of the forwarding network, the check of PipelineStage.is_data_hazard
+   """
+   operands = stage.instruction.operands_required_at_stage(stage.stage_id)
+   producer = stage.next
+   while producer is not None:
+      instruction = producer.instruction
+      if instruction is not None:
+         for operand in operands:
+            if operand in instruction.output_operands and not producer.can_forward(stage.stage_id):
+               return producer
+      producer = producer.next
+   return None
+
+def find_source(stage: PipelineStage, operand: Operand) -> PipelineStage:
+   "returns the nearest downstream stage whose instruction produces the operand, the value the stage's instruction reads"
+   source = stage.next
+   while source is not None:
+      instruction = source.instruction
+      if instruction is not None and not instruction.noop and operand in instruction.output_operands:
+         return source
+      source = source.next
+   return None
@@ -0,0 +1,100 @@
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Tuple
+import sys
+
+from lib.generics.pipelinestage import PipelineStage
+from lib.vcpu_simulator import VCpuSimulator
+
+# phases of PipelineStage.tick in the order they run
+PHASES = [
+   'check_for_upstream_stalls',
+   'fetch_next_instruction',
+   'stall_for_hazards',
+   'execute_instruction',
+   'handle_operations'
+]
+
+class PipelineProfiler():
+   """Accumulates call counts and perf_counter_ns time of every phase of PipelineStage.tick per
+   stage, and of execute_instruction per opcode class of the instruction it ticked.
+
+   Attaching shadows the phase methods of each stage and the simulator's simulate with timed
+   wrappers set on the instances, nothing is changed on the classes, so simulations without a
+   profiler run exactly the same code as before. The report is written once simulate returns.
+   """
+   def __init__(self):
+      # (stage, phase) and opcode class: [calls, nanoseconds]
+      self.phases: Dict[Tuple[str, str], List[int]] = {}
+      self.opcodes: Dict[str, List[int]] = {}
+
+   def attach(self, simulator: VCpuSimulator, report_path: Path = None):
+      "instruments the simulator's stages, report_path is written at the end of simulate, None or - writes to stdout"
+      simulator.skip_stalled_stages = False # every tick is timed
+      for stage in simulator.stages:
+         for phase in PHASES:
+            if phase == 'execute_instruction':
+               wrapper = self.timed_execute(stage, getattr(stage, phase))
+            else:
+               wrapper = self.timed_phase(self.phase_stats(stage, phase), getattr(stage, phase))
+            setattr(stage, phase, wrapper)
+
+      simulate = simulator.simulate
+      def simulate_and_report(*args, **kwargs):
+         try:
+            return simulate(*args, **kwargs)
+         finally:
+            self.write_report(report_path)
+      simulator.simulate = simulate_and_report
+
+   def phase_stats(self, stage: PipelineStage, phase: str) -> List[int]:
+      stage_name = getattr(stage.stage_id, 'name', str(stage.stage_id))
+      return self.phases.setdefault((stage_name, phase), [0, 0])
+
+   def timed_phase(self, stats: List[int], method: Callable) -> Callable:
+      def timed(*args):
+         start = perf_counter_ns()
+         result = method(*args)
+         stats[1] += perf_counter_ns() - start
+         stats[0] += 1
+         return result
+      return timed
+
+   def timed_execute(self, stage: PipelineStage, method: Callable) -> Callable:
+      stats = self.phase_stats(stage, 'execute_instruction')
+      opcodes = self.opcodes
+      def timed(program, vcpu):
+         instruction = stage.instruction
+         start = perf_counter_ns()
+         result = method(program, vcpu)
+         elapsed = perf_counter_ns() - start
+         stats[1] += elapsed
+         stats[0] += 1
+         if instruction is not None and not stage.stalled: # the opcode ticked
+            opcode_stats = opcodes.setdefault(type(instruction.opcode).__name__, [0, 0])
+            opcode_stats[1] += elapsed
+            opcode_stats[0] += 1
+         return result
+      return timed
+
+   def report(self) -> str:
+      "returns a table of the phases per stage followed by the opcode classes"
+      lines = [f"{'stage':<6} {'phase':<26} {'calls':>10} {'total ms':>10} {'ns/call':>9}"]
+      for (stage_name, phase), (calls, ns) in self.phases.items():
+         lines.append(f"{stage_name:<6} {phase:<26} {calls:>10} {ns / 1e6:>10.3f} {ns // max(calls, 1):>9}")
+
+      total_ns = sum(ns for _, ns in self.phases.values())
+      lines.append(f"{'total':<33} {sum(calls for calls, _ in self.phases.values()):>10} {total_ns / 1e6:>10.3f}")
+      lines.append('')
+
+      lines.append(f"{'opcode':<33} {'ticks':>10} {'total ms':>10} {'ns/tick':>9}")
+      for name, (calls, ns) in sorted(self.opcodes.items(), key=lambda item: -item[1][1]):
+         lines.append(f"{name:<33} {calls:>10} {ns / 1e6:>10.3f} {ns // max(calls, 1):>9}")
+
+      return '\n'.join(lines) + '\n'
+
+   def write_report(self, report_path: Path = None):
+      if report_path is None or str(report_path) == '-':
+         sys.stdout.write(self.report())
+      else:
+         Path(report_path).write_text(self.report())
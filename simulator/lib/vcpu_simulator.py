@@ -1,15 +1,29 @@
-from typing import Dict, List
+from enum import Enum
+from typing import Callable, Dict, List
 from pathlib import Path
+import time
 from lib.generics.opcode import Opcode
-from lib.generics.vcpu import VCpu
+from lib.generics.vcpu import VCpu, REG_PROGRAM_COUNTER
 from lib.generics.pipelinestage import PipelineStage
 from lib.generics.mipsprogram import MipsProgram
+from lib.generics.pipeline_profile import OpcodeTiming
+from lib.generics.branch_predictor import BranchPredictor
+from lib.generics.cache import Cache
+
+DEFAULT_MAX_CYCLES = 29 # cycle budget of earlier versions, which stopped before cycle 30
+TIMEOUT_CHECK_CYCLES = 1024 # cycles between checks of the wall-clock timeout
+
+class SimulationStatus(Enum):
+   Finished = 'finished'
+   CycleBudgetExhausted = 'cycle budget exhausted'
+   TimedOut = 'timed out'
 
 class PipelineLogger():
    def __init__(self):
       self.logs = []
       self.registers = []
       self.memory = []
+      self.statistics = [] # lines of the optional STATISTICS section following the memory
 
    def log(self, cycle: int, program: MipsProgram, stages: List[PipelineStage]):
       spew_string = f"c#{cycle} "
@@ -28,13 +42,14 @@ class PipelineLogger():
       self.logs.append(spew_string + '\n')
 
    def log_registers(self, vcpu: VCpu):
-      for reg_key in vcpu.registers:
-         if reg_key != 'PC' and vcpu.registers[reg_key].value != 0:
-            self.registers.append(f"{reg_key} {vcpu.registers[reg_key].value}\n")
+      registers = vcpu.registers
+      for reg_key in registers:
+         if reg_key != REG_PROGRAM_COUNTER and registers[reg_key].value != 0:
+            self.registers.append(f"{reg_key} {registers[reg_key].value}\n")
 
    def log_memory(self, vcpu: VCpu):
-      for mem_key in vcpu.memory:
-         self.memory.append(f"{mem_key} {vcpu.memory[mem_key]}\n")
+      for mem_key, value in vcpu.memory.items():
+         self.memory.append(f"{mem_key} {value}\n")
 
    def write_to_file(self, filepath: Path):
       with open(filepath, 'w') as f:
@@ -43,45 +58,226 @@ class PipelineLogger():
          f.writelines(self.registers)
          f.write('MEMORY\n')
          f.writelines(self.memory)
+         if self.statistics:
+            f.write('STATISTICS\n')
+            f.writelines(self.statistics)
+
+   def position(self) -> int:
+      "returns how far the cycle log has got, the number of cycle lines logged"
+      return len(self.logs)
+
+   def flush(self):
+      "writes any buffered output, nothing is written before write_to_file"
+      pass
+
+   def close(self):
+      pass
+
+class StreamingPipelineLogger(PipelineLogger):
+   """Writes the cycle lines to the output file in chunks of chunk_lines while the simulation
+   runs, so memory use does not grow with the number of cycles and the cycles up to a crash
+   are on disk. logs only holds the lines not written yet. The file contents are identical
+   to PipelineLogger.write_to_file.
+
+   A logger resuming at a position keeps the first position bytes of an existing output file,
+   which must hold the cycles logged up to that position, and continues logging after them.
+   """
+   def __init__(self, filepath: Path, chunk_lines: int = 1024, position: int = None):
+      PipelineLogger.__init__(self)
+      self.filepath = Path(filepath)
+      self.chunk_lines = chunk_lines
+      if position is None:
+         self.file = open(self.filepath, 'w')
+      else:
+         if not self.filepath.is_file() or self.filepath.stat().st_size < position:
+            raise AssertionError(f"{self.filepath} does not hold the {position} bytes of cycles logged before resuming")
+         with open(self.filepath, 'r+b') as f:
+            f.truncate(position)
+         self.file = open(self.filepath, 'a')
+
+   def log(self, cycle: int, program: MipsProgram, stages: List[PipelineStage]):
+      PipelineLogger.log(self, cycle, program, stages)
+      if len(self.logs) >= self.chunk_lines:
+         self.file.writelines(self.logs)
+         self.logs.clear()
+
+   def write_to_file(self, filepath: Path):
+      "completes the streamed file with the final registers and memory, filepath must be the file streamed to"
+      if Path(filepath) != self.filepath:
+         raise AssertionError(f"Streaming logger writes to {self.filepath}, not {filepath}")
+
+      self.file.writelines(self.logs)
+      self.logs.clear()
+      self.file.write('REGISTERS\n')
+      self.file.writelines(self.registers)
+      self.file.write('MEMORY\n')
+      self.file.writelines(self.memory)
+      if self.statistics:
+         self.file.write('STATISTICS\n')
+         self.file.writelines(self.statistics)
+      self.close()
+
+   def position(self) -> int:
+      "returns the number of bytes of cycles logged, everything logged so far is written first"
+      self.flush()
+      return self.file.tell()
+
+   def flush(self):
+      if not self.file.closed:
+         self.file.writelines(self.logs)
+         self.logs.clear()
+         self.file.flush()
+
+   def close(self):
+      if not self.file.closed:
+         self.flush()
+         self.file.close()
 
 class VCpuSimulator():
    def __init__(self, vcpu: VCpu, stages: List[PipelineStage], logger: PipelineLogger):
       self.vcpu = vcpu
       self.stages = stages
       self.logger = logger
+      self.cycle = 1 # next cycle to simulate
+      # skip the ticks of stages stalled behind a stage which stays stalled, cleared by
+      # instrumentation which needs every tick
+      self.skip_stalled_stages = True
+      self.prepared = False
 
-   def load_program(self, opcodes: Dict[int, Opcode]):
-      self.program = MipsProgram(opcodes)
+   def load_program(
+         self,
+         opcodes: Dict[int, Opcode],
+         timings: Dict[type, OpcodeTiming] = None,
+         predictor: BranchPredictor = None,
+         icache: Cache = None,
+         dcache: Cache = None
+      ):
+      """timings holds the timing of each opcode class in the simulated pipeline, None for the opcodes' own.
+      predictor predicts the branches fetched, None predicts every branch not taken without counting them.
+      icache and dcache are the caches fetch and the loads and stores look up, None for no cache
+      """
+      self.program = MipsProgram(opcodes, timings, predictor, icache, dcache)
 
    def pipeline_finished(self) -> bool:
-      for stage in self.stages:
-         if stage.instruction != None:
-            if not stage.instruction.noop:
-               return False
-      return True
+      "True once every fetched instruction has completed or been squashed"
+      return self.program.in_flight == 0
+
+   def prepare(self):
+      """orders the stages for ticking, once before the first cycle is simulated. Instrumentation
+      wrapping the stages must be attached before
+      """
+      # stages tick and are logged from the last to the first
+      self.stages.reverse()
+      reversed_stages = self.stages
+
+      # A stage which is stalled, and whose next stage is stalled once it has ticked, keeps its
+      # instruction and executes nothing, provided its previous stage is stalled as well. So
+      # when the first stages of the pipeline are stalled and the last of them is still stalled
+      # after ticking, the ticks of the stages before it change nothing and are skipped.
+      # tick_groups[n] holds the stages ticked before checking and the stages skipped when the
+      # first n stages are stalled.
+      self.stages_in_order = reversed_stages[::-1]
+      count = len(self.stages_in_order)
+      self.tick_groups = [(reversed_stages[:count - n + 1], reversed_stages[count - n + 1:]) for n in range(count + 1)]
+      # an array core simulates whole cycles unless instrumentation needs the ticks of its stages
+      self.core = getattr(self.stages_in_order[0], 'core', None) if self.skip_stalled_stages else None
+      self.prepared = True
+
+   def run(
+         self,
+         max_cycles: int = None,
+         deadline: float = None,
+         checkpoint_every: int = None,
+         checkpoint: Callable[['VCpuSimulator'], None] = None
+      ) -> SimulationStatus:
+      """Simulates cycles from self.cycle until the program has finished or max_cycles has been
+      simulated, it may be called again with a later max_cycles to continue
+
+      Inputs:
+         max_cycles: last cycle simulated, None for unlimited.
+         deadline: time.perf_counter() value after which the simulation is stopped, None for no timeout.
+         checkpoint_every: number of cycles between calls to checkpoint, None to never call it.
+         checkpoint: called with the simulator after every checkpoint_every cycles.
+
+      Returns:
+         whether the program finished or the simulation was stopped early
+      """
+      if not self.prepared:
+         self.prepare()
+      program = self.program
+      vcpu = self.vcpu
+      reversed_stages = self.stages
+      stages_in_order = self.stages_in_order
+      tick_groups = self.tick_groups
+      skip_stalled_stages = self.skip_stalled_stages
+      core = self.core
+      while self.cycle == 1 or program.in_flight != 0:
+         cycle = self.cycle
+         if max_cycles is not None and cycle > max_cycles:
+            return SimulationStatus.CycleBudgetExhausted
+         if deadline is not None and cycle % TIMEOUT_CHECK_CYCLES == 0 and time.perf_counter() > deadline:
+            return SimulationStatus.TimedOut
+
+         if core is not None:
+            core.cycle(program, vcpu)
+         else:
+            stalled = 0
+            if skip_stalled_stages:
+               for stage in stages_in_order:
+                  if not stage.stalled:
+                     break
+                  stalled += 1
+            if stalled < 2:
+               for stage in reversed_stages:
+                  stage.tick(program, vcpu)
+            else:
+               ticked, skipped = tick_groups[stalled]
+               for stage in ticked:
+                  stage.tick(program, vcpu)
+               if not stages_in_order[stalled - 1].stalled:
+                  for stage in skipped:
+                     stage.tick(program, vcpu)
+         # log cycle
+         if program.in_flight != 0:
+            self.logger.log(cycle, program, self.stages)
+         self.cycle = cycle + 1
+
+         if checkpoint_every is not None and cycle % checkpoint_every == 0:
+            checkpoint(self)
+      return SimulationStatus.Finished
+
+   def simulate(
+         self,
+         max_cycles: int = DEFAULT_MAX_CYCLES,
+         timeout: float = None,
+         checkpoint_every: int = None,
+         checkpoint: Callable[['VCpuSimulator'], None] = None
+      ) -> SimulationStatus:
+      """Simulates the pipeline cycle by cycle until the program has finished, continuing from
+      self.cycle when the simulator has been restored from a checkpoint
+
+      Inputs:
+         max_cycles: last cycle simulated, None for unlimited.
+         timeout: seconds of wall-clock time after which the simulation is stopped, None for no timeout.
+         checkpoint_every: number of cycles between calls to checkpoint, None to never call it.
+         checkpoint: called with the simulator after every checkpoint_every cycles.
 
-   def simulate(self, max_cycles=30):
-      cycle = 1
+      Returns:
+         whether the program finished or the simulation was stopped early
+      """
       try:
-         reversed_stages = self.stages
-         reversed_stages.reverse()
-         firstround = True
-         while (firstround or not self.pipeline_finished()) and cycle < max_cycles:
-            firstround = False
-            for stage in reversed_stages:
-               stage.tick(self.program, self.vcpu)
-            # log cycle
-            if not self.pipeline_finished():
-               self.logger.log(cycle, self.program, self.stages)
-            cycle = cycle + 1
+         deadline = None if timeout is None else time.perf_counter() + timeout
+         status = self.run(max_cycles, deadline, checkpoint_every, checkpoint)
 
          # log final reg/mem states
          self.logger.log_memory(self.vcpu)
          self.logger.log_registers(self.vcpu)
+         return status
 
       except:
-         # print current state of all items
-         print(self.logger.logs)
+         # keep the cycles logged so far and print current state of all items
+         self.logger.flush()
+         print(f"Simulation failed in cycle {self.cycle}")
          print(self.vcpu.registers)
          print(self.vcpu.memory)
          raise
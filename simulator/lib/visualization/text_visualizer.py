@@ -0,0 +1,188 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, TextIO, Tuple
+import sys
+
+from lib.vcpu_simulator import VCpuSimulator, PipelineLogger
+from lib.generics.mipsprogram import MipsProgram
+from lib.generics.pipelinestage import PipelineStage
+from lib.binary_trace import TraceReader
+
+DEFAULT_DIAGRAM_CYCLES = 100 # cycles a window given by its first cycle only spans
+STALL_CELL = 'stall'
+ID_WIDTH = 8 # 'I' and the exe_id, wider ids shift their row
+
+def parse_cycle_window(value: str) -> Tuple[int, int]:
+   """returns the first and last cycle of a window given as FIRST:LAST, or FIRST for the
+   DEFAULT_DIAGRAM_CYCLES cycles from FIRST, otherwise throws exception
+   """
+   first, _, last = str(value).partition(':')
+   if not first.strip().isdigit() or (last.strip() and not last.strip().isdigit()):
+      raise AssertionError(f"Cycle window {value} is not FIRST:LAST or FIRST")
+   first = int(first)
+   last = int(last) if last.strip() else first + DEFAULT_DIAGRAM_CYCLES - 1
+   if first < 1 or last < first:
+      raise AssertionError(f"Cycle window {value} does not hold a cycle, the first cycle is 1")
+   return first, last
+
+class DiagramRow():
+   "cells of one instruction from the first cycle of the window it was in the pipeline"
+   __slots__ = ('exe_id', 'label', 'start', 'cells', 'last', 'finished')
+
+   def __init__(self, exe_id: int, label: str, start: int):
+      self.exe_id = exe_id
+      self.label = label
+      self.start = start
+      self.cells: List[str] = []
+      self.last = start
+      self.finished = False
+
+class TextVisualizer():
+   """Writes the classic pipeline diagram of a window of cycles, a row per instruction and a
+   column per cycle, each cell the stage the instruction was in or stall
+
+   Cycles are added one at a time, as the logger logs them. A row is written once its
+   instruction has left the pipeline, squashed or completed, and the rows written before it
+   have, so rows stay in exe_id order and only the instructions in flight are held. Cycles
+   before the window are skipped and the diagram is complete with the last cycle of the window,
+   so the cost of a diagram does not grow with the cycles simulated.
+   """
+   def __init__(
+         self,
+         out: TextIO,
+         stage_names: List[str],
+         first_cycle: int = 1,
+         last_cycle: int = DEFAULT_DIAGRAM_CYCLES,
+         source: List[str] = None
+      ):
+      """Inputs:
+         out: text stream the diagram is written to.
+         stage_names: names of the stages, the cells are as wide as the longest.
+         first_cycle, last_cycle: window of cycles drawn.
+         source: source line of each pc labelling the rows, None to label them by exe_id only.
+      """
+      self.out = out
+      self.first_cycle = first_cycle
+      self.last_cycle = last_cycle
+      self.source = None if source is None else [line.strip() for line in source]
+      self.cell_width = max([len(STALL_CELL), len(str(last_cycle))] + [len(name) for name in stage_names]) + 1
+      self.label_width = ID_WIDTH + (0 if not self.source else max(len(line) for line in self.source) + 1)
+      self.rows: Dict[int, DiagramRow] = {} # in exe_id order, the rows not written yet
+      self.started = False
+      self.finished = False
+
+   def add_cycle(self, cycle: int, slots: Iterable[Tuple[int, int, str, bool]]):
+      """adds the cycle's (exe_id, pc, stage, stalled) of every stage holding an instruction,
+      cycles must be added in order
+      """
+      if self.finished or cycle < self.first_cycle:
+         return
+      if cycle > self.last_cycle:
+         self.finish()
+         return
+      if not self.started:
+         self.write_header()
+      rows = self.rows
+      for exe_id, pc, stage, stalled in slots:
+         row = rows.get(exe_id)
+         if row is None:
+            label = f"I{exe_id}"
+            if self.source:
+               label = f"{label:<{ID_WIDTH}}{self.source[pc]}"
+            row = rows[exe_id] = DiagramRow(exe_id, label, cycle)
+         row.cells.append(STALL_CELL if stalled else stage)
+         row.last = cycle
+
+      # instructions missing from the cycle have left the pipeline
+      for row in rows.values():
+         if row.last != cycle:
+            row.finished = True
+      self.write_finished_rows()
+
+   def write_header(self):
+      width = self.cell_width
+      cycles = ''.join(f"{cycle:<{width}}" for cycle in range(self.first_cycle, self.last_cycle + 1))
+      self.out.write(f"{'cycle':<{self.label_width}}| {cycles}".rstrip() + '\n')
+      self.started = True
+
+   def write_row(self, row: DiagramRow):
+      width = self.cell_width
+      cells = ' ' * (width * (row.start - self.first_cycle)) + ''.join(f"{cell:<{width}}" for cell in row.cells)
+      self.out.write(f"{row.label:<{self.label_width}}| {cells}".rstrip() + '\n')
+
+   def write_finished_rows(self):
+      "writes the finished rows which no row before them is waiting for"
+      rows = self.rows
+      while rows:
+         exe_id = next(iter(rows))
+         if not rows[exe_id].finished:
+            break
+         self.write_row(rows.pop(exe_id))
+
+   def finish(self):
+      "writes the rows of the instructions still in flight, the diagram is complete"
+      if self.finished:
+         return
+      self.finished = True
+      if not self.started:
+         self.write_header()
+      for row in self.rows.values():
+         self.write_row(row)
+      self.rows.clear()
+
+   def attach(self, simulator: VCpuSimulator):
+      """adds the cycles the simulator's logger logs, the diagram is complete once simulate
+      returns. The logger's log is shadowed on the instance until the window has passed
+      """
+      logger: PipelineLogger = simulator.logger
+      log = logger.log
+      last_cycle = self.last_cycle
+      def log_and_draw(cycle: int, program: MipsProgram, stages: List[PipelineStage]):
+         log(cycle, program, stages)
+         if cycle > last_cycle:
+            self.finish()
+            logger.log = log # nothing more to draw
+         elif cycle >= self.first_cycle:
+            self.add_cycle(cycle, stage_slots(stages))
+      logger.log = log_and_draw
+
+      simulate = simulator.simulate
+      def simulate_and_finish(*args, **kwargs):
+         try:
+            return simulate(*args, **kwargs)
+         finally:
+            self.finish()
+      simulator.simulate = simulate_and_finish
+
+def stage_slots(stages: List[PipelineStage]) -> List[Tuple[int, int, str, bool]]:
+   "returns the (exe_id, pc, stage, stalled) of the stages logged, as the logger lists them"
+   return [
+      (stage.instruction.exe_id, stage.instruction.pc, stage.stage_id.name, stage.stalled)
+      for stage in stages if stage.instruction is not None and not stage.instruction.noop
+   ]
+
+def open_diagram(path: Path) -> TextIO:
+   "returns the stream a diagram is written to, - for stdout"
+   if str(path) == '-':
+      return sys.stdout
+   return open(path, 'w')
+
+def render_trace(trace_path: Path, diagram_path: Path, first_cycle: int = 1, last_cycle: int = DEFAULT_DIAGRAM_CYCLES):
+   """writes the diagram of a window of a binary trace, - for stdout. The records of the
+   window are found by seeking, the cycles before it are not read. Traces don't hold the
+   program, rows are labelled by exe_id only
+   """
+   reader = TraceReader(trace_path)
+   out = open_diagram(diagram_path)
+   try:
+      visualizer = TextVisualizer(out, reader.stage_names, first_cycle, last_cycle)
+      stage_names = reader.stage_names
+      for idx in range(reader.index(first_cycle), len(reader)):
+         record = reader[idx]
+         if record.cycle > last_cycle:
+            break
+         visualizer.add_cycle(record.cycle, [(exe_id, None, stage, stalled) for exe_id, stage, stalled in record.slots(stage_names)])
+      visualizer.finish()
+   finally:
+      if out is not sys.stdout:
+         out.close()
+      reader.close()
@@ -1,47 +1,30 @@
 import argparse
 from pathlib import Path
 import re
+import time
 
 # import ptvsd
 # ptvsd.enable_attach()
 # ptvsd.wait_for_attach()
 
-from input_parser import load_toml, get_code, get_initial_memory_state, get_initial_register_state
-from mips_virtualization.assembler import preprocess, assemble
-from mips_virtualization.impl.mips_stage import build_8_stage_pipeline
-from lib.generics.register import Register
-from lib.vcpu_simulator import VCpuSimulator, PipelineLogger
-from lib.generics.vcpu import VCpu
-
-def simulate(inputFile: Path, outputFile: Path):
-   # load input
-   toml_contents = load_toml(inputFile)
-   code = get_code(toml_contents)
-   registers = get_initial_register_state(toml_contents)
-   memory = get_initial_memory_state(toml_contents)
-
-   # preprocess and assemble
-   preprocessed_code = preprocess(code.strip().split('\n'))
-   assembled_opcodes = assemble(preprocessed_code)
-
-   # construct stages and vcpu model
-   MAX_MEMORY_ADDR = 992
-   MAX_REGISTER = 31
-   # init all undefined registers to 0
-   for i in range(0, MAX_REGISTER+1):
-      if f'R{i}' not in registers.keys():
-         registers[f'R{i}'] = Register(0)
-   vcpu = VCpu(registers, memory, 992)
-   stages = build_8_stage_pipeline()
-   logger = PipelineLogger()
-
-   # simulate
-   simulator = VCpuSimulator(vcpu, stages, logger)
-   simulator.load_program(assembled_opcodes)
-   simulator.simulate()
-
-   # write output to file
-   logger.write_to_file(outputFile)
+from simulation import SIMULATION_MODES, TRACE_FORMATS, simulate
+from input_parser import parse_cycle_budget, parse_timeout
+from lib.vcpu_simulator import SimulationStatus
+from batch import collect_jobs, run_batch, format_summary
+from lib.generics.memory import MEMORY_BACKENDS
+from lib.generics.branch_predictor import BRANCH_PREDICTORS
+from lib.binary_trace import convert_trace
+from lib.visualization.text_visualizer import DEFAULT_DIAGRAM_CYCLES, parse_cycle_window, render_trace
+from mips_virtualization.impl.mips_stage import PIPELINE_CORES
+
+def argument_type(parse):
+   "adapts an input parser to argparse, which reports invalid values as usage errors"
+   def parse_argument(value: str):
+      try:
+         return parse(value)
+      except AssertionError as e:
+         raise argparse.ArgumentTypeError(str(e))
+   return parse_argument
 
 def main():
    parser = argparse.ArgumentParser(
@@ -50,8 +33,88 @@ def main():
 
    subparsers = parser.add_subparsers(help='subcommand help', dest="command")
 
+   # options shared by single and batch simulations
+   options_parser = argparse.ArgumentParser(add_help=False)
+   options_parser.add_argument(
+         '--mode',
+         choices = SIMULATION_MODES,
+         default = 'pipeline',
+         help = 'pipeline simulates every cycle of the 8 stage pipeline, functional executes one instruction per step and only reports the final registers and memory. Programs the pipeline may complete out of order are rejected in functional mode.'
+      )
+   options_parser.add_argument(
+         '--max-cycles',
+         type = argument_type(parse_cycle_budget),
+         default = None,
+         help = 'Number of cycles simulated at most, or \'unlimited\'. In functional mode the number of instructions executed. Overrides max_cycles of the input\'s [simulation] table, defaults to 29 cycles in pipeline mode and unlimited in functional mode.'
+      )
+   options_parser.add_argument(
+         '--timeout',
+         type = argument_type(parse_timeout),
+         default = None,
+         help = 'Seconds of wall-clock time after which the simulation is stopped. Overrides timeout of the input\'s [simulation] table.'
+      )
+   options_parser.add_argument(
+         '--program-cache',
+         type = Path,
+         default = None,
+         help = 'Directory assembled programs are cached in and reused from across runs, programs are always cached in memory.'
+      )
+   options_parser.add_argument(
+         '--pipeline',
+         type = Path,
+         default = None,
+         help = 'Pipeline profile describing the stages and the stages each opcode uses, defaults to the 8 stage pipeline.'
+      )
+   options_parser.add_argument(
+         '--forwarding',
+         default = 'full',
+         help = 'Forwarding network results are bypassed over: full, none or a network defined by the pipeline profile, e.g. ex-ex. Pipeline mode only.'
+      )
+   options_parser.add_argument(
+         '--branch-predictor',
+         choices = list(BRANCH_PREDICTORS.keys()),
+         default = 'not-taken',
+         help = 'Predictor consulted when fetching a branch, a mispredicted branch flushes the pipeline when it resolves. Pipeline mode only.'
+      )
+   options_parser.add_argument(
+         '--caches',
+         type = Path,
+         default = None,
+         help = 'Cache configuration of the L1 instruction and data caches, a miss stalls the stage fetching or accessing memory for the miss penalty. Pipeline mode only.'
+      )
+   options_parser.add_argument(
+         '--pipeline-core',
+         choices = PIPELINE_CORES,
+         default = 'arrays',
+         help = 'arrays simulates whole cycles over arrays holding the state of every stage, stages ticks each linked pipeline stage. Both produce the same output. Pipeline mode only.'
+      )
+   options_parser.add_argument(
+         '--trace-format',
+         choices = TRACE_FORMATS,
+         default = 'text',
+         help = 'text writes a line per cycle, binary a fixed size record per cycle which convert-trace turns into the same text.'
+      )
+   options_parser.add_argument(
+         '--core-processes',
+         action = 'store_true',
+         help = 'Simulate each core of an input with [[cores]] tables in its own process over shared memory instead of one after the other in this process. Both produce the same output.'
+      )
+   options_parser.add_argument(
+         '--sync-cycles',
+         type = int,
+         default = 1,
+         help = 'Number of cycles between synchronizations of the cores of an input with [[cores]] tables, a core sees the memory writes of the other cores after the next synchronization. Defaults to every cycle.'
+      )
+   options_parser.add_argument(
+         '--memory-backend',
+         choices = list(MEMORY_BACKENDS.keys()),
+         default = 'flat',
+         help = 'Data memory implementation, flat array, memory mapped or sparse dict. flat and mmap hold 64 bit words and reject larger values, dict holds unbounded values.'
+      )
+
    simulate_parser = subparsers.add_parser(
          name='simulate',
+         parents=[options_parser],
          help='Run simulation on input and write results to output.'
       )
 
@@ -65,6 +128,145 @@ def main():
          type = Path,
          help = 'Path to output first input file.'
       )
+   simulate_parser.add_argument(
+         '--memory-image',
+         type = Path,
+         default = None,
+         help = 'Raw image of 64 bit words loaded into memory from address 0 before the input memory values, memory is enlarged to fit the image.'
+      )
+   simulate_parser.add_argument(
+         '--memory-dump',
+         type = Path,
+         default = None,
+         help = 'Path to write the final memory as a raw image of 64 bit words.'
+      )
+
+   simulate_parser.add_argument(
+         '--program-image',
+         type = Path,
+         default = None,
+         help = 'Precompiled program image simulated instead of the input\'s code, the input still provides the registers and memory.'
+      )
+   simulate_parser.add_argument(
+         '--write-program-image',
+         type = Path,
+         default = None,
+         help = 'Path to write the program as an image of 32 bit MIPS instruction words, loadable with --program-image.'
+      )
+
+   simulate_parser.add_argument(
+         '--checkpoint-every',
+         type = int,
+         default = None,
+         help = 'Write a checkpoint of the simulation state every N cycles, pipeline mode only.'
+      )
+   simulate_parser.add_argument(
+         '--checkpoint',
+         type = Path,
+         default = None,
+         help = 'Path checkpoints are written to, defaults to the output path followed by .ckpt.'
+      )
+   simulate_parser.add_argument(
+         '--restore',
+         type = Path,
+         default = None,
+         help = 'Resume from a checkpoint of the same input, the output must still hold the cycles simulated before the checkpoint.'
+      )
+
+   simulate_parser.add_argument(
+         '--profile',
+         type = Path,
+         default = None,
+         help = 'Write the time spent in each phase of every pipeline stage and in each opcode to the path, - for stdout. Pipeline mode only.'
+      )
+   simulate_parser.add_argument(
+         '--statistics',
+         action = 'store_true',
+         help = 'Append a STATISTICS section with cycles, CPI, stalls, hazards and flushes to the output. Pipeline mode only.'
+      )
+   simulate_parser.add_argument(
+         '--statistics-json',
+         type = Path,
+         default = None,
+         help = 'Write the statistics as json to the path. Pipeline mode only.'
+      )
+
+   simulate_parser.add_argument(
+         '--diagram',
+         type = Path,
+         default = None,
+         help = 'Write the pipeline diagram of the cycles in --diagram-cycles to the path, a row per instruction and a column per cycle, - for stdout. Pipeline mode only.'
+      )
+   simulate_parser.add_argument(
+         '--diagram-cycles',
+         type = argument_type(parse_cycle_window),
+         default = (1, DEFAULT_DIAGRAM_CYCLES),
+         help = f'Cycles drawn by --diagram, FIRST:LAST or FIRST for {DEFAULT_DIAGRAM_CYCLES} cycles from FIRST. Defaults to the first {DEFAULT_DIAGRAM_CYCLES} cycles.'
+      )
+
+   batch_parser = subparsers.add_parser(
+         name='batch',
+         parents=[options_parser],
+         help='Run simulations of many inputs in parallel and print a summary.'
+      )
+   batch_parser.add_argument(
+         'sources',
+         nargs = '+',
+         help = 'Directories of .toml inputs, glob patterns of inputs or manifests listing an input and output path per line.'
+      )
+   batch_parser.add_argument(
+         '--output-dir',
+         type = Path,
+         default = None,
+         help = 'Directory outputs of directory and glob sources are written to, input_x.toml is written to output_x.txt. Defaults to the input\'s directory.'
+      )
+   batch_parser.add_argument(
+         '--lockstep',
+         action = 'store_true',
+         help = 'Simulate the inputs sharing the same code together over NumPy arrays of their registers and memory, the outputs are identical. Functional mode only, requires numpy.'
+      )
+   batch_parser.add_argument(
+         '--workers',
+         type = int,
+         default = None,
+         help = 'Number of worker processes, defaults to the number of cpus.'
+      )
+
+   convert_parser = subparsers.add_parser(
+         name='convert-trace',
+         help='Convert an output written with --trace-format binary to the text output.'
+      )
+   convert_parser.add_argument(
+         'trace',
+         type = Path,
+         help = 'Path to the binary output.'
+      )
+   convert_parser.add_argument(
+         'output',
+         type = Path,
+         help = 'Path to write the text output to.'
+      )
+
+   diagram_parser = subparsers.add_parser(
+         name='diagram',
+         help='Draw the pipeline diagram of a window of cycles of an output written with --trace-format binary.'
+      )
+   diagram_parser.add_argument(
+         'trace',
+         type = Path,
+         help = 'Path to the binary output.'
+      )
+   diagram_parser.add_argument(
+         'output',
+         type = Path,
+         help = 'Path to write the diagram to, - for stdout.'
+      )
+   diagram_parser.add_argument(
+         '--cycles',
+         type = argument_type(parse_cycle_window),
+         default = (1, DEFAULT_DIAGRAM_CYCLES),
+         help = f'Cycles drawn, FIRST:LAST or FIRST for {DEFAULT_DIAGRAM_CYCLES} cycles from FIRST. Defaults to the first {DEFAULT_DIAGRAM_CYCLES} cycles.'
+      )
 
    exit_parser = subparsers.add_parser(
          name='exit',
@@ -74,8 +276,66 @@ def main():
    args = parser.parse_args()
 
    while args.command != 'exit':
-      # run the simulation
-      simulate(args.input, args.output)
+      if args.command == 'batch':
+         # run the simulations, failed jobs are reported in the summary
+         start = time.perf_counter()
+         jobs = collect_jobs(args.sources, args.output_dir)
+         results = run_batch(
+               jobs,
+               args.workers,
+               lockstep = args.lockstep,
+               mode = args.mode,
+               max_cycles = args.max_cycles,
+               timeout = args.timeout,
+               memory_backend = args.memory_backend,
+               program_cache = args.program_cache,
+               pipeline = args.pipeline,
+               branch_predictor = args.branch_predictor,
+               forwarding = args.forwarding,
+               trace_format = args.trace_format,
+               pipeline_core = args.pipeline_core,
+               core_processes = args.core_processes,
+               sync_cycles = args.sync_cycles,
+               caches = args.caches
+            )
+         print(format_summary(results, time.perf_counter() - start))
+      elif args.command == 'convert-trace':
+         convert_trace(args.trace, args.output)
+      elif args.command == 'diagram':
+         render_trace(args.trace, args.output, *args.cycles)
+      else:
+         # run the simulation
+         status = simulate(
+               args.input,
+               args.output,
+               mode = args.mode,
+               max_cycles = args.max_cycles,
+               timeout = args.timeout,
+               memory_backend = args.memory_backend,
+               memory_image = args.memory_image,
+               memory_dump = args.memory_dump,
+               checkpoint_every = args.checkpoint_every,
+               checkpoint_path = args.checkpoint,
+               restore = args.restore,
+               program_cache = args.program_cache,
+               profile = args.profile,
+               statistics = args.statistics,
+               statistics_json = args.statistics_json,
+               pipeline = args.pipeline,
+               branch_predictor = args.branch_predictor,
+               forwarding = args.forwarding,
+               program_image = args.program_image,
+               write_program_image = args.write_program_image,
+               trace_format = args.trace_format,
+               pipeline_core = args.pipeline_core,
+               core_processes = args.core_processes,
+               sync_cycles = args.sync_cycles,
+               caches = args.caches,
+               diagram = args.diagram,
+               diagram_cycles = args.diagram_cycles
+            )
+         if status != SimulationStatus.Finished:
+            print(f"Simulation of {args.input} {status.value} before the program finished, {args.output} holds the state reached")
 
       # get next command
       valid = False
@@ -92,6 +352,8 @@ def main():
             valid = True
          except SystemExit:
             print('')
+         except EOFError: # input closed, nothing more to run
+            return
 
 if __name__ == '__main__':
    main()
@@ -1,9 +1,10 @@
 import sys
-from typing import List
+from typing import Dict, List
 import re
 
 from mips_virtualization.impl import instructions
 from lib.generics.opcode import Opcode
+from lib.generics.pipeline_profile import PipelineProfile, OpcodeTiming
 from lib.generics.operand import Operand, RegisterOperand, ImmediateOperand, RegisterIndirectOperand, DisplacementOperand
 
 def preprocess(code: List[str]) -> List[str]:
@@ -29,20 +30,35 @@ def preprocess(code: List[str]) -> List[str]:
 
    return processedCode
 
+# bump whenever the opcodes assembled from the same source change, invalidating cached programs
+ASSEMBLER_VERSION = 1
+
+INSTRUCTION_MAP = {
+   'DADD': instructions.Dadd,
+   'LD': instructions.Ld,
+   'SD': instructions.Sd,
+   'BNEZ': instructions.Bnez,
+   'SUB': instructions.Sub
+}
+
 def find_opcode(name: str):
    "returns pointer to opcode class, otherwise throws exception"
-   instruction_map = {
-      'DADD': instructions.Dadd,
-      'LD': instructions.Ld,
-      'SD': instructions.Sd,
-      'BNEZ': instructions.Bnez,
-      'SUB': instructions.Sub
-   }
+   if name in INSTRUCTION_MAP.keys():
+      return INSTRUCTION_MAP[name]
 
-   if name in instruction_map.keys():
-      return instruction_map[name]
+   raise AssertionError(f"opcode {name} not in supported instructions {INSTRUCTION_MAP}")
 
-   raise AssertionError(f"opcode {name} not in supported instructions {instruction_map}")
+def opcode_timings(profile: PipelineProfile) -> Dict[type, OpcodeTiming]:
+   "returns the timing of every opcode class in the profile, otherwise throws exception"
+   timings = {}
+   for name, opcode_cls in INSTRUCTION_MAP.items():
+      timing = profile.timing(name)
+      try:
+         opcode_cls.validate_timing(timing)
+      except AssertionError as e:
+         raise AssertionError(f"Pipeline profile {profile.name} opcode {name}: {e}")
+      timings[opcode_cls] = timing
+   return timings
 
 def get_operand(operand_code: str):
    "compiles operand code into operand and returns the operand if the opcode supports it"
@@ -0,0 +1,195 @@
+from array import array
+from pathlib import Path
+from typing import Dict
+import mmap
+import os
+import struct
+
+from mips_virtualization.assembler import INSTRUCTION_MAP
+from mips_virtualization.impl import instructions
+from mips_virtualization.program_cache import AssembledProgram
+from lib.generics.opcode import Opcode
+from lib.generics.operand import Operand, RegisterOperand, ImmediateOperand, RegisterIndirectOperand, DisplacementOperand
+from lib.generics.register import NUM_REGISTERS, REGISTER_NAMES, register_index
+
+# MIPS64 encodings of the supported instructions, every instruction is one 32 bit word:
+#   R-type  opcode 0 | rs 5 | rt 5 | rd 5 | shamt 5 | funct 6    DADD rd, rs, rt    SUB rd, rs, rt
+#   I-type  opcode 6 | rs 5 | rt 5 | immediate 16                 DADDI rt, rs, #imm LD rt, imm(rs)
+#                                                                  SD rt, imm(rs)     BNE rs, R0, offset
+# BNEZ R, #target is BNE against zero, offset is the signed distance from the next pc to the target.
+# SUB with an immediate has no MIPS encoding and uses the reserved opcode 0x3B, DSUBI. Forms the
+# assembler accepts beyond these, such as an immediate first operand, have no encoding.
+OPCODE_SPECIAL = 0x00
+OPCODE_BNE = 0x05
+OPCODE_DADDI = 0x18
+OPCODE_LD = 0x37
+OPCODE_DSUBI = 0x3B
+OPCODE_SD = 0x3F
+FUNCT_SUB = 0x22
+FUNCT_DADD = 0x2C
+
+IMMEDIATE_MIN = -(1 << 15)
+IMMEDIATE_MAX = (1 << 15) - 1
+
+# program images are the magic, the version and instruction count, then the native byte order words
+PROGRAM_IMAGE_MAGIC = b'MIPSPROG'
+PROGRAM_IMAGE_VERSION = 1
+PROGRAM_IMAGE_HEADER = '<II'
+PROGRAM_IMAGE_SUFFIX = '.bin'
+
+# the words of an image are read into an array of this typecode, 4 bytes on every supported platform
+WORD_TYPECODE = 'I'
+
+def r_type(rs: int, rt: int, rd: int, funct: int) -> int:
+   return (OPCODE_SPECIAL << 26) | (rs << 21) | (rt << 16) | (rd << 11) | funct
+
+def i_type(opcode: int, rs: int, rt: int, immediate: int) -> int:
+   if not IMMEDIATE_MIN <= immediate <= IMMEDIATE_MAX:
+      raise AssertionError(f"immediate {immediate} does not fit the 16 bit immediate field")
+   return (opcode << 26) | (rs << 21) | (rt << 16) | (immediate & 0xFFFF)
+
+def register_field(operand: Operand) -> int:
+   "returns the register number of a general purpose register operand, otherwise throws exception"
+   idx = register_index(operand.register_id)
+   if idx >= NUM_REGISTERS:
+      raise AssertionError(f"register {operand.register_id} has no encoding")
+   return idx
+
+def is_register(operand: Operand) -> bool:
+   return isinstance(operand, RegisterOperand)
+
+def is_memory(operand: Operand) -> bool:
+   return isinstance(operand, (RegisterIndirectOperand, DisplacementOperand))
+
+def memory_offset(operand: Operand) -> int:
+   return operand.offset if isinstance(operand, DisplacementOperand) else 0
+
+def encode_opcode(opcode: Opcode, pc: int) -> int:
+   "returns the instruction word of the opcode at the pc, otherwise throws exception"
+   operands = opcode.operands
+   if isinstance(opcode, (instructions.Dadd, instructions.Sub)):
+      rd = opcode.output_operands[0]
+      if is_register(rd) and is_register(operands[0]) and is_register(operands[1]):
+         funct = FUNCT_DADD if isinstance(opcode, instructions.Dadd) else FUNCT_SUB
+         return r_type(register_field(operands[0]), register_field(operands[1]), register_field(rd), funct)
+      if is_register(rd) and is_register(operands[0]) and isinstance(operands[1], ImmediateOperand):
+         code = OPCODE_DADDI if isinstance(opcode, instructions.Dadd) else OPCODE_DSUBI
+         return i_type(code, register_field(operands[0]), register_field(rd), operands[1].value)
+   elif isinstance(opcode, instructions.Ld):
+      if is_register(opcode.output_operands[0]) and is_memory(operands[0]):
+         return i_type(OPCODE_LD, register_field(operands[0]), register_field(opcode.output_operands[0]), memory_offset(operands[0]))
+   elif isinstance(opcode, instructions.Sd):
+      if is_register(operands[0]) and is_memory(operands[1]):
+         return i_type(OPCODE_SD, register_field(operands[1]), register_field(operands[0]), memory_offset(operands[1]))
+   elif isinstance(opcode, instructions.Bnez):
+      if is_register(operands[0]) and isinstance(operands[1], ImmediateOperand):
+         return i_type(OPCODE_BNE, register_field(operands[0]), 0, operands[1].value - (pc + 1))
+
+   raise AssertionError(f"{disassemble(opcode)} has no 32 bit encoding")
+
+def signed_immediate(word: int) -> int:
+   immediate = word & 0xFFFF
+   return immediate - (1 << 16) if immediate & 0x8000 else immediate
+
+def memory_operand(rs: int, offset: int) -> Operand:
+   if offset == 0:
+      return RegisterIndirectOperand(REGISTER_NAMES[rs])
+   return DisplacementOperand(REGISTER_NAMES[rs], offset)
+
+def decode_word(word: int, pc: int) -> Opcode:
+   "returns the opcode of the instruction word at the pc, otherwise throws exception"
+   code = word >> 26
+   rs = REGISTER_NAMES[(word >> 21) & 0x1F]
+   rt = REGISTER_NAMES[(word >> 16) & 0x1F]
+   immediate = signed_immediate(word)
+
+   if code == OPCODE_SPECIAL and word & 0x7C0 == 0:
+      rd = REGISTER_NAMES[(word >> 11) & 0x1F]
+      funct = word & 0x3F
+      if funct == FUNCT_DADD:
+         return instructions.Dadd([RegisterOperand(rd), RegisterOperand(rs), RegisterOperand(rt)])
+      if funct == FUNCT_SUB:
+         return instructions.Sub([RegisterOperand(rd), RegisterOperand(rs), RegisterOperand(rt)])
+   elif code == OPCODE_DADDI:
+      return instructions.Dadd([RegisterOperand(rt), RegisterOperand(rs), ImmediateOperand(immediate)])
+   elif code == OPCODE_DSUBI:
+      return instructions.Sub([RegisterOperand(rt), RegisterOperand(rs), ImmediateOperand(immediate)])
+   elif code == OPCODE_LD:
+      return instructions.Ld([RegisterOperand(rt), memory_operand((word >> 21) & 0x1F, immediate)])
+   elif code == OPCODE_SD:
+      return instructions.Sd([RegisterOperand(rt), memory_operand((word >> 21) & 0x1F, immediate)])
+   elif code == OPCODE_BNE and (word >> 16) & 0x1F == 0:
+      target = pc + 1 + immediate
+      if target >= 0:
+         return instructions.Bnez([RegisterOperand(rs), ImmediateOperand(target)])
+
+   raise AssertionError(f"instruction word {word:#010x} at pc {pc} is not a supported instruction")
+
+def encode_program(opcodes: Dict[int, Opcode]) -> array:
+   "returns the instruction words of the assembled opcodes, indexed by pc, otherwise throws exception"
+   words = array(WORD_TYPECODE)
+   for pc in range(len(opcodes)):
+      try:
+         words.append(encode_opcode(opcodes[pc], pc))
+      except AssertionError as e:
+         raise AssertionError(f"Instruction {pc}: {e}")
+   return words
+
+def decode_program(words) -> Dict[int, Opcode]:
+   "returns the opcodes of the instruction words, as assemble does, otherwise throws exception"
+   return {pc: decode_word(word, pc) for pc, word in enumerate(words)}
+
+def format_operand(operand: Operand) -> str:
+   if isinstance(operand, ImmediateOperand):
+      return f"#{operand.value}"
+   if isinstance(operand, RegisterOperand):
+      return operand.register_id
+   if isinstance(operand, RegisterIndirectOperand):
+      return f"({operand.register_id})"
+   if isinstance(operand, DisplacementOperand):
+      return f"{operand.offset}({operand.register_id})"
+
+   raise AssertionError(f"Operand {type(operand).__name__} can't be disassembled")
+
+def disassemble(opcode: Opcode) -> str:
+   "returns the preprocessed source line of the opcode, branch targets are immediate pcs"
+   names = {opcode_cls: name for name, opcode_cls in INSTRUCTION_MAP.items()}
+   operands = opcode.output_operands + opcode.operands
+   return f"{names[type(opcode)]} {', '.join(format_operand(operand) for operand in operands)}"
+
+def save_program_image(path: Path, words: array):
+   "writes the instruction words as a program image, replacing the file atomically"
+   path = Path(path)
+   temp_path = path.with_name(path.name + '.tmp')
+   with open(temp_path, 'wb') as f:
+      f.write(PROGRAM_IMAGE_MAGIC)
+      f.write(struct.pack(PROGRAM_IMAGE_HEADER, PROGRAM_IMAGE_VERSION, len(words)))
+      f.write(words.tobytes())
+   os.replace(temp_path, path)
+
+def load_program_image(path: Path) -> array:
+   """returns the instruction words of a program image written by save_program_image, copied out
+   of a read only memory map of the file, otherwise throws exception
+   """
+   header_size = len(PROGRAM_IMAGE_MAGIC) + struct.calcsize(PROGRAM_IMAGE_HEADER)
+   words = array(WORD_TYPECODE)
+   with open(path, 'rb') as f:
+      size = f.seek(0, 2)
+      if size < header_size:
+         raise AssertionError(f"{path} is not a program image")
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+         if image[:len(PROGRAM_IMAGE_MAGIC)] != PROGRAM_IMAGE_MAGIC:
+            raise AssertionError(f"{path} is not a program image")
+         version, count = struct.unpack_from(PROGRAM_IMAGE_HEADER, image, len(PROGRAM_IMAGE_MAGIC))
+         if version != PROGRAM_IMAGE_VERSION:
+            raise AssertionError(f"Program image {path} has version {version}, only version {PROGRAM_IMAGE_VERSION} is supported")
+         if size != header_size + count * words.itemsize:
+            raise AssertionError(f"Program image {path} of {size} bytes does not hold {count} instructions")
+         with memoryview(image) as view:
+            words.frombytes(view[header_size:])
+   return words
+
+def load_image_program(path: Path) -> AssembledProgram:
+   "returns the program of a program image, its preprocessed code is disassembled from the opcodes"
+   opcodes = decode_program(load_program_image(path))
+   return AssembledProgram([disassemble(opcodes[pc]) for pc in range(len(opcodes))], opcodes)
@@ -4,66 +4,99 @@ from lib.generics.opcode import Opcode, split_in_out_operands
 from lib.generics.opcode import Operand
 from lib.generics.addressing_modes import AddressingMode
 from lib.generics.vcpu import VCpu
-import lib.generics.vcpu as vcpulib
 from lib.generics.pipelineoperations import PipelineOperations
+from lib.generics.branch_predictor import is_misprediction
 
-from .mips_stage import MipsStage
+from .mips_stage import DEFAULT_PROFILE
+
+# addressing modes of operands in the data memory
+MEMORY_MODES = (AddressingMode.RegisterIndirect, AddressingMode.Displacement)
+
+def memory_addresses(operands: List[Operand], vcpu: VCpu) -> List[int]:
+   "returns the addresses of the operands in memory"
+   return [operand.calc_addr(vcpu) for operand in operands if operand.mode in MEMORY_MODES]
 
 class Bnez(Opcode):
+   timing = DEFAULT_PROFILE.timing('BNEZ')
+   TIMING_KEYS = ('target', 'condition', 'resolves')
+   is_branch = True
+
    def __init__(self, operands: List[Operand]):
       in_ops, out_ops = split_in_out_operands(2, 0, operands)
       Opcode.__init__(self, in_ops, out_ops)
 
-   def operands_required_at_stage(self, curr_stage_id: MipsStage) -> List[Operand]:
+   @classmethod
+   def validate_timing(cls, timing):
+      super().validate_timing(timing)
+      if not timing.target <= timing.resolves or not timing.condition <= timing.resolves:
+         raise AssertionError("Bnez target and condition must be required before the branch resolves")
+
+   def operands_required_at_stage(self, curr_stage_id: int) -> List[Operand]:
       if self.noop:
          return []
-      if curr_stage_id == MipsStage.ID:
+      if curr_stage_id == self.timing.target:
+         if curr_stage_id == self.timing.condition:
+            return [self.operands[1], self.operands[0]]
          return [self.operands[1]] # target instruction addr required at decode
-      elif curr_stage_id == MipsStage.EX:
+      elif curr_stage_id == self.timing.condition:
          return [self.operands[0]] # branch condition required at execute
       return []
 
-   def output_operands_forwardable(self, curr_stage_id: MipsStage):
+   def output_operands_forwardable(self, curr_stage_id: int):
       # Bnez is special case, it has no outputs so they are always
       # fowardable
-      # IF we were to predict that branches were taken then we would
-      # have to force stall the pipeline until we could determine the
-      # exact jump addr. In this case the address could be calculated
-      # at the end of decode stage
-      True
+      return True
 
    def supported_input_operand_formats(self) -> List[AddressingMode]:
       return [AddressingMode.RegisterDirect, AddressingMode.Immediate]
 
+   def static_target(self) -> int:
+      if self.operands[1].mode is AddressingMode.Immediate:
+         return self.operands[1].value
+      return None
+
    def tick(self, curr_stage_id, vcpu: VCpu) -> List[PipelineOperations]:
       if self.noop:
          return []
-      if curr_stage_id == MipsStage.ID:
+      if curr_stage_id == self.timing.target:
          self.target_instruction_addr = self.operands[1].read(vcpu)
-      # if curr_stage_id == MipsStage.EX:
-      if curr_stage_id == MipsStage.MEM1:
-         instruction_taken = self.operands[0].read(vcpu)
-         if instruction_taken != 0: # branch taken when not zero, pipeline must be flushed
-            vcpu.set_register(vcpulib.REG_PROGRAM_COUNTER, self.target_instruction_addr) # set the next instruction counter to the resolved PC
-            return [PipelineOperations.Flush] # flush pipeline if we are taking the branch
+      if curr_stage_id == self.timing.resolves:
+         taken = self.operands[0].read(vcpu) != 0 # branch taken when not zero
+         if self.predictor is not None:
+            mispredicted = self.predictor.update(self.pc, taken, self.target_instruction_addr, self.predicted_target)
+         else:
+            mispredicted = is_misprediction(taken, self.target_instruction_addr, self.predicted_target)
+         if mispredicted: # instructions fetched after the branch are on the wrong path, pipeline must be flushed
+            # set the next instruction counter to the resolved PC
+            vcpu.set_pc(self.target_instruction_addr if taken else self.pc + 1)
+            return [PipelineOperations.Flush]
       return []
 
 class Dadd(Opcode):
+   timing = DEFAULT_PROFILE.timing('DADD')
+   TIMING_KEYS = ('operands', 'executes', 'forwardable')
+
    def __init__(self, operands: List[Operand]):
       in_ops, out_ops = split_in_out_operands(2, 1, operands)
       Opcode.__init__(self, in_ops, out_ops)
 
-   def operands_required_at_stage(self, curr_stage_id: MipsStage) -> List[Operand]:
+   @classmethod
+   def validate_timing(cls, timing):
+      super().validate_timing(timing)
+      if not timing.operands <= timing.executes < timing.forwardable:
+         raise AssertionError(f"{cls.__name__} must require its operands no later than it executes, and execute before its result is forwardable")
+
+   def operands_required_at_stage(self, curr_stage_id: int) -> List[Operand]:
       if self.noop:
          return []
-      if curr_stage_id == MipsStage.EX:
+      if curr_stage_id == self.timing.operands:
          return self.operands
       return []
 
-   def output_operands_forwardable(self, curr_stage_id: MipsStage):
+   def output_operands_forwardable(self, curr_stage_id: int):
       if self.noop:
          return True
-      return curr_stage_id > MipsStage.EX
+      return curr_stage_id >= self.timing.forwardable
 
    def supported_input_operand_formats(self) -> List[AddressingMode]:
       return [AddressingMode.Immediate, AddressingMode.RegisterDirect]
@@ -71,27 +104,37 @@ class Dadd(Opcode):
    def tick(self, curr_stage_id, vcpu: VCpu) -> List[PipelineOperations]:
       if self.noop:
          return []
-      if curr_stage_id == MipsStage.EX:
+      if curr_stage_id == self.timing.executes:
          add = self.operands[0].read(vcpu) + self.operands[1].read(vcpu) # a + b
          self.output_operands[0].write(add, vcpu) # -> c
       return []
 
 class Ld(Opcode):
+   timing = DEFAULT_PROFILE.timing('LD')
+   TIMING_KEYS = ('operands', 'executes', 'forwardable')
+   accesses_memory = True
+
    def __init__(self, operands: List[Operand]):
       in_ops, out_ops = split_in_out_operands(1, 1, operands)
       Opcode.__init__(self, in_ops, out_ops)
 
-   def operands_required_at_stage(self, curr_stage_id: MipsStage) -> List[Operand]:
+   @classmethod
+   def validate_timing(cls, timing):
+      super().validate_timing(timing)
+      if not timing.operands <= timing.executes < timing.forwardable:
+         raise AssertionError(f"{cls.__name__} must require its operands no later than it executes, and execute before its result is forwardable")
+
+   def operands_required_at_stage(self, curr_stage_id: int) -> List[Operand]:
       if self.noop:
          return []
-      if curr_stage_id == MipsStage.MEM2:
+      if curr_stage_id == self.timing.operands:
          return self.operands
       return []
 
-   def output_operands_forwardable(self, curr_stage_id: MipsStage):
+   def output_operands_forwardable(self, curr_stage_id: int):
       if self.noop:
          return True
-      return curr_stage_id > MipsStage.MEM2
+      return curr_stage_id >= self.timing.forwardable
 
    def supported_input_operand_formats(self) -> List[AddressingMode]:
       return [AddressingMode.RegisterIndirect, AddressingMode.Displacement]
@@ -99,22 +142,36 @@ class Ld(Opcode):
    def tick(self, curr_stage_id, vcpu: VCpu) -> List[PipelineOperations]:
       if self.noop:
          return []
-      if curr_stage_id == MipsStage.MEM2:
+      if curr_stage_id == self.timing.executes:
+         if self.cache is not None: # a data cache miss stalls the stage before the load
+            stall = self.access_cache(memory_addresses(self.operands, vcpu), [])
+            if stall:
+               return stall
          mem_val = self.operands[0].read(vcpu)
          self.output_operands[0].write(mem_val, vcpu)
       return []
 
 class Sd(Opcode):
+   timing = DEFAULT_PROFILE.timing('SD')
+   TIMING_KEYS = ('operands', 'executes')
+   accesses_memory = True
+
    def __init__(self, operands: List[Operand]):
       in_ops, out_ops = split_in_out_operands(2, 0, operands)
       Opcode.__init__(self, in_ops, out_ops)
 
-   def operands_required_at_stage(self, curr_stage_id: MipsStage) -> List[Operand]:
-      if curr_stage_id == MipsStage.MEM2:
+   @classmethod
+   def validate_timing(cls, timing):
+      super().validate_timing(timing)
+      if not timing.operands <= timing.executes:
+         raise AssertionError(f"{cls.__name__} must require its operands no later than it executes")
+
+   def operands_required_at_stage(self, curr_stage_id: int) -> List[Operand]:
+      if curr_stage_id == self.timing.operands:
          return self.operands
       return []
 
-   def output_operands_forwardable(self, curr_stage_id: MipsStage):
+   def output_operands_forwardable(self, curr_stage_id: int):
       # Store is unique in this 8 stage pipeline since subsequent
       # stages never need to stall waiting for data to be written
       # before it can be read, since data can be read after being
@@ -129,25 +186,38 @@ class Sd(Opcode):
    def tick(self, curr_stage_id, vcpu: VCpu) -> List[PipelineOperations]:
       if self.noop:
          return []
-      if curr_stage_id == MipsStage.MEM2:
+      if curr_stage_id == self.timing.executes:
+         if self.cache is not None: # a data cache miss stalls the stage before the store
+            stall = self.access_cache(memory_addresses(self.operands[:1], vcpu), memory_addresses(self.operands[1:], vcpu))
+            if stall:
+               return stall
          mem_val = self.operands[0].read(vcpu)
          self.operands[1].write(mem_val, vcpu)
       return []
 
 class Sub(Opcode):
+   timing = DEFAULT_PROFILE.timing('SUB')
+   TIMING_KEYS = ('operands', 'executes', 'forwardable')
+
    def __init__(self, operands: List[Operand]):
       in_ops, out_ops = split_in_out_operands(2, 1, operands)
       Opcode.__init__(self, in_ops, out_ops)
 
-   def operands_required_at_stage(self, curr_stage_id: MipsStage) -> List[Operand]:
-      if curr_stage_id == MipsStage.EX:
+   @classmethod
+   def validate_timing(cls, timing):
+      super().validate_timing(timing)
+      if not timing.operands <= timing.executes < timing.forwardable:
+         raise AssertionError(f"{cls.__name__} must require its operands no later than it executes, and execute before its result is forwardable")
+
+   def operands_required_at_stage(self, curr_stage_id: int) -> List[Operand]:
+      if curr_stage_id == self.timing.operands:
          return self.operands
       return []
 
-   def output_operands_forwardable(self, curr_stage_id: MipsStage):
+   def output_operands_forwardable(self, curr_stage_id: int):
       if self.noop:
          return True
-      return curr_stage_id > MipsStage.EX
+      return curr_stage_id >= self.timing.forwardable
 
    def supported_input_operand_formats(self) -> List[AddressingMode]:
       return [AddressingMode.Immediate, AddressingMode.RegisterDirect]
@@ -155,7 +225,7 @@ class Sub(Opcode):
    def tick(self, curr_stage_id, vcpu: VCpu) -> List[PipelineOperations]:
       if self.noop:
          return []
-      if curr_stage_id == MipsStage.EX:
+      if curr_stage_id == self.timing.executes:
          sub = self.operands[0].read(vcpu) - self.operands[1].read(vcpu) # a + b
          self.output_operands[0].write(sub, vcpu) # -> c
       return []
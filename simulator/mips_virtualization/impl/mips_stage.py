@@ -1,44 +1,54 @@
-from enum import IntEnum
+from pathlib import Path
 from typing import List
 
 from lib.generics.pipelinestage import PipelineStage
+from lib.generics.pipeline_profile import PipelineProfile, load_pipeline_profile
+from lib.generics.forwarding import ForwardingNetwork
+from lib.generics.scoreboard import Scoreboard, ScoreboardPipelineStage
+from lib.generics.array_pipeline import build_array_pipeline
 
-class MipsStage(IntEnum):
-   IF1 = 0
-   IF2 = 1
-   ID = 2
-   EX = 3
-   MEM1 = 4
-   MEM2 = 5
-   MEM3 = 6
-   WB = 7
-
-def build_8_stage_pipeline() -> List[PipelineStage]:
-   stage_ids = [
-      MipsStage.IF1,
-      MipsStage.IF2,
-      MipsStage.ID,
-      MipsStage.EX,
-      MipsStage.MEM1,
-      MipsStage.MEM2,
-      MipsStage.MEM3,
-      MipsStage.WB
-   ]
+DEFAULT_PROFILE_PATH = Path(__file__).resolve().parents[1] / 'profiles' / 'mips_8_stage.toml'
+DEFAULT_PROFILE = load_pipeline_profile(DEFAULT_PROFILE_PATH)
+
+# IF1, IF2, ID, EX, MEM1, MEM2, MEM3, WB
+MipsStage = DEFAULT_PROFILE.stage_ids
+
+# arrays simulates whole cycles over the state of all stages, stages ticks each linked stage
+PIPELINE_CORES = ['arrays', 'stages']
+
+def build_pipeline(profile: PipelineProfile, use_scoreboard: bool = True, forwarding: ForwardingNetwork = None, core: str = 'arrays') -> List[PipelineStage]:
+   """Builds the linked stages of the profile's pipeline
+
+   Inputs:
+      use_scoreboard: detect data hazards with a register scoreboard shared by the stages,
+         otherwise each hazard check recurses through the downstream stages. The arrays core
+         always uses a scoreboard.
+      forwarding: bypass paths results are forwarded over, None for full forwarding.
+      core: arrays returns views of an ArrayPipeline, stages independent linked stages.
+   """
+   if core not in PIPELINE_CORES:
+      raise AssertionError(f"pipeline core {core} not in supported cores {PIPELINE_CORES}")
+   if core == 'arrays' and use_scoreboard:
+      return build_array_pipeline(profile.stage_ids, forwarding)
 
    stages = []
+   scoreboard = Scoreboard(forwarding)
 
-   for stage_id in stage_ids:
-      stages.append(PipelineStage(stage_id))
+   for stage_id in profile.stage_ids:
+      if use_scoreboard:
+         stages.append(ScoreboardPipelineStage(stage_id, scoreboard))
+      else:
+         stage = PipelineStage(stage_id)
+         stage.forwarding = scoreboard.forwarding
+         stages.append(stage)
 
-   # do first stage setup
-   stages[0].prev = None
-   stages[0].next = stages[1]
-   # do middle stages setup
-   for i in range(1, 7):
-      stages[i].prev = stages[i-1]
-      stages[i].next = stages[i+1]
-   # do last stage setup
-   stages[7].prev = stages[6]
-   stages[7].next = None
+   # first stage has no previous and last stage no next stage
+   for prev, next in zip(stages, stages[1:]):
+      prev.next = next
+      next.prev = prev
 
    return stages
+
+def build_8_stage_pipeline(use_scoreboard: bool = True, core: str = 'arrays') -> List[PipelineStage]:
+   "Builds the linked stages of the default 8 stage pipeline"
+   return build_pipeline(DEFAULT_PROFILE, use_scoreboard, core=core)
@@ -0,0 +1,253 @@
+from typing import Dict, List
+import time
+
+try:
+   import numpy as np
+except ImportError: # optional, only lockstep simulation needs numpy
+   np = None
+
+from lib.vcpu_simulator import PipelineLogger, SimulationStatus, TIMEOUT_CHECK_CYCLES
+from lib.generics.opcode import Opcode
+from lib.generics.pipeline_profile import OpcodeTiming
+from lib.generics.operand import Operand, RegisterOperand, ImmediateOperand, DisplacementOperand
+from lib.generics.register import PC_INDEX, REGISTER_FILE_SIZE
+from lib.generics.memory import WordMemory, INT64_MIN, INT64_MAX
+from lib.generics.vcpu import VCpu
+from mips_virtualization.impl.instructions import Bnez, Dadd, Ld, Sd, Sub
+from mips_virtualization.translator import TranslatingSimulator
+from lib.functional_simulator import check_write_order
+
+# stamp of the words touched before the simulation, words touched by it are stamped with the step
+INITIALLY_TOUCHED = 1
+
+def fits_int64(value: int) -> bool:
+   return INT64_MIN <= value <= INT64_MAX
+
+def vectorizable(opcode: Opcode) -> bool:
+   "True if the opcode can be executed over a group of lanes, operands must fit 64 bit words"
+   if type(opcode) not in (Bnez, Dadd, Ld, Sd, Sub):
+      return False
+   for operand in opcode.operands + opcode.output_operands:
+      if isinstance(operand, ImmediateOperand) and not fits_int64(operand.value):
+         return False
+      if isinstance(operand, DisplacementOperand) and not fits_int64(operand.offset):
+         return False
+   return True
+
+class LockstepSimulator():
+   """Executes one program over many vcpus at once, a lane per vcpu, with the registers and
+   memory of every lane held in NumPy arrays of shape (lanes, registers) and (lanes, words)
+
+   Each step executes one instruction for every lane at the lowest PC as a column operation over
+   those lanes, so lanes which took different branches wait for the lanes behind them and run
+   together again once they reach the same PC. Lanes finish independently, each with the status
+   FunctionalSimulator would have ended it with.
+
+   Arrays hold the 64 bit words memory holds, while registers are unbounded. A lane whose
+   DADD/SUB result or address doesn't fit 64 bits, or which writes outside of memory, leaves the
+   lockstep before the instruction and is completed by TranslatingSimulator, as are lanes whose
+   initial registers don't fit. The final state of every vcpu is identical to executing it with
+   FunctionalSimulator, including the memory touch order and the errors raised.
+   """
+   def __init__(self, vcpus: List[VCpu], stage_ids: List[int]):
+      if np is None:
+         raise AssertionError("Lockstep simulation requires numpy, install it with the lockstep extra")
+      for vcpu in vcpus:
+         if not isinstance(vcpu.memory, WordMemory):
+            raise AssertionError(f"Lockstep simulation requires a flat or mmap memory, not {type(vcpu.memory).__name__}")
+
+      self.vcpus = vcpus
+      self.stage_ids = stage_ids
+      lanes = len(vcpus)
+      words = max((vcpu.memory.max_mem_addr + 1 for vcpu in vcpus), default=1)
+      self.registers = np.zeros((lanes, REGISTER_FILE_SIZE), dtype=np.int64)
+      self.memory = np.zeros((lanes, words), dtype=np.int64)
+      # step each word was first touched in, 0 for untouched
+      self.touched = np.zeros((lanes, words), dtype=np.int64)
+      self.read_limits = np.array([vcpu.memory.max_mem_addr for vcpu in vcpus], dtype=np.int64)
+      self.write_limits = np.array([vcpu.max_mem_addr for vcpu in vcpus], dtype=np.int64)
+      # lanes whose state was loaded into the arrays, the others are simulated scalar from the start
+      self.loaded = np.zeros(lanes, dtype=bool)
+
+      for lane, vcpu in enumerate(vcpus):
+         memory = vcpu.memory
+         self.memory[lane, :memory.max_mem_addr + 1] = np.frombuffer(memory.byte_view(), dtype=np.int64)
+         self.touched[lane, memory.touch_order] = INITIALLY_TOUCHED
+         if vcpu.max_mem_addr > memory.max_mem_addr:
+            continue
+         try:
+            self.registers[lane] = vcpu.register_file
+            self.loaded[lane] = True
+         except OverflowError: # a register beyond 64 bits
+            pass
+      # lanes completed by the scalar simulator, from the state they left the lockstep in
+      self.scalar = ~self.loaded
+      self.step = INITIALLY_TOUCHED + 1
+
+   def load_program(self, opcodes: Dict[int, Opcode], timings: Dict[type, OpcodeTiming] = None, source: List[str] = None):
+      check_write_order(opcodes, timings, source)
+      self.opcodes = opcodes
+      self.timings = timings
+      self.vectorized = [vectorizable(opcodes[pc]) for pc in range(len(opcodes))]
+
+   def read(self, operand: Operand, rows, pc: int):
+      "returns the operand's value in each of the rows"
+      if isinstance(operand, ImmediateOperand):
+         return np.full(len(rows), operand.value, dtype=np.int64)
+      if isinstance(operand, RegisterOperand):
+         return self.register(operand.register_index, rows, pc)
+
+      address, overflow = self.address(operand, rows, pc)
+      # out of range addresses read as 0, as do addresses beyond 64 bits
+      valid = ~overflow & (address >= 0) & (address <= self.read_limits[rows])
+      return np.where(valid, self.memory[rows, np.where(valid, address, 0)], 0)
+
+   def register(self, idx: int, rows, pc: int):
+      if idx == PC_INDEX: # the PC has already been incremented when the instruction executes
+         return np.full(len(rows), pc + 1, dtype=np.int64)
+      return self.registers[rows, idx]
+
+   def address(self, operand: Operand, rows, pc: int):
+      "returns the memory address in each of the rows and where it overflowed 64 bits"
+      base = self.register(operand.register_index, rows, pc)
+      offset = operand.offset if isinstance(operand, DisplacementOperand) else 0
+      if offset > 0:
+         return base + offset, base > INT64_MAX - offset
+      if offset < 0:
+         return base + offset, base < INT64_MIN - offset
+      return base, np.zeros(len(rows), dtype=bool)
+
+   def execute(self, opcode: Opcode, rows, pc: int) -> np.ndarray:
+      """executes the instruction at pc for the rows, rows which can't execute it in lockstep
+      leave it to the scalar simulator
+
+      Returns:
+         rows which executed the instruction
+      """
+      failed = np.zeros(len(rows), dtype=bool)
+      destination = None
+      if isinstance(opcode, (Dadd, Sub)):
+         a = self.read(opcode.operands[0], rows, pc)
+         b = self.read(opcode.operands[1], rows, pc)
+         if isinstance(opcode, Dadd):
+            value = a + b
+            failed |= ((a ^ value) & (b ^ value)) < 0
+         else:
+            value = a - b
+            failed |= ((a ^ b) & (a ^ value)) < 0
+         destination = opcode.output_operands[0]
+      elif isinstance(opcode, Ld):
+         value = self.read(opcode.operands[0], rows, pc)
+         destination = opcode.output_operands[0]
+      elif isinstance(opcode, Sd):
+         value = self.read(opcode.operands[0], rows, pc)
+         destination = opcode.operands[1]
+      else: # Bnez, taken when the condition is not zero
+         target = self.read(opcode.operands[1], rows, pc)
+         condition = self.read(opcode.operands[0], rows, pc)
+         value = np.where(condition != 0, target, pc + 1)
+
+      address = None
+      if destination is not None and not isinstance(destination, RegisterOperand):
+         address, overflow = self.address(destination, rows, pc)
+         failed |= overflow | (address < 0) | (address > self.write_limits[rows])
+
+      if failed.any():
+         self.scalar[rows[failed]] = True
+         executed = ~failed
+         rows = rows[executed]
+         value = value[executed]
+         if address is not None:
+            address = address[executed]
+
+      self.registers[rows, PC_INDEX] = pc + 1
+      if destination is None:
+         self.registers[rows, PC_INDEX] = value
+      elif address is None:
+         self.registers[rows, destination.register_index] = value
+      else:
+         self.memory[rows, address] = value
+         first = self.touched[rows, address] == 0
+         self.touched[rows[first], address[first]] = self.step
+      return rows
+
+   def simulate(self, max_instructions: List[int] = None, timeouts: List[float] = None) -> List[SimulationStatus]:
+      """Executes the program on every vcpu until it has finished
+
+      Inputs:
+         max_instructions: number of instructions executed at most by each vcpu, None for unlimited.
+         timeouts: seconds of wall-clock time after which each vcpu is stopped, None for no timeout.
+
+      Returns:
+         whether the program finished or execution was stopped early, for each vcpu
+      """
+      lanes = len(self.vcpus)
+      start = time.perf_counter()
+      budgets = np.array([INT64_MAX if limit is None else limit for limit in (max_instructions or [None] * lanes)], dtype=np.int64)
+      deadlines = [None if timeout is None else start + timeout for timeout in (timeouts or [None] * lanes)]
+      budgeted = bool((budgets < INT64_MAX).any())
+      timed = any(deadline is not None for deadline in deadlines)
+      executed = np.zeros(lanes, dtype=np.int64)
+      statuses = [SimulationStatus.Finished] * lanes
+      instructions = len(self.opcodes)
+
+      live = np.flatnonzero(~self.scalar)
+      steps = 0
+      while live.size:
+         if timed and steps % TIMEOUT_CHECK_CYCLES == 0:
+            now = time.perf_counter()
+            expired = np.array([deadlines[lane] is not None and now > deadlines[lane] for lane in live], dtype=bool)
+            if expired.any():
+               for lane in live[expired]:
+                  statuses[lane] = SimulationStatus.TimedOut
+               live = live[~expired]
+               continue
+         pcs = self.registers[live, PC_INDEX]
+         if budgeted:
+            exhausted = executed[live] >= budgets[live]
+            if exhausted.any():
+               for lane, pc in zip(live[exhausted], pcs[exhausted]):
+                  if pc < instructions:
+                     statuses[lane] = SimulationStatus.CycleBudgetExhausted
+               live = live[~exhausted]
+               continue
+
+         pc = int(pcs.min())
+         if pc >= instructions: # every lane left has finished
+            break
+         group = live if pc == pcs.max() else live[pcs == pc]
+         if pc < 0 or not self.vectorized[pc]:
+            self.scalar[group] = True
+            rows = group[:0]
+         else:
+            rows = self.execute(self.opcodes[pc], group, pc)
+            executed[rows] += 1
+         if len(rows) < len(group):
+            live = live[~self.scalar[live]]
+         steps += 1
+         self.step += 1
+
+      self.write_back()
+      for lane in np.flatnonzero(self.scalar):
+         vcpu = self.vcpus[lane]
+         remaining = None if budgets[lane] == INT64_MAX else int(budgets[lane] - executed[lane])
+         timeout = None if deadlines[lane] is None else max(0.0, deadlines[lane] - time.perf_counter())
+         simulator = TranslatingSimulator(vcpu, self.stage_ids, PipelineLogger())
+         simulator.load_program(self.opcodes, self.timings)
+         statuses[lane] = simulator.simulate(remaining, timeout)
+      return statuses
+
+   def write_back(self):
+      "copies the registers and memory of every lane into its vcpu"
+      for lane in np.flatnonzero(self.loaded):
+         vcpu = self.vcpus[lane]
+         memory = vcpu.memory
+         words = memory.max_mem_addr + 1
+         vcpu.register_file[:] = self.registers[lane].tolist()
+         memory.byte_view()[:] = self.memory[lane, :words].tobytes()
+         touched = self.touched[lane, :words]
+         new = np.flatnonzero(touched > INITIALLY_TOUCHED)
+         new = new[np.argsort(touched[new], kind='stable')].tolist()
+         for addr in new:
+            memory.touched[addr] = 1
+         memory.touch_order.extend(new)
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List
+import hashlib
+import json
+import os
+
+from mips_virtualization.assembler import ASSEMBLER_VERSION, INSTRUCTION_MAP, preprocess, assemble
+from lib.generics.opcode import Opcode
+from lib.generics.operand import Operand, RegisterOperand, ImmediateOperand, RegisterIndirectOperand, DisplacementOperand
+
+CACHE_SUFFIX = '.json'
+
+class AssembledProgram():
+   """Preprocessed source and opcodes of a program
+   """
+   def __init__(self, preprocessed_code: List[str], opcodes: Dict[int, Opcode]):
+      self.preprocessed_code = preprocessed_code
+      self.opcodes = opcodes
+
+def source_key(code: str) -> str:
+   "returns the cache key of the source code, which changes with the assembler version"
+   return hashlib.sha256(f"{ASSEMBLER_VERSION}\n{code}".encode()).hexdigest()
+
+def describe_operand(operand: Operand) -> list:
+   if isinstance(operand, ImmediateOperand):
+      return ['#', operand.value]
+   if isinstance(operand, RegisterOperand):
+      return ['R', operand.register_id]
+   if isinstance(operand, RegisterIndirectOperand):
+      return ['()', operand.register_id]
+   if isinstance(operand, DisplacementOperand):
+      return ['+()', operand.register_id, operand.offset]
+
+   raise AssertionError(f"Operand {type(operand).__name__} can't be cached")
+
+def build_operand(description: list) -> Operand:
+   kind = description[0]
+   if kind == '#':
+      return ImmediateOperand(description[1])
+   if kind == 'R':
+      return RegisterOperand(description[1])
+   if kind == '()':
+      return RegisterIndirectOperand(description[1])
+   if kind == '+()':
+      return DisplacementOperand(description[1], description[2])
+
+   raise AssertionError(f"Unknown cached operand {description}")
+
+def describe_program(program: AssembledProgram) -> dict:
+   "returns the program as plain values, operands are listed in source order, outputs first"
+   names = {opcode_cls: name for name, opcode_cls in INSTRUCTION_MAP.items()}
+   opcodes = []
+   for opcode_id in range(len(program.opcodes)):
+      opcode = program.opcodes[opcode_id]
+      operands = opcode.output_operands + opcode.operands
+      opcodes.append([names[type(opcode)], [describe_operand(operand) for operand in operands]])
+
+   return {'preprocessed_code': program.preprocessed_code, 'opcodes': opcodes}
+
+def build_program(description: dict) -> AssembledProgram:
+   "returns the program described by describe_program without parsing its source"
+   opcodes = {}
+   for opcode_id, (name, operands) in enumerate(description['opcodes']):
+      opcodes[opcode_id] = INSTRUCTION_MAP[name]([build_operand(operand) for operand in operands])
+
+   return AssembledProgram(list(description['preprocessed_code']), opcodes)
+
+class ProgramCache():
+   """Cache of assembled programs keyed by a hash of their source and the assembler version
+
+   Programs are kept in memory, the max_entries least recently used are kept, and if a directory
+   is given also on disk as json descriptions, which are rebuilt without parsing the source. The
+   directory may be shared by several processes, the least recently used files are removed once
+   they take up more than max_bytes.
+   """
+   def __init__(self, directory: Path = None, max_entries: int = 256, max_bytes: int = 16 * 1024 * 1024):
+      self.directory = None if directory is None else Path(directory)
+      self.max_entries = max_entries
+      self.max_bytes = max_bytes
+      self.entries: 'OrderedDict[str, AssembledProgram]' = OrderedDict()
+      self.hits = 0
+      self.misses = 0
+
+      if self.directory is not None:
+         self.directory.mkdir(parents=True, exist_ok=True)
+
+   def assemble(self, code: str) -> AssembledProgram:
+      """returns the assembled program of the source code, from the cache if possible.
+      The opcodes are shared with other users of the cache and must not be modified
+      """
+      key = source_key(code)
+
+      program = self.entries.get(key)
+      if program is not None:
+         self.entries.move_to_end(key)
+         self.hits += 1
+         return AssembledProgram(program.preprocessed_code, dict(program.opcodes))
+
+      program = self.load(key)
+      if program is not None:
+         self.hits += 1
+      else:
+         self.misses += 1
+         preprocessed_code = preprocess(code.strip().split('\n'))
+         program = AssembledProgram(list(preprocessed_code), assemble(preprocessed_code))
+         self.store(key, program)
+
+      self.entries[key] = program
+      while len(self.entries) > self.max_entries:
+         self.entries.popitem(last=False)
+      return AssembledProgram(program.preprocessed_code, dict(program.opcodes))
+
+   def path(self, key: str) -> Path:
+      return self.directory / (key + CACHE_SUFFIX)
+
+   def load(self, key: str) -> AssembledProgram:
+      "returns the program cached on disk, None if it isn't or the file is unreadable"
+      if self.directory is None:
+         return None
+
+      path = self.path(key)
+      try:
+         with open(path) as f:
+            program = build_program(json.load(f))
+         os.utime(path) # mark as recently used
+         return program
+      except (OSError, ValueError, KeyError, IndexError, TypeError, AssertionError):
+         return None
+
+   def store(self, key: str, program: AssembledProgram):
+      if self.directory is None:
+         return
+
+      # written under a temporary name so other processes never read a partial file
+      path = self.path(key)
+      temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+      with open(temp_path, 'w') as f:
+         json.dump(describe_program(program), f, separators=(',', ':'))
+      os.replace(temp_path, path)
+      self.evict()
+
+   def evict(self):
+      "removes the least recently used files until the directory holds at most max_bytes"
+      files = []
+      for path in self.directory.glob('*' + CACHE_SUFFIX):
+         try:
+            stat = path.stat()
+         except OSError: # removed by another process
+            continue
+         files.append((stat.st_mtime, stat.st_size, path))
+
+      total = sum(size for _, size, _ in files)
+      for _, size, path in sorted(files, key=lambda file: file[0]):
+         if total <= self.max_bytes:
+            break
+         try:
+            path.unlink()
+         except OSError:
+            pass
+         total -= size
@@ -0,0 +1,183 @@
+from typing import Dict, List, Set
+from lib.functional_simulator import FunctionalSimulator
+from lib.generics.opcode import Opcode
+from lib.generics.pipeline_profile import OpcodeTiming
+from lib.generics.operand import Operand, RegisterOperand, ImmediateOperand, RegisterIndirectOperand, DisplacementOperand
+from lib.generics.register import PC_INDEX
+from lib.generics.memory import WordMemory, word_overflow
+from lib.generics.vcpu import VCpu
+from mips_virtualization.impl.instructions import Bnez, Dadd, Ld, Sd, Sub
+
+# longest block translated, so a budget or timeout ends at most this many instructions early
+# and the remainder is interpreted
+MAX_BLOCK_LENGTH = 64
+
+class TranslatedBlock():
+   """Instructions from start up to and including the first branch, compiled into one python
+   function of the register file. successors links the blocks executed after this one by the
+   PC they start at.
+   """
+   def __init__(self, start: int, length: int, source: str, function):
+      self.start = start
+      self.length = length
+      self.source = source
+      self.function = function
+      self.successors: Dict[int, 'TranslatedBlock'] = {}
+
+class BlockTranslator():
+   """Translates a program into basic blocks, split at the targets of Bnez and after every
+   Bnez, each compiled once into a function operating directly on the vcpu's register file
+   and memory words.
+
+   A translated block has exactly the effect of executing its instructions one after the other
+   with FunctionalSimulator, including the PC it leaves and the memory touch order. Blocks
+   are bound to the vcpu's register file and memory, and only translated when first executed.
+   """
+   def __init__(self, opcodes: Dict[int, Opcode], vcpu: VCpu):
+      self.opcodes = opcodes
+      self.vcpu = vcpu
+      self.blocks: Dict[int, TranslatedBlock] = {}
+      self.leaders: Set[int] = {0}
+      for pc, opcode in opcodes.items():
+         if isinstance(opcode, Bnez):
+            self.leaders.add(pc + 1)
+            if isinstance(opcode.operands[1], ImmediateOperand):
+               self.leaders.add(opcode.operands[1].value)
+
+      memory = vcpu.memory
+      self.word_memory = isinstance(memory, WordMemory)
+      self.namespace = {'read_memory': memory.read, 'set_memory_value': vcpu.set_memory_value}
+      if self.word_memory:
+         self.namespace.update(words=memory.words, touched=memory.touched, touch_order=memory.touch_order, word_overflow=word_overflow)
+
+   def block(self, pc: int) -> TranslatedBlock:
+      "returns the block starting at pc, None if the instruction at pc can't be translated"
+      block = self.blocks.get(pc)
+      if block is None and translatable(self.opcodes.get(pc)):
+         block = self.translate(pc)
+         self.blocks[pc] = block
+      return block
+
+   def translate(self, start: int) -> TranslatedBlock:
+      lines = []
+      pc = start
+      while True:
+         opcode = self.opcodes[pc]
+         sets_pc = any(operand.register_index == PC_INDEX for operand in opcode.operands + opcode.output_operands)
+         if sets_pc or isinstance(opcode, Bnez): # the instruction sees the PC already incremented
+            lines.append(f"rf[{PC_INDEX}] = {pc + 1}")
+         self.translate_opcode(opcode, lines)
+         pc += 1
+         if sets_pc or isinstance(opcode, Bnez):
+            break
+         if pc in self.leaders or pc - start == MAX_BLOCK_LENGTH or not translatable(self.opcodes.get(pc)):
+            lines.append(f"rf[{PC_INDEX}] = {pc}")
+            break
+
+      source = f"def block_{start}(rf):\n" + ''.join(f"   {line}\n" for line in lines)
+      namespace = dict(self.namespace)
+      exec(compile(source, f"<block {start}>", 'exec'), namespace)
+      return TranslatedBlock(start, pc - start, source, namespace[f"block_{start}"])
+
+   def translate_opcode(self, opcode: Opcode, lines: List[str]):
+      "appends the statements executing the opcode, in the order its tick reads and writes the operands"
+      if isinstance(opcode, Dadd) or isinstance(opcode, Sub):
+         a = self.read(opcode.operands[0], lines)
+         b = self.read(opcode.operands[1], lines)
+         self.write(opcode.output_operands[0], f"{a} {'+' if isinstance(opcode, Dadd) else '-'} {b}", lines)
+      elif isinstance(opcode, Ld):
+         self.write(opcode.output_operands[0], self.read(opcode.operands[0], lines), lines)
+      elif isinstance(opcode, Sd):
+         lines.append(f"value = {self.read(opcode.operands[0], lines)}")
+         self.write(opcode.operands[1], 'value', lines)
+      else: # Bnez, target latched at ID before the condition is read at MEM1
+         target = self.read(opcode.operands[1], lines)
+         if not isinstance(opcode.operands[1], ImmediateOperand):
+            lines.append(f"target = {target}")
+            target = 'target'
+         lines.append(f"if {self.read(opcode.operands[0], lines)} != 0:")
+         lines.append(f"   rf[{PC_INDEX}] = {target}")
+
+   def address(self, operand: Operand, lines: List[str]) -> str:
+      "assigns the operand's memory address to a new local and returns its name"
+      name = f"address{sum(line.startswith('address') for line in lines)}"
+      if isinstance(operand, DisplacementOperand):
+         lines.append(f"{name} = rf[{operand.register_index}] + {operand.offset}")
+      else:
+         lines.append(f"{name} = rf[{operand.register_index}]")
+      return name
+
+   def read(self, operand: Operand, lines: List[str]) -> str:
+      "returns an expression of the operand's value, statements it depends on are appended"
+      if isinstance(operand, ImmediateOperand):
+         return repr(operand.value)
+      if isinstance(operand, RegisterOperand):
+         return f"rf[{operand.register_index}]"
+
+      address = self.address(operand, lines)
+      if self.word_memory:
+         return f"(words[{address}] if 0 <= {address} <= {self.vcpu.memory.max_mem_addr} else 0)"
+      return f"read_memory({address})"
+
+   def write(self, operand: Operand, value: str, lines: List[str]):
+      if isinstance(operand, RegisterOperand):
+         lines.append(f"rf[{operand.register_index}] = {value}")
+         return
+
+      if value != 'value':
+         lines.append(f"value = {value}")
+      address = self.address(operand, lines)
+      if not self.word_memory:
+         lines.append(f"set_memory_value({address}, value)")
+         return
+      lines += [
+         f"if not 0 <= {address} <= {self.vcpu.max_mem_addr}:",
+         f"   raise AssertionError(f\"Memory writeback to invalid memory address {{{address}}}\")",
+         "try:",
+         f"   words[{address}] = value",
+         "except (OverflowError, ValueError):",
+         f"   raise word_overflow({address}, value) from None",
+         f"if not touched[{address}]:",
+         f"   touched[{address}] = 1",
+         f"   touch_order.append({address})"
+      ]
+
+def translatable(opcode: Opcode) -> bool:
+   return type(opcode) in (Bnez, Dadd, Ld, Sd, Sub)
+
+class TranslatingSimulator(FunctionalSimulator):
+   """FunctionalSimulator executing translated basic blocks instead of interpreting every
+   instruction, the final state is identical. Instructions which can't be translated and the
+   last instructions before a budget is reached are interpreted.
+   """
+   def load_program(self, opcodes: Dict[int, Opcode], timings: Dict[type, OpcodeTiming] = None, source: List[str] = None):
+      FunctionalSimulator.load_program(self, opcodes, timings, source)
+      self.translator = BlockTranslator(opcodes, self.vcpu)
+
+   def run(self, limit: int = None) -> int:
+      register_file = self.vcpu.register_file
+      program = self.program
+      translator = self.translator
+      executed = 0
+      block = translator.block(register_file[PC_INDEX])
+      while True:
+         if block is None or (limit is not None and executed + block.length > limit):
+            if executed == limit or not self.step():
+               return executed
+            executed += 1
+            block = translator.block(register_file[PC_INDEX])
+            continue
+
+         block.function(register_file)
+         executed += block.length
+         # fetch order is kept as if interpreted
+         program.exe_id += block.length
+         program.in_flight += block.length
+
+         pc = register_file[PC_INDEX]
+         successor = block.successors.get(pc)
+         if successor is None:
+            successor = translator.block(pc)
+            if successor is not None:
+               block.successors[pc] = successor
+         block = successor
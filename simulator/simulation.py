@@ -0,0 +1,543 @@
+from pathlib import Path
+from threading import BrokenBarrierError
+from typing import Dict, List, Tuple, Union
+import hashlib
+import json
+import multiprocessing
+import queue
+import shutil
+import sys
+
+from input_parser import load_toml, get_code, get_initial_memory_state, get_initial_register_state, get_simulation_options, is_multicore, get_cores, UNLIMITED_CYCLES
+from mips_virtualization.program_cache import ProgramCache
+from mips_virtualization.translator import TranslatingSimulator
+from mips_virtualization.assembler import opcode_timings
+from mips_virtualization.encoding import encode_program, save_program_image, load_image_program
+from mips_virtualization.impl.mips_stage import DEFAULT_PROFILE, build_pipeline
+from lib.vcpu_simulator import VCpuSimulator, PipelineLogger, StreamingPipelineLogger, SimulationStatus, DEFAULT_MAX_CYCLES
+from lib.profiler import PipelineProfiler
+from lib.binary_trace import BinaryPipelineLogger
+from lib.visualization.text_visualizer import TextVisualizer, open_diagram, DEFAULT_DIAGRAM_CYCLES
+from lib.performance_counters import PerformanceCounters
+from lib.checkpoint import create_checkpoint, save_checkpoint, load_checkpoint, restore_checkpoint
+from lib.multicore import CoreMemory, MulticoreSimulator, SharedBlock, run_core_process, coordinate_core_processes
+from lib.generics.vcpu import VCpu
+from lib.generics.memory import Memory, WordMemory, build_memory, image_words
+from lib.generics.register import Register
+from lib.generics.pipeline_profile import PipelineProfile, load_pipeline_profile
+from lib.generics.branch_predictor import build_branch_predictor
+from lib.generics.cache import load_cache_config, build_caches, validate_cache_stages
+
+SIMULATION_MODES = ['pipeline', 'functional']
+TRACE_FORMATS = ['text', 'binary']
+
+MAX_MEMORY_ADDR = 992
+
+# programs assembled by this process, by cache directory, None caching in memory only
+program_caches: Dict[Path, ProgramCache] = {}
+
+def get_program_cache(directory: Path = None) -> ProgramCache:
+   "returns this process' cache of assembled programs stored in the directory"
+   if directory not in program_caches:
+      program_caches[directory] = ProgramCache(directory)
+   return program_caches[directory]
+
+def program_digest(preprocessed_code: List[str], profile: PipelineProfile = DEFAULT_PROFILE, forwarding: str = 'full') -> str:
+   "identifies the program, pipeline and forwarding network a checkpoint was created for"
+   code = '\n'.join(line.strip() for line in preprocessed_code)
+   pipeline = json.dumps(profile.describe(), sort_keys=True)
+   return hashlib.sha256(f"{pipeline}\n{forwarding}\n{code}".encode()).hexdigest()
+
+def default_checkpoint_path(outputFile: Path) -> Path:
+   return Path(outputFile).with_name(Path(outputFile).name + '.ckpt')
+
+def simulate(
+      inputFile: Path,
+      outputFile: Path,
+      mode: str = 'pipeline',
+      max_cycles: Union[int, str] = None,
+      timeout: float = None,
+      memory_backend: str = 'flat',
+      memory_image: Path = None,
+      memory_dump: Path = None,
+      checkpoint_every: int = None,
+      checkpoint_path: Path = None,
+      restore: Path = None,
+      program_cache: Path = None,
+      profile: Path = None,
+      statistics: bool = False,
+      statistics_json: Path = None,
+      pipeline: Path = None,
+      branch_predictor: str = 'not-taken',
+      forwarding: str = 'full',
+      program_image: Path = None,
+      write_program_image: Path = None,
+      trace_format: str = 'text',
+      pipeline_core: str = 'arrays',
+      core_processes: bool = False,
+      sync_cycles: int = 1,
+      caches: Path = None,
+      diagram: Path = None,
+      diagram_cycles: Tuple[int, int] = (1, DEFAULT_DIAGRAM_CYCLES)
+   ) -> SimulationStatus:
+   """Simulates the input and writes the output
+
+   Inputs:
+      max_cycles: number of cycles, or instructions in functional mode, simulated at most or 'unlimited'.
+         Defaults to the input's simulation table, otherwise 29 cycles in pipeline mode and unlimited in
+         functional mode.
+      timeout: seconds after which the simulation is stopped, defaults to the input's simulation table.
+      checkpoint_every: number of cycles between checkpoints of the pipeline state written to
+         checkpoint_path, by default the output path followed by .ckpt.
+      restore: checkpoint to resume from, created for the same input and options. outputFile must
+         still hold the cycles logged up to the checkpoint, the resumed run continues it.
+      program_cache: directory assembled programs are cached in, programs are always cached in memory.
+      profile: path the time spent per pipeline stage, phase of the stage tick and opcode is written
+         to, - for stdout. Pipeline mode only.
+      statistics: appends a STATISTICS section with the performance counters to the output.
+         Pipeline mode only.
+      statistics_json: path the performance counters are written to as json. Pipeline mode only.
+      pipeline: pipeline profile describing the stages and the timing of each opcode, defaults to
+         the 8 stage pipeline.
+      branch_predictor: name of the predictor consulted when fetching a branch, see BRANCH_PREDICTORS.
+         Pipeline mode only, functional mode executes the branches in order without fetching ahead.
+      forwarding: forwarding network of the pipeline profile results are forwarded over, full, none or
+         a network the profile defines. Pipeline mode only.
+      program_image: program image simulated instead of the input's code, which is then not assembled.
+      write_program_image: path the program is written to as a program image, loadable with program_image.
+      trace_format: text writes the cycles as lines, binary as fixed size records which
+         lib.binary_trace.convert_trace converts to the same text.
+      pipeline_core: arrays simulates whole cycles over arrays of the stage state, stages ticks
+         linked stages. Both produce the same trace. Pipeline mode only.
+      core_processes, sync_cycles: inputs with [[cores]] tables are simulated by simulate_multicore
+         with these options.
+      caches: cache configuration of the L1 instruction and data caches, see lib.generics.cache, a
+         miss stalls the stage fetching or accessing memory. Pipeline mode only.
+      diagram: path the pipeline diagram of the cycles in diagram_cycles is written to, a row
+         per instruction and a column per cycle, - for stdout. Pipeline mode only.
+      diagram_cycles: first and last cycle of the diagram.
+
+   Returns:
+      whether the program finished or the simulation was stopped early
+   """
+   # load input
+   toml_contents = load_toml(inputFile)
+   if is_multicore(toml_contents):
+      unsupported = {
+         f"{mode} mode": mode != 'pipeline',
+         "memory images": memory_image is not None or memory_dump is not None,
+         f"the {memory_backend} memory backend": memory_backend != 'flat',
+         "checkpoints": checkpoint_every is not None or restore is not None,
+         "profiling": profile is not None,
+         "statistics": statistics or statistics_json is not None,
+         "program images": program_image is not None or write_program_image is not None,
+         f"{trace_format} traces": trace_format != 'text',
+         "caches": caches is not None,
+         "pipeline diagrams": diagram is not None
+      }
+      for feature, used in unsupported.items():
+         if used:
+            raise AssertionError(f"Multi-core inputs do not support {feature}")
+      statuses = simulate_multicore(
+            inputFile,
+            outputFile,
+            max_cycles,
+            timeout,
+            program_cache,
+            pipeline,
+            branch_predictor,
+            forwarding,
+            pipeline_core,
+            core_processes,
+            sync_cycles
+         )
+      return next((status for status in statuses if status != SimulationStatus.Finished), SimulationStatus.Finished)
+
+   registers = get_initial_register_state(toml_contents)
+   memory = get_initial_memory_state(toml_contents)
+
+   # arguments take precedence over the input
+   options = get_simulation_options(toml_contents)
+   if max_cycles is None:
+      max_cycles = options.get('max_cycles', DEFAULT_MAX_CYCLES if mode == 'pipeline' else UNLIMITED_CYCLES)
+   if max_cycles == UNLIMITED_CYCLES:
+      max_cycles = None
+   if timeout is None:
+      timeout = options.get('timeout')
+
+   # preprocess and assemble, unless the same source has been assembled before or the program is precompiled
+   if program_image is not None:
+      program = load_image_program(program_image)
+   else:
+      program = get_program_cache(None if program_cache is None else Path(program_cache)).assemble(get_code(toml_contents))
+   if write_program_image is not None:
+      save_program_image(write_program_image, encode_program(program.opcodes))
+   assembled_opcodes = program.opcodes
+   pipeline_profile = DEFAULT_PROFILE if pipeline is None else load_pipeline_profile(pipeline)
+   timings = opcode_timings(pipeline_profile)
+   forwarding_network = pipeline_profile.forwarding_network(forwarding)
+   digest = program_digest(program.preprocessed_code, pipeline_profile, forwarding)
+   cache_configs = {}
+   if caches is not None:
+      if mode != 'pipeline':
+         raise AssertionError(f"Caches are only supported in pipeline mode, not {mode} mode")
+      cache_configs = load_cache_config(caches)
+      validate_cache_stages(timings, len(pipeline_profile.stages))
+
+   if profile is not None and mode != 'pipeline':
+      raise AssertionError(f"Profiling is only supported in pipeline mode, not {mode} mode")
+   if diagram is not None and mode != 'pipeline':
+      raise AssertionError(f"Pipeline diagrams are only supported in pipeline mode, not {mode} mode")
+   counted = statistics or statistics_json is not None
+   if counted and mode != 'pipeline':
+      raise AssertionError(f"Statistics are only supported in pipeline mode, not {mode} mode")
+
+   checkpoint = None
+   if checkpoint_every is not None or restore is not None:
+      if mode != 'pipeline':
+         raise AssertionError(f"Checkpoints are only supported in pipeline mode, not {mode} mode")
+      if checkpoint_every is not None and checkpoint_every < 1:
+         raise AssertionError(f"Checkpoint interval {checkpoint_every} is not a positive number of cycles")
+      if restore is not None:
+         checkpoint = load_checkpoint(restore)
+      if checkpoint_path is None:
+         checkpoint_path = default_checkpoint_path(outputFile)
+
+   # construct stages and vcpu model
+   max_mem_addr = MAX_MEMORY_ADDR
+   if memory_image is not None: # memory grows to fit larger images
+      max_mem_addr = max(MAX_MEMORY_ADDR, image_words(memory_image) - 1)
+   # registers not defined in the input are initialized to 0 by the vcpu
+   data_memory = build_memory(memory_backend, max_mem_addr)
+   if memory_image is not None:
+      if not isinstance(data_memory, WordMemory):
+         raise AssertionError(f"Memory images are not supported by the {memory_backend} memory backend")
+      data_memory.load_image(memory_image)
+   data_memory.load_values(memory) # values from the input are applied over the image
+   vcpu = VCpu(registers, data_memory, max_mem_addr)
+   # cycles are written to the output as they are simulated, after those already written when resuming
+   if trace_format not in TRACE_FORMATS:
+      raise AssertionError(f"trace format {trace_format} not in supported formats {TRACE_FORMATS}")
+   logger_cls = BinaryPipelineLogger if trace_format == 'binary' else StreamingPipelineLogger
+   logger = logger_cls(outputFile, position=None if checkpoint is None else checkpoint.log_position)
+
+   # simulate
+   if mode == 'functional': # final state only, no cycle trace, basic blocks are translated to python
+      simulator = TranslatingSimulator(vcpu, list(pipeline_profile.stage_ids), logger)
+   else:
+      stages = build_pipeline(pipeline_profile, forwarding=forwarding_network, core=pipeline_core)
+      simulator = VCpuSimulator(vcpu, stages, logger)
+   if mode == 'functional':
+      simulator.load_program(assembled_opcodes, timings, program.preprocessed_code)
+   else:
+      l1 = build_caches(cache_configs)
+      simulator.load_program(assembled_opcodes, timings, build_branch_predictor(branch_predictor), l1.get('icache'), l1.get('dcache'))
+   counters = None
+   if counted:
+      counters = PerformanceCounters()
+      counters.attach(simulator)
+   if profile is not None:
+      PipelineProfiler().attach(simulator, profile)
+   diagram_out = None
+   if diagram is not None:
+      diagram_out = open_diagram(diagram)
+      TextVisualizer(diagram_out, pipeline_profile.stages, *diagram_cycles, program.preprocessed_code).attach(simulator)
+   try:
+      if mode == 'functional':
+         status = simulator.simulate(max_cycles, timeout)
+      else:
+         if checkpoint is not None:
+            restore_checkpoint(simulator, checkpoint, digest)
+            if counters is not None:
+               if checkpoint.counters is None:
+                  raise AssertionError("Checkpoint was created without statistics, they can't be resumed")
+               counters.restore(checkpoint.counters)
+         status = simulator.simulate(
+               max_cycles,
+               timeout,
+               checkpoint_every,
+               lambda simulator: save_checkpoint(
+                  checkpoint_path,
+                  create_checkpoint(simulator, digest, None if counters is None else counters.state())
+               )
+            )
+         if statistics:
+            logger.statistics = counters.lines()
+         if statistics_json is not None:
+            counters.write_json(statistics_json)
+
+      # complete output file with final reg/mem states
+      logger.write_to_file(outputFile)
+   finally:
+      logger.close()
+      if diagram_out is not None and diagram_out is not sys.stdout:
+         diagram_out.close()
+   if memory_dump is not None:
+      if not isinstance(vcpu.memory, WordMemory):
+         raise AssertionError(f"Memory images are not supported by the {memory_backend} memory backend")
+      vcpu.memory.dump_image(memory_dump)
+
+   return status
+
+def simulate_lockstep(
+      inputFiles: List[Path],
+      outputFiles: List[Path],
+      max_cycles: Union[int, str] = None,
+      timeout: float = None,
+      memory_backend: str = 'flat',
+      program_cache: Path = None,
+      pipeline: Path = None,
+      trace_format: str = 'text'
+   ) -> List[SimulationStatus]:
+   """Simulates inputs sharing the same code in functional mode with a LockstepSimulator and
+   writes each output, which is identical to simulating the input on its own in functional mode
+
+   Inputs:
+      max_cycles: number of instructions each input executes at most or 'unlimited', defaults to
+         each input's simulation table, otherwise unlimited.
+      timeout: seconds after which the simulation of each input is stopped, defaults to each
+         input's simulation table.
+      program_cache, pipeline, trace_format: as for simulate.
+
+   Returns:
+      whether the program finished or the simulation was stopped early, for each input
+   """
+   if len(inputFiles) != len(outputFiles):
+      raise AssertionError(f"Lockstep simulation of {len(inputFiles)} inputs needs as many outputs, got {len(outputFiles)}")
+   if trace_format not in TRACE_FORMATS:
+      raise AssertionError(f"trace format {trace_format} not in supported formats {TRACE_FORMATS}")
+
+   code = None
+   source = None
+   vcpus = []
+   budgets = []
+   timeouts = []
+   for inputFile in inputFiles:
+      toml_contents = load_toml(inputFile)
+      input_code = [line.strip() for line in get_code(toml_contents).strip().split('\n')]
+      if code is None:
+         code = input_code
+         source = get_code(toml_contents)
+      elif input_code != code:
+         raise AssertionError(f"{inputFile} does not have the same code as {inputFiles[0]}, lockstep inputs must share their program")
+
+      options = get_simulation_options(toml_contents)
+      budget = options.get('max_cycles', UNLIMITED_CYCLES) if max_cycles is None else max_cycles
+      budgets.append(None if budget == UNLIMITED_CYCLES else budget)
+      timeouts.append(options.get('timeout') if timeout is None else timeout)
+
+      data_memory = build_memory(memory_backend, MAX_MEMORY_ADDR)
+      data_memory.load_values(get_initial_memory_state(toml_contents))
+      vcpus.append(VCpu(get_initial_register_state(toml_contents), data_memory, MAX_MEMORY_ADDR))
+
+   statuses = []
+   if not vcpus:
+      return statuses
+   from mips_virtualization.lockstep import LockstepSimulator # imports numpy, which only lockstep simulation needs
+   program = get_program_cache(None if program_cache is None else Path(program_cache)).assemble(source)
+   pipeline_profile = DEFAULT_PROFILE if pipeline is None else load_pipeline_profile(pipeline)
+   simulator = LockstepSimulator(vcpus, list(pipeline_profile.stage_ids))
+   simulator.load_program(program.opcodes, opcode_timings(pipeline_profile), program.preprocessed_code)
+   statuses = simulator.simulate(budgets, timeouts)
+
+   # complete each output file with its final reg/mem states
+   logger_cls = BinaryPipelineLogger if trace_format == 'binary' else StreamingPipelineLogger
+   for outputFile, vcpu in zip(outputFiles, vcpus):
+      logger = logger_cls(outputFile)
+      try:
+         logger.log_memory(vcpu)
+         logger.log_registers(vcpu)
+         logger.write_to_file(outputFile)
+      finally:
+         logger.close()
+   return statuses
+
+def core_output_path(outputFile: Path, core: int) -> Path:
+   "returns the path a core's cycles are streamed to before they are merged into the output"
+   return Path(outputFile).with_name(Path(outputFile).name + f'.core{core}')
+
+def build_core_simulator(registers: Dict[str, Register], code: str, memory: Memory, logger: PipelineLogger, core_options: dict) -> VCpuSimulator:
+   """returns the pipeline simulator of one core of a multi-core input with its program loaded,
+   core_options holds the program_cache, pipeline, branch_predictor, forwarding and pipeline_core
+   """
+   program_cache = core_options['program_cache']
+   program = get_program_cache(None if program_cache is None else Path(program_cache)).assemble(code)
+   pipeline_profile = DEFAULT_PROFILE if core_options['pipeline'] is None else load_pipeline_profile(core_options['pipeline'])
+   forwarding_network = pipeline_profile.forwarding_network(core_options['forwarding'])
+   stages = build_pipeline(pipeline_profile, forwarding=forwarding_network, core=core_options['pipeline_core'])
+   simulator = VCpuSimulator(VCpu(registers, memory, MAX_MEMORY_ADDR), stages, logger)
+   simulator.load_program(program.opcodes, opcode_timings(pipeline_profile), build_branch_predictor(core_options['branch_predictor']))
+   return simulator
+
+def simulate_multicore(
+      inputFile: Path,
+      outputFile: Path,
+      max_cycles: Union[int, str] = None,
+      timeout: float = None,
+      program_cache: Path = None,
+      pipeline: Path = None,
+      branch_predictor: str = 'not-taken',
+      forwarding: str = 'full',
+      pipeline_core: str = 'arrays',
+      core_processes: bool = False,
+      sync_cycles: int = 1
+   ) -> List[SimulationStatus]:
+   """Simulates the cores of an input with [[cores]] tables, each running its own code from its own
+   registers on a pipeline of its own, sharing the [memory]. The output lists the cycles and final
+   registers of each core after a CORE line, followed by the shared memory.
+
+   Inputs:
+      max_cycles, timeout: as for simulate, every core stops in the same cycle.
+      core_processes: simulates every core in a process of its own over multiprocessing.shared_memory,
+         otherwise the cores are simulated one after the other in this process. Both produce the same output.
+      sync_cycles: number of cycles between the synchronizations of the cores, a core sees the memory
+         writes of the other cores from the cycle after the next synchronization.
+      program_cache, pipeline, branch_predictor, forwarding, pipeline_core: as for simulate, for every core.
+
+   Returns:
+      whether each core's program finished or the simulation was stopped early
+   """
+   toml_contents = load_toml(inputFile)
+   cores = get_cores(toml_contents)
+   options = get_simulation_options(toml_contents)
+   if max_cycles is None:
+      max_cycles = options.get('max_cycles', DEFAULT_MAX_CYCLES)
+   if max_cycles == UNLIMITED_CYCLES:
+      max_cycles = None
+   if timeout is None:
+      timeout = options.get('timeout')
+   if sync_cycles < 1:
+      raise AssertionError(f"Cores must synchronize every positive number of cycles, not {sync_cycles}")
+
+   core_options = {
+      'program_cache': program_cache,
+      'pipeline': pipeline,
+      'branch_predictor': branch_predictor,
+      'forwarding': forwarding,
+      'pipeline_core': pipeline_core
+   }
+   initial_memory = get_initial_memory_state(toml_contents)
+   parts = [core_output_path(outputFile, core) for core in range(len(cores))]
+   if core_processes:
+      statuses, registers, memory_lines = simulate_core_processes(inputFile, parts, initial_memory, max_cycles, timeout, sync_cycles, core_options)
+   else:
+      memory = build_memory('flat', MAX_MEMORY_ADDR, initial_memory)
+      loggers = [StreamingPipelineLogger(part) for part in parts]
+      try:
+         simulators = [
+            build_core_simulator(core_registers, code, CoreMemory(MAX_MEMORY_ADDR, memory.words), logger, core_options)
+            for (core_registers, code), logger in zip(cores, loggers)
+         ]
+         statuses = MulticoreSimulator(simulators, memory, sync_cycles).simulate(max_cycles, timeout)
+         for simulator in simulators:
+            simulator.logger.log_registers(simulator.vcpu)
+      finally:
+         for logger in loggers:
+            logger.close()
+      registers = [logger.registers for logger in loggers]
+      memory_lines = [f"{addr} {value}\n" for addr, value in memory.items()]
+
+   # complete output file with each core's cycles and registers, then the shared memory
+   with open(outputFile, 'w') as f:
+      for core, part in enumerate(parts):
+         f.write(f"CORE {core}\n")
+         with open(part) as cycles:
+            shutil.copyfileobj(cycles, f)
+         f.write('REGISTERS\n')
+         f.writelines(registers[core])
+      f.write('MEMORY\n')
+      f.writelines(memory_lines)
+   for part in parts:
+      part.unlink()
+   return statuses
+
+def simulate_core_processes(
+      inputFile: Path,
+      parts: List[Path],
+      initial_memory: Dict[int, int],
+      max_cycles: int,
+      timeout: float,
+      sync_cycles: int,
+      core_options: dict
+   ) -> Tuple[List[SimulationStatus], List[List[str]], List[str]]:
+   """simulates a process per core of simulate_multicore, over a SharedBlock this process coordinates
+
+   Returns:
+      the status and register lines of each core and the lines of the shared memory, otherwise throws the exception of the first core which failed
+   """
+   stage_count = len((DEFAULT_PROFILE if core_options['pipeline'] is None else load_pipeline_profile(core_options['pipeline'])).stage_ids)
+   # a core writes at most one word per stage and cycle, and each word once
+   mailbox_size = min(sync_cycles * stage_count, MAX_MEMORY_ADDR + 1)
+   block = SharedBlock(MAX_MEMORY_ADDR + 1, len(parts), mailbox_size)
+   try:
+      memory = WordMemory(MAX_MEMORY_ADDR, block.words, initial_memory)
+      context = multiprocessing.get_context()
+      barrier = context.Barrier(len(parts) + 1)
+      results = context.Queue()
+      processes = [
+         context.Process(
+            target=simulate_core_process,
+            args=(inputFile, core, part, block.name, len(parts), mailbox_size, barrier, results, sync_cycles, max_cycles, core_options)
+         )
+         for core, part in enumerate(parts)
+      ]
+      for process in processes:
+         process.start()
+      try:
+         coordinate_core_processes(memory, block, barrier, sync_cycles, max_cycles, timeout)
+      except BrokenBarrierError:
+         pass # the core which failed reports its exception
+
+      outcomes = {}
+      while len(outcomes) < len(processes):
+         try:
+            core, status, registers, error = results.get(timeout=1)
+         except queue.Empty:
+            if not any(process.is_alive() for process in processes) and results.empty():
+               raise AssertionError("A core process exited without reporting the outcome of its simulation")
+            continue
+         outcomes[core] = (status, registers, error)
+      for process in processes:
+         process.join()
+
+      errors = [outcomes[core][2] for core in range(len(parts)) if outcomes[core][2] is not None]
+      # cores stopped by another core's failure report a broken barrier
+      errors.sort(key=lambda error: isinstance(error, BrokenBarrierError))
+      if errors:
+         raise errors[0]
+      memory_lines = [f"{addr} {value}\n" for addr, value in memory.items()]
+      return [outcomes[core][0] for core in range(len(parts))], [outcomes[core][1] for core in range(len(parts))], memory_lines
+   finally:
+      block.close()
+      block.unlink()
+
+def simulate_core_process(
+      inputFile: Path,
+      core: int,
+      part: Path,
+      block_name: str,
+      cores: int,
+      mailbox_size: int,
+      barrier,
+      results,
+      sync_cycles: int,
+      max_cycles: int,
+      core_options: dict
+   ):
+   "entry point of the process simulating a core, puts (core, status, register lines, exception) on results"
+   block = SharedBlock(MAX_MEMORY_ADDR + 1, cores, mailbox_size, block_name)
+   logger = None
+   try:
+      registers, code = get_cores(load_toml(inputFile))[core]
+      logger = StreamingPipelineLogger(part)
+      simulator = build_core_simulator(registers, code, CoreMemory(MAX_MEMORY_ADDR, block.words), logger, core_options)
+      status = run_core_process(simulator, block, core, barrier, sync_cycles, max_cycles)
+      logger.log_registers(simulator.vcpu)
+      results.put((core, status, logger.registers, None))
+   except BaseException as e:
+      barrier.abort() # the other processes would wait for this one forever
+      results.put((core, None, None, e))
+   finally:
+      if logger is not None:
+         logger.close()
+      block.close()
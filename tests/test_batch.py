@@ -0,0 +1,121 @@
+import pytest
+from pathlib import Path
+
+from simulator.batch import BatchJob, collect_jobs, output_path, read_manifest, run_batch, format_summary
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+valid_input = """
+[registers]
+   R1=3
+   R2=2
+
+[memory]
+
+[code]
+   code = \"\"\"
+         DADD R3, R2, R1
+         SUB R2, R3, R1
+   \"\"\"
+"""
+
+invalid_input = """
+[registers]
+
+[memory]
+
+[code]
+   code = \"\"\"
+         FOO R1, R2
+   \"\"\"
+"""
+
+@pytest.fixture
+def inputs(tmp_path):
+   (tmp_path / 'input_a.toml').write_text(valid_input)
+   (tmp_path / 'input_b.toml').write_text(valid_input)
+   (tmp_path / 'input_bad.toml').write_text(invalid_input)
+   return tmp_path
+
+class TestBatch():
+   def test_output_path_replaces_input_prefix(self, tmp_path):
+      assert output_path(tmp_path / 'input_sample1.toml') == tmp_path / 'output_sample1.txt'
+      assert output_path(tmp_path / 'case.toml', tmp_path / 'out') == tmp_path / 'out' / 'case_output.txt'
+
+   def test_collect_jobs_from_directory_and_glob(self, inputs):
+      from_directory = collect_jobs([str(inputs)])
+      from_glob = collect_jobs([str(inputs / 'input_?.toml')])
+
+      assert [job.input.name for job in from_directory] == ['input_a.toml', 'input_b.toml', 'input_bad.toml']
+      assert [job.input.name for job in from_glob] == ['input_a.toml', 'input_b.toml']
+      assert from_glob[0].output == inputs / 'output_a.txt'
+
+   def test_collect_jobs_from_manifest(self, inputs):
+      manifest = inputs / 'jobs.txt'
+      manifest.write_text("# input output\ninput_a.toml results/a.txt\n\ninput_b.toml results/b.txt\n")
+
+      jobs = collect_jobs([str(manifest)])
+
+      assert [(job.input, job.output) for job in jobs] == [
+            (inputs / 'input_a.toml', inputs / 'results' / 'a.txt'),
+            (inputs / 'input_b.toml', inputs / 'results' / 'b.txt')
+         ]
+
+   def test_invalid_manifest_line_throws_exception(self, inputs):
+      manifest = inputs / 'jobs.txt'
+      manifest.write_text("input_a.toml\n")
+
+      with pytest.raises(AssertionError):
+         read_manifest(manifest)
+
+   def test_collect_jobs_throws_exception_for_duplicate_output(self, inputs):
+      with pytest.raises(AssertionError):
+         collect_jobs([str(inputs), str(inputs / 'input_a.toml')])
+
+   def test_collect_jobs_throws_exception_for_unmatched_source(self, inputs):
+      with pytest.raises(AssertionError):
+         collect_jobs([str(inputs / 'missing_*.toml')])
+
+   @pytest.mark.parametrize('workers', [1, 2])
+   def test_failed_job_does_not_stop_batch(self, inputs, workers):
+      jobs = collect_jobs([str(inputs)], inputs / 'out')
+
+      results = run_batch(jobs, workers)
+
+      assert [result.passed for result in results] == [True, True, False]
+      assert 'FOO' in results[2].error
+      assert (inputs / 'out' / 'output_a.txt').read_text() == (inputs / 'out' / 'output_b.txt').read_text()
+
+   @pytest.mark.parametrize('workers', [1, 2])
+   def test_lockstep_matches_functional_mode(self, inputs, workers):
+      pytest.importorskip('numpy')
+      jobs = collect_jobs([str(inputs)], inputs / 'out')
+      expected = run_batch(collect_jobs([str(inputs)], inputs / 'expected'), workers, mode='functional')
+
+      results = run_batch(jobs, workers, lockstep=True, mode='functional')
+
+      assert [result.passed for result in results] == [result.passed for result in expected] == [True, True, False]
+      assert 'FOO' in results[2].error
+      for name in ['output_a.txt', 'output_b.txt']:
+         assert (inputs / 'out' / name).read_text() == (inputs / 'expected' / name).read_text()
+
+   def test_lockstep_requires_functional_mode(self, inputs):
+      with pytest.raises(AssertionError):
+         run_batch(collect_jobs([str(inputs)], inputs / 'out'), 1, lockstep=True)
+
+   def test_matches_sample_output(self, tmp_path):
+      job = BatchJob(REPO_ROOT / 'input_sample1.toml', tmp_path / 'output_sample1.txt')
+
+      result, = run_batch([job])
+
+      assert result.passed
+      assert job.output.read_text() == (REPO_ROOT / 'output_sample1.txt').read_text()
+
+   def test_summary_lists_jobs_and_totals(self, inputs):
+      results = run_batch(collect_jobs([str(inputs)], inputs / 'out'), 1)
+
+      summary = format_summary(results, 1.0).split('\n')
+
+      assert len(summary) == 4
+      assert summary[2].startswith('FAIL')
+      assert summary[3].startswith('3 jobs, 2 passed, 1 failed')
@@ -0,0 +1,81 @@
+import pytest
+
+from simulator.simulation import simulate
+from simulator.lib.binary_trace import TraceReader, convert_trace
+
+loop_input = '''
+[registers]
+   R1=20
+   R2=5
+   R3=1
+
+[memory]
+   5 = 7
+
+[simulation]
+   max_cycles = "unlimited"
+
+[code]
+   code = """
+   LOOP: LD R4, 0(R2)
+         DADD R4, R4, R3
+         SD R4, 0(R2)
+         SUB R1, R1, R3
+         BNEZ R1, LOOP
+   """
+'''
+
+@pytest.fixture
+def input_path(tmp_path):
+   path = tmp_path / 'input.toml'
+   path.write_text(loop_input)
+   return path
+
+class TestBinaryTrace():
+   @pytest.mark.parametrize('mode', ['pipeline', 'functional'])
+   def test_converted_trace_matches_text_output(self, tmp_path, input_path, mode):
+      simulate(input_path, tmp_path / 'expected.txt', mode = mode, statistics = mode == 'pipeline')
+      simulate(input_path, tmp_path / 'trace.bin', mode = mode, statistics = mode == 'pipeline', trace_format = 'binary')
+
+      convert_trace(tmp_path / 'trace.bin', tmp_path / 'output.txt')
+
+      assert (tmp_path / 'output.txt').read_text() == (tmp_path / 'expected.txt').read_text()
+
+   def test_records_by_cycle(self, tmp_path, input_path):
+      simulate(input_path, tmp_path / 'expected.txt')
+      simulate(input_path, tmp_path / 'trace.bin', trace_format = 'binary')
+      lines = (tmp_path / 'expected.txt').read_text().split('REGISTERS')[0].splitlines()
+
+      reader = TraceReader(tmp_path / 'trace.bin')
+      try:
+         assert len(reader) == len(lines)
+         assert reader.stage_names == ['WB', 'MEM3', 'MEM2', 'MEM1', 'EX', 'ID', 'IF2', 'IF1']
+         assert reader.cycle(1).slots(reader.stage_names) == [(1, 'IF1', False)]
+         record = reader.cycle(50)
+         line = ' '.join(f"I{exe_id}-{'stall' if stalled else stage}" for exe_id, stage, stalled in record.slots(reader.stage_names))
+         assert lines[49] == f"c#50 {line} "
+         assert reader.cycle(len(lines) + 1) is None
+      finally:
+         reader.close()
+
+   def test_resumed_trace_matches_uninterrupted_trace(self, tmp_path, input_path):
+      simulate(input_path, tmp_path / 'expected.bin', trace_format = 'binary')
+      simulate(input_path, tmp_path / 'trace.bin', trace_format = 'binary', max_cycles = 40, checkpoint_every = 25, checkpoint_path = tmp_path / 'state.ckpt')
+
+      simulate(input_path, tmp_path / 'trace.bin', trace_format = 'binary', restore = tmp_path / 'state.ckpt')
+
+      assert (tmp_path / 'trace.bin').read_bytes() == (tmp_path / 'expected.bin').read_bytes()
+
+   def test_incomplete_trace(self, tmp_path, input_path):
+      simulate(input_path, tmp_path / 'trace.bin', trace_format = 'binary')
+      data = (tmp_path / 'trace.bin').read_bytes()
+      (tmp_path / 'trace.bin').write_bytes(data[:-1])
+
+      with pytest.raises(AssertionError):
+         TraceReader(tmp_path / 'trace.bin')
+
+   def test_text_output_is_not_a_trace(self, tmp_path, input_path):
+      simulate(input_path, tmp_path / 'output.txt')
+
+      with pytest.raises(AssertionError):
+         TraceReader(tmp_path / 'output.txt')
@@ -0,0 +1,86 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble
+from simulator.mips_virtualization.impl.mips_stage import build_8_stage_pipeline
+from simulator.lib.generics.register import Register
+from simulator.lib.generics.vcpu import VCpu
+from simulator.lib.generics.branch_predictor import BRANCH_PREDICTORS, build_branch_predictor
+from simulator.lib.vcpu_simulator import VCpuSimulator, PipelineLogger
+from simulator.lib.performance_counters import PerformanceCounters
+
+loop_code = [
+   "LOOP: SUB R1, R1, R3",
+   "      BNEZ R1, LOOP",
+   "      DADD R5, R3, R2",
+   "      DADD R3, R5, R2"
+]
+
+loop_registers = {'R1': 8, 'R2': 6, 'R3': 1}
+
+def simulate(code, registers, predictor: str = None) -> VCpuSimulator:
+   vcpu = VCpu({name: Register(value) for name, value in registers.items()}, {}, 992)
+   simulator = VCpuSimulator(vcpu, build_8_stage_pipeline(), PipelineLogger())
+   simulator.load_program(assemble(preprocess(list(code))), None, None if predictor is None else build_branch_predictor(predictor))
+   simulator.simulate(max_cycles=None)
+   return simulator
+
+class TestBranchPredictors():
+   def test_unknown_predictor(self):
+      with pytest.raises(AssertionError):
+         build_branch_predictor('perfect')
+
+   def test_two_bit_counter_saturates(self):
+      predictor = build_branch_predictor('2-bit')
+      opcode = assemble(preprocess(loop_code))[1]
+
+      for taken in [True, True, True, False]:
+         predictor.update(1, taken, 0, predictor.predict(1, opcode))
+
+      # one not taken branch after a run of taken ones is still predicted taken
+      assert predictor.predict(1, opcode) == 0
+
+   def test_target_buffer_tags_entries(self):
+      predictor = build_branch_predictor('btb', entries=4)
+      opcode = assemble(preprocess(loop_code))[1]
+
+      predictor.update(1, True, 0, None)
+
+      assert predictor.predict(1, opcode) == 0
+      assert predictor.predict(5, opcode) is None
+
+class TestBranchPrediction():
+   def test_not_taken_predictor_keeps_trace(self):
+      unpredicted = simulate(loop_code, loop_registers)
+      predicted = simulate(loop_code, loop_registers, 'not-taken')
+
+      assert predicted.logger.logs == unpredicted.logger.logs
+      assert predicted.program.predictor.mispredictions == 7
+
+   @pytest.mark.parametrize('predictor', list(BRANCH_PREDICTORS.keys()))
+   def test_predictors_keep_final_state(self, predictor):
+      unpredicted = simulate(loop_code, loop_registers)
+      predicted = simulate(loop_code, loop_registers, predictor)
+
+      assert predicted.logger.registers == unpredicted.logger.registers
+      assert predicted.program.completed == unpredicted.program.completed
+      assert predicted.program.predictor.branches == 8
+
+   @pytest.mark.parametrize('predictor', ['backward-taken', '1-bit', '2-bit', 'btb'])
+   def test_loop_predictors_cut_flushes(self, predictor):
+      unpredicted = simulate(loop_code, loop_registers)
+      predicted = simulate(loop_code, loop_registers, predictor)
+
+      assert predicted.program.predictor.mispredictions <= 2
+      assert len(predicted.logger.logs) < len(unpredicted.logger.logs)
+
+   def test_counters_report_accuracy(self):
+      vcpu = VCpu({name: Register(value) for name, value in loop_registers.items()}, {}, 992)
+      simulator = VCpuSimulator(vcpu, build_8_stage_pipeline(), PipelineLogger())
+      simulator.load_program(assemble(preprocess(loop_code)), None, build_branch_predictor('backward-taken'))
+      counters = PerformanceCounters()
+      counters.attach(simulator)
+      simulator.simulate(max_cycles=None)
+
+      prediction = counters.statistics()['branch_prediction']
+      assert prediction == {'predictor': 'backward-taken', 'branches': 8, 'mispredictions': 1, 'accuracy': pytest.approx(0.875)}
+      assert 'prediction_accuracy 0.875\n' in counters.lines()
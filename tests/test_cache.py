@@ -0,0 +1,210 @@
+import pytest
+
+from simulator.lib.generics.cache import Cache, CacheConfig, parse_cache_config
+from simulator.simulation import simulate
+from simulator.mips_virtualization.impl.mips_stage import DEFAULT_PROFILE_PATH
+
+caches_config = """
+[icache]
+   size = 8
+   line_size = 4
+   miss_penalty = 2
+
+[dcache]
+   size = 16
+   line_size = 4
+   associativity = 2
+   miss_penalty = 3
+"""
+
+memory_code = """
+[registers]
+   R1 = 1
+
+[memory]
+   1 = 5
+
+[code]
+   code = \"\"\"
+      LD R2, 0(R1)
+      DADD R3, R2, R2
+      SD R3, 2(R1)
+      LD R4, 3(R1)
+      DADD R5, R1, R1
+   \"\"\"
+"""
+
+three_stage_profile = """
+[pipeline]
+name = "three_stage"
+stages = ["IF", "EX", "WB"]
+
+[opcodes.DADD]
+operands = "EX"
+executes = "EX"
+forwardable = "WB"
+
+[opcodes.SUB]
+operands = "EX"
+executes = "EX"
+forwardable = "WB"
+
+[opcodes.LD]
+operands = "EX"
+executes = "EX"
+forwardable = "WB"
+
+[opcodes.SD]
+operands = "EX"
+executes = "EX"
+
+[opcodes.BNEZ]
+target = "EX"
+condition = "EX"
+resolves = "EX"
+"""
+
+# the load misses in the stage before the last while the instruction before it retires
+retire_code = """
+[registers]
+   R1 = 1
+   R2 = 2
+
+[memory]
+   1 = 5
+
+[code]
+   code = \"\"\"
+      DADD R4, R2, R2
+      LD R3, 0(R1)
+      DADD R5, R2, R1
+      DADD R6, R1, R1
+   \"\"\"
+"""
+
+def load_in_stage_before_last(tmp_path):
+   "returns the 8 stage profile with loads accessing memory in MEM3"
+   path = tmp_path / 'late_load.toml'
+   path.write_text(DEFAULT_PROFILE_PATH.read_text().replace(
+         '[opcodes.LD]\noperands = "MEM2"\nexecutes = "MEM2"\nforwardable = "MEM3"',
+         '[opcodes.LD]\noperands = "MEM3"\nexecutes = "MEM3"\nforwardable = "WB"'
+      ))
+   return path
+
+def three_stages(tmp_path):
+   path = tmp_path / 'three_stage.toml'
+   path.write_text(three_stage_profile)
+   return path
+
+@pytest.fixture
+def input_path(tmp_path):
+   path = tmp_path / 'input.toml'
+   path.write_text(memory_code)
+   return path
+
+@pytest.fixture
+def caches_path(tmp_path):
+   path = tmp_path / 'caches.toml'
+   path.write_text(caches_config)
+   return path
+
+class TestCache():
+   @pytest.mark.parametrize('replacement, hits, evictions', [('lru', 2, 1), ('fifo', 1, 2)])
+   def test_replacement(self, replacement, hits, evictions):
+      cache = Cache('dcache', CacheConfig(2, associativity=2, replacement=replacement, miss_penalty=5))
+
+      # line 0 is used again before line 2 evicts a line, lru keeps it and fifo evicts it
+      stalls = [cache.read(addr) for addr in [0, 1, 0, 2, 0]]
+
+      assert cache.hits == hits
+      assert stalls[:3] == [5, 5, 0]
+      assert cache.evictions == evictions
+
+   def test_write_back_evicts_dirty_lines(self):
+      cache = Cache('dcache', CacheConfig(2, line_size=2, miss_penalty=4, write_penalty=3))
+
+      assert cache.write(1) == 4 # write miss allocates the line
+      assert cache.write(0) == 0
+      assert cache.read(2) == 4 + 3 # evicts the dirty line
+      assert cache.read(0) == 4 # evicts a clean line
+
+      assert cache.counters() == {'reads': 2, 'writes': 2, 'hits': 1, 'misses': 3, 'evictions': 2, 'memory_writes': 1}
+
+   def test_write_through_does_not_allocate(self):
+      cache = Cache('dcache', CacheConfig(4, write_policy='write-through', miss_penalty=4, write_penalty=1))
+
+      assert cache.write(0) == 1
+      assert cache.read(0) == 4
+      assert cache.write(0) == 1
+
+      assert cache.counters() == {'reads': 1, 'writes': 2, 'hits': 1, 'misses': 2, 'evictions': 0, 'memory_writes': 2}
+
+   @pytest.mark.parametrize('contents', [
+      {'l2cache': {'size': 4}},
+      {'dcache': {'line_size': 4}},
+      {'dcache': {'size': 6, 'line_size': 4}},
+      {'dcache': {'size': 4, 'replacement': 'random'}},
+      {'dcache': {'size': 4, 'write_policy': 'write-around'}},
+      {'dcache': {'size': 4, 'miss_penalty': -1}},
+      {'dcache': {'size': 4, 'ways': 2}}
+   ])
+   def test_invalid_configuration_throws_exception(self, contents):
+      with pytest.raises(AssertionError):
+         parse_cache_config(contents)
+
+class TestCacheSimulation():
+   def test_misses_stall_stages(self, input_path, caches_path, tmp_path):
+      simulate(input_path, tmp_path / 'output.txt', max_cycles='unlimited', caches=caches_path)
+
+      lines = (tmp_path / 'output.txt').read_text().split('\n')
+      # the first fetch misses the instruction cache, the first load the data cache in MEM2
+      assert lines[:3] == ['c#1 I1-stall ', 'c#2 I1-stall ', 'c#3 I1-IF1 ']
+      assert lines[6:11] == [
+         'c#7 I1-MEM1 I2-stall I3-stall I4-stall ',
+         'c#8 I1-stall I2-stall I3-stall I4-stall ',
+         'c#9 I1-stall I2-stall I3-stall I4-stall ',
+         'c#10 I1-stall I2-stall I3-stall I4-stall ',
+         'c#11 I1-MEM2 I2-stall I3-stall I4-stall '
+      ]
+
+   @pytest.mark.parametrize('pipeline_core', ['arrays', 'stages'])
+   def test_final_state_matches_simulation_without_caches(self, input_path, caches_path, tmp_path, pipeline_core):
+      simulate(input_path, tmp_path / 'cached.txt', max_cycles='unlimited', caches=caches_path, pipeline_core=pipeline_core)
+      simulate(input_path, tmp_path / 'uncached.txt', max_cycles='unlimited', pipeline_core=pipeline_core)
+
+      cached = (tmp_path / 'cached.txt').read_text()
+      uncached = (tmp_path / 'uncached.txt').read_text()
+      assert cached.count('c#') == uncached.count('c#') + 2 * 2 + 2 * 3
+      assert cached[cached.index('REGISTERS'):] == uncached[uncached.index('REGISTERS'):]
+
+   def test_statistics_report_counters(self, input_path, caches_path, tmp_path):
+      simulate(input_path, tmp_path / 'output.txt', max_cycles='unlimited', caches=caches_path, statistics=True)
+
+      statistics = (tmp_path / 'output.txt').read_text().split('STATISTICS\n')[1]
+      assert 'icache hits 3\nicache misses 2\n' in statistics
+      assert 'dcache reads 2\ndcache writes 1\ndcache hits 1\ndcache misses 2\ndcache evictions 0\n' in statistics
+      assert 'dcache hit_rate 0.333\n' in statistics
+
+   def test_functional_mode_throws_exception(self, input_path, caches_path, tmp_path):
+      with pytest.raises(AssertionError):
+         simulate(input_path, tmp_path / 'output.txt', mode='functional', caches=caches_path)
+
+   @pytest.mark.parametrize('profile', [three_stages, load_in_stage_before_last])
+   @pytest.mark.parametrize('pipeline_core', ['arrays', 'stages'])
+   def test_miss_before_last_stage_retires_once(self, tmp_path, profile, pipeline_core):
+      input_path = tmp_path / 'retire.toml'
+      input_path.write_text(retire_code)
+      caches_path = tmp_path / 'dcache.toml'
+      caches_path.write_text("[dcache]\n   size = 8\n   miss_penalty = 3\n")
+      pipeline = profile(tmp_path)
+      assert 'forwardable = "WB"' in pipeline.read_text()
+
+      simulate(input_path, tmp_path / 'cached.txt', max_cycles='unlimited', caches=caches_path, pipeline=pipeline, pipeline_core=pipeline_core, statistics=True)
+      simulate(input_path, tmp_path / 'uncached.txt', max_cycles='unlimited', pipeline=pipeline, pipeline_core=pipeline_core)
+
+      cached = (tmp_path / 'cached.txt').read_text()
+      uncached = (tmp_path / 'uncached.txt').read_text()
+      assert cached.count('c#') == uncached.count('c#') + 3
+      assert cached[cached.index('REGISTERS'):cached.index('STATISTICS')] == uncached[uncached.index('REGISTERS'):]
+      assert 'retired 4\n' in cached
+      assert 'R6 2\n' in cached
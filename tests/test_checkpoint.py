@@ -0,0 +1,85 @@
+import pytest
+
+from simulator.simulation import simulate, default_checkpoint_path, SimulationStatus
+from simulator.lib.checkpoint import load_checkpoint
+
+loop_input = '''
+[registers]
+   R1=20
+   R2=5
+   R3=1
+
+[memory]
+   5 = 7
+
+[simulation]
+   max_cycles = "unlimited"
+
+[code]
+   code = """
+   LOOP: LD R4, 0(R2)
+         DADD R4, R4, R3
+         SD R4, 0(R2)
+         SUB R1, R1, R3
+         BNEZ R1, LOOP
+   """
+'''
+
+@pytest.fixture
+def input_path(tmp_path):
+   path = tmp_path / 'input.toml'
+   path.write_text(loop_input)
+   return path
+
+class TestCheckpoint():
+   @pytest.mark.parametrize('memory_backend', ['flat', 'mmap', 'dict'])
+   def test_resumed_run_matches_uninterrupted_run(self, tmp_path, input_path, memory_backend):
+      expected = tmp_path / 'expected.txt'
+      output = tmp_path / 'output.txt'
+      checkpoint = tmp_path / 'state.ckpt'
+      simulate(input_path, expected, memory_backend = memory_backend)
+
+      status = simulate(input_path, output, max_cycles = 57, checkpoint_every = 19, checkpoint_path = checkpoint, memory_backend = memory_backend)
+      assert status == SimulationStatus.CycleBudgetExhausted
+      assert load_checkpoint(checkpoint).cycle == 58
+
+      status = simulate(input_path, output, restore = checkpoint, memory_backend = memory_backend)
+
+      assert status == SimulationStatus.Finished
+      assert output.read_bytes() == expected.read_bytes()
+
+   def test_resume_discards_cycles_logged_after_checkpoint(self, tmp_path, input_path):
+      expected = tmp_path / 'expected.txt'
+      output = tmp_path / 'output.txt'
+      simulate(input_path, expected)
+
+      simulate(input_path, output, max_cycles = 60, checkpoint_every = 50)
+      simulate(input_path, output, restore = default_checkpoint_path(output))
+
+      assert output.read_bytes() == expected.read_bytes()
+
+   def test_restore_different_program_throws_exception(self, tmp_path, input_path):
+      output = tmp_path / 'output.txt'
+      simulate(input_path, output, max_cycles = 20, checkpoint_every = 20)
+      input_path.write_text(loop_input.replace('SUB R1, R1, R3', 'DADD R1, R1, R3'))
+
+      with pytest.raises(AssertionError):
+         simulate(input_path, output, restore = default_checkpoint_path(output))
+
+   def test_restore_without_logged_cycles_throws_exception(self, tmp_path, input_path):
+      output = tmp_path / 'output.txt'
+      simulate(input_path, output, max_cycles = 20, checkpoint_every = 20)
+
+      with pytest.raises(AssertionError):
+         simulate(input_path, tmp_path / 'other.txt', restore = default_checkpoint_path(output))
+
+   def test_load_invalid_checkpoint_throws_exception(self, tmp_path):
+      path = tmp_path / 'state.ckpt'
+      path.write_bytes(b'not a checkpoint')
+
+      with pytest.raises(AssertionError):
+         load_checkpoint(path)
+
+   def test_functional_mode_checkpoint_throws_exception(self, tmp_path, input_path):
+      with pytest.raises(AssertionError):
+         simulate(input_path, tmp_path / 'output.txt', mode = 'functional', checkpoint_every = 10)
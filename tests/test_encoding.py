@@ -0,0 +1,96 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble
+from simulator.mips_virtualization.encoding import encode_opcode, decode_word, encode_program, decode_program, disassemble, save_program_image, load_program_image
+from simulator.simulation import simulate
+
+sample_code = [
+   "      LD R2, 8(R1)",
+   "LOOP: DADD R4, R2, R3",
+   "      SD R4, (R1)",
+   "      SUB R2, R2, #1",
+   "      DADD R5, R5, #16",
+   "      SUB R6, R4, R2",
+   "      BNEZ R2, LOOP"
+]
+
+sample_input = """
+[registers]
+R1 = 16
+R2 = 3
+R3 = 4
+
+[memory]
+24 = 3
+
+[code]
+code = \"\"\"
+      LD R2, 8(R1)
+LOOP: DADD R4, R2, R3
+      SD R4, (R1)
+      SUB R2, R2, #1
+      BNEZ R2, LOOP
+\"\"\"
+"""
+
+def assembled(code):
+   return assemble(preprocess(list(code)))
+
+class TestEncoding():
+   def test_mips64_encodings(self):
+      opcodes = assembled(["DADD R1, R2, R3", "LD R2, 8(R1)", "SD R4, (R1)", "BNEZ R4, #0"])
+
+      assert encode_opcode(opcodes[0], 0) == 0x0043082C
+      assert encode_opcode(opcodes[1], 1) == 0xDC220008
+      assert encode_opcode(opcodes[2], 2) == 0xFC240000
+      assert encode_opcode(opcodes[3], 3) == 0x1480FFFC # branch back 4 instructions from the next one
+
+   def test_program_round_trip(self):
+      opcodes = assembled(sample_code)
+
+      decoded = decode_program(encode_program(opcodes))
+
+      assert [disassemble(opcode) for opcode in decoded.values()] == [disassemble(opcode) for opcode in opcodes.values()]
+
+   @pytest.mark.parametrize('line', ["DADD R1, #2, R3", "SD (R1), (R2)", "BNEZ R1, R2", "DADD R1, R2, #40000", "DADD PC, R1, R2"])
+   def test_unencodable_forms(self, line):
+      with pytest.raises(AssertionError):
+         encode_program(assembled([line]))
+
+   def test_unsupported_word(self):
+      with pytest.raises(AssertionError):
+         decode_word(0x08000000, 0) # J
+
+class TestProgramImage():
+   def test_image_round_trip(self, tmp_path):
+      words = encode_program(assembled(sample_code))
+
+      save_program_image(tmp_path / 'program.bin', words)
+
+      assert load_program_image(tmp_path / 'program.bin') == words
+      assert (tmp_path / 'program.bin').stat().st_size == 16 + 4 * len(sample_code)
+
+   def test_truncated_image(self, tmp_path):
+      save_program_image(tmp_path / 'program.bin', encode_program(assembled(sample_code)))
+      data = (tmp_path / 'program.bin').read_bytes()
+      (tmp_path / 'program.bin').write_bytes(data[:-4])
+
+      with pytest.raises(AssertionError):
+         load_program_image(tmp_path / 'program.bin')
+
+   def test_not_an_image(self, tmp_path):
+      (tmp_path / 'program.bin').write_bytes(b'DADD R1, R2, R3\n')
+
+      with pytest.raises(AssertionError):
+         load_program_image(tmp_path / 'program.bin')
+
+   @pytest.mark.parametrize('mode', ['pipeline', 'functional'])
+   def test_simulating_image_matches_source(self, tmp_path, mode):
+      (tmp_path / 'input.toml').write_text(sample_input)
+      simulate(tmp_path / 'input.toml', tmp_path / 'source.txt', mode=mode, max_cycles='unlimited', write_program_image=tmp_path / 'program.bin')
+      # the image replaces the code, which is not needed
+      (tmp_path / 'input.toml').write_text(sample_input.split('[code]')[0])
+
+      simulate(tmp_path / 'input.toml', tmp_path / 'image.txt', mode=mode, max_cycles='unlimited', program_image=tmp_path / 'program.bin')
+
+      assert (tmp_path / 'image.txt').read_text() == (tmp_path / 'source.txt').read_text()
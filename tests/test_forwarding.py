@@ -0,0 +1,112 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble, opcode_timings
+from simulator.mips_virtualization.impl.mips_stage import DEFAULT_PROFILE, DEFAULT_PROFILE_PATH, build_pipeline
+from simulator.lib.generics.pipeline_profile import parse_pipeline_profile, load_pipeline_profile
+from simulator.lib.generics.register import Register
+from simulator.lib.generics.vcpu import VCpu
+from simulator.lib.vcpu_simulator import VCpuSimulator, PipelineLogger
+from simulator.lib.performance_counters import PerformanceCounters
+
+alu_chain_code = [
+   "DADD R2, R1, R1",
+   "DADD R3, R2, R1"
+]
+
+load_use_code = [
+   "LD R2, (R4)",
+   "DADD R3, R2, R1"
+]
+
+loop_code = [
+   "LOOP: SUB R1, R1, R3",
+   "      BNEZ R1, LOOP",
+   "      DADD R5, R3, R2"
+]
+
+def build_simulator(code, registers, forwarding='full', profile=DEFAULT_PROFILE, use_scoreboard=True) -> VCpuSimulator:
+   vcpu = VCpu({name: Register(value) for name, value in registers.items()}, {8: 4}, 992)
+   stages = build_pipeline(profile, use_scoreboard, profile.forwarding_network(forwarding))
+   simulator = VCpuSimulator(vcpu, stages, PipelineLogger())
+   simulator.load_program(assemble(preprocess(list(code))), opcode_timings(profile))
+   return simulator
+
+def run(code, registers, forwarding='full', profile=DEFAULT_PROFILE, use_scoreboard=True) -> PipelineLogger:
+   simulator = build_simulator(code, registers, forwarding, profile, use_scoreboard)
+   simulator.simulate(max_cycles=None)
+   return simulator.logger
+
+class TestForwardingNetworks():
+   def test_full_forwarding_does_not_stall_alu_chain(self):
+      logger = run(alu_chain_code, {'R1': 1})
+
+      assert not any('stall' in line for line in logger.logs)
+      assert logger.registers[-1] == "R3 3\n"
+
+   def test_no_forwarding_waits_for_writeback(self):
+      logger = run(alu_chain_code, {'R1': 1}, 'none')
+
+      assert logger.logs[4] == "c#5 I1-MEM1 I2-stall \n"
+      assert logger.logs[7] == "c#8 I1-WB I2-EX \n"
+      assert logger.registers[-1] == "R3 3\n"
+
+   def test_ex_ex_forwards_alu_results_only(self):
+      alu = run(alu_chain_code, {'R1': 1}, 'ex-ex')
+      load = run(load_use_code, {'R1': 1, 'R4': 8}, 'ex-ex')
+      full_load = run(load_use_code, {'R1': 1, 'R4': 8})
+
+      assert not any('stall' in line for line in alu.logs)
+      assert len(load.logs) == len(full_load.logs) + 1 # the load result is read after writeback
+      assert load.registers == full_load.registers
+
+   @pytest.mark.parametrize('forwarding', ['full', 'ex-ex', 'none'])
+   @pytest.mark.parametrize('code, registers', [
+         (alu_chain_code, {'R1': 1}),
+         (load_use_code, {'R1': 1, 'R4': 8}),
+         (loop_code, {'R1': 3, 'R2': 6, 'R3': 1})
+      ])
+   def test_scoreboard_trace_matches_recursive(self, forwarding, code, registers):
+      recursive = run(code, registers, forwarding, use_scoreboard=False)
+      scoreboard = run(code, registers, forwarding, use_scoreboard=True)
+
+      assert scoreboard.logs == recursive.logs
+      assert scoreboard.registers == recursive.registers
+
+   def test_counts_path_usage(self):
+      simulator = build_simulator(alu_chain_code, {'R1': 1})
+      counters = PerformanceCounters()
+      counters.attach(simulator)
+      simulator.simulate(max_cycles=None)
+
+      assert counters.statistics()['forwarding'] == {'MEM1->EX': 1}
+      assert 'forwarding MEM1->EX 1\n' in counters.lines()
+
+   def test_branch_resolved_in_id(self):
+      profile = load_pipeline_profile(DEFAULT_PROFILE_PATH.with_name('mips_8_stage_id_branch.toml'))
+      early = run(loop_code, {'R1': 3, 'R2': 6, 'R3': 1}, profile=profile)
+      late = run(loop_code, {'R1': 3, 'R2': 6, 'R3': 1})
+
+      assert early.registers == late.registers
+      assert len(early.logs) < len(late.logs)
+
+class TestForwardingProfile():
+   def test_unknown_network(self):
+      with pytest.raises(AssertionError, match='ex-mem'):
+         DEFAULT_PROFILE.forwarding_network('ex-mem')
+
+   def test_default_networks(self):
+      assert DEFAULT_PROFILE.forwarding_networks == ['full', 'none', 'ex-ex']
+      assert DEFAULT_PROFILE.forwarding_network('full').full
+      assert DEFAULT_PROFILE.forwarding_network('ex-ex').paths == {(4, 3)}
+
+   @pytest.mark.parametrize('forwarding', [
+         {'full': {'paths': []}},
+         {'alu': {'paths': [['EX', 'MEM']]}},
+         {'alu': {'paths': [['MEM', 'EX', 'ID']]}},
+         {'alu': {'paths': [['MEM1', 'EX']]}}
+      ])
+   def test_invalid_network(self, forwarding):
+      contents = {'pipeline': {'stages': ['IF', 'ID', 'EX', 'MEM', 'WB']}, 'forwarding': forwarding}
+
+      with pytest.raises(AssertionError):
+         parse_pipeline_profile(contents)
@@ -0,0 +1,103 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble
+from simulator.mips_virtualization.impl.mips_stage import MipsStage, build_8_stage_pipeline
+from simulator.lib.generics.register import Register
+from simulator.lib.generics.vcpu import VCpu
+from simulator.lib.vcpu_simulator import VCpuSimulator, PipelineLogger
+from simulator.lib.functional_simulator import FunctionalSimulator
+
+load_use_code = [
+         "LD R2, 0(R1)",
+         "DADD R4, R2, R3",
+         "SD R4, 0(R1)",
+         "BNEZ R4, NEXT",
+         "DADD R2, R1, #8",
+   "NEXT: DADD R1, R1, R3"
+]
+
+loop_code = [
+   "LOOP: SUB R1, R1, R3",
+   "      BNEZ R1, LOOP",
+   "      DADD R5, R3, R2",
+   "      DADD R3, R5, R2"
+]
+
+def build_vcpu(registers, memory) -> VCpu:
+   return VCpu({reg: Register(value) for reg, value in registers.items()}, dict(memory), 992)
+
+def run_pipeline(code, registers, memory) -> PipelineLogger:
+   logger = PipelineLogger()
+   simulator = VCpuSimulator(build_vcpu(registers, memory), build_8_stage_pipeline(), logger)
+   simulator.load_program(assemble(preprocess(list(code))))
+   simulator.simulate()
+   return logger
+
+def run_functional(code, registers, memory) -> PipelineLogger:
+   logger = PipelineLogger()
+   simulator = FunctionalSimulator(build_vcpu(registers, memory), list(MipsStage), logger)
+   simulator.load_program(assemble(preprocess(list(code))))
+   simulator.simulate()
+   return logger
+
+class TestFunctionalSimulator():
+   @pytest.mark.parametrize('code, registers, memory', [
+         (load_use_code, {'R1': 16, 'R3': 42}, {16: 60}),
+         (loop_code, {'R1': 4, 'R2': 6, 'R3': 2}, {})
+      ])
+   def test_final_state_matches_pipeline(self, code, registers, memory):
+      pipeline = run_pipeline(code, registers, memory)
+      functional = run_functional(code, registers, memory)
+
+      assert functional.registers == pipeline.registers
+      assert functional.memory == pipeline.memory
+
+   def test_no_cycles_logged(self):
+      functional = run_functional(loop_code, {'R1': 4, 'R2': 6, 'R3': 2}, {})
+
+      assert functional.logs == []
+
+   def test_taken_branch_redirects_execution(self):
+      functional = run_functional(loop_code, {'R1': 4, 'R3': 2}, {})
+
+      assert functional.registers == ["R3 2\n", "R5 2\n"]
+
+   # an ALU instruction directly after a load or store computes its result in EX before the
+   # memory instruction reaches MEM2, functional mode can't reproduce that order
+   @pytest.mark.parametrize('code, pipeline_registers, pipeline_memory', [
+         ( # the load writes its destination after the DADD
+            ["LD R3, 4(R1)", "DADD R3, R2, R2"],
+            ["R1 1\n", "R2 2\n", "R3 50\n"], ["5 50\n"]
+         ),
+         ( # the load reads its base register after the DADD
+            ["LD R3, 4(R1)", "DADD R1, R2, R2"],
+            ["R1 4\n", "R2 2\n"], ["5 50\n"]
+         ),
+         ( # the store reads its data register after the DADD
+            ["SD R3, 4(R1)", "DADD R3, R2, R2"],
+            ["R1 1\n", "R2 2\n", "R3 4\n"], ["5 4\n"]
+         )
+      ])
+   def test_program_completed_out_of_order_throws_exception(self, code, pipeline_registers, pipeline_memory):
+      registers = {'R1': 1, 'R2': 2, 'R3': 3}
+      pipeline = run_pipeline(code, registers, {5: 50})
+
+      assert (pipeline.registers, pipeline.memory) == (pipeline_registers, pipeline_memory)
+      with pytest.raises(AssertionError, match="can't reproduce the pipeline's final state"):
+         run_functional(code, registers, {5: 50})
+
+   def test_final_state_matches_pipeline_when_alu_instruction_waits_for_load(self):
+      code = ["LD R3, 4(R1)", "DADD R3, R3, R3", "SD R3, 4(R1)", "DADD R4, R2, R2"]
+      pipeline = run_pipeline(code, {'R1': 1, 'R2': 2}, {5: 50})
+      functional = run_functional(code, {'R1': 1, 'R2': 2}, {5: 50})
+
+      assert functional.registers == pipeline.registers
+      assert functional.memory == pipeline.memory
+
+   def test_final_state_matches_pipeline_with_instruction_between(self):
+      code = ["LD R3, 4(R1)", "DADD R4, R2, R2", "DADD R3, R2, R2", "SD R3, 4(R1)", "DADD R4, R2, R2", "DADD R3, R1, R1"]
+      pipeline = run_pipeline(code, {'R1': 1, 'R2': 2}, {5: 50})
+      functional = run_functional(code, {'R1': 1, 'R2': 2}, {5: 50})
+
+      assert functional.registers == pipeline.registers
+      assert functional.memory == pipeline.memory
@@ -2,7 +2,7 @@ from pathlib import Path
 
 import pytest
 
-from simulator.input_parser import load_toml, get_initial_memory_state, get_initial_register_state, get_code
+from simulator.input_parser import load_toml, get_initial_memory_state, get_initial_register_state, get_code, get_simulation_options, parse_cycle_budget, UNLIMITED_CYCLES
 
 sample_toml_path = "test.toml"
 sample_code = """
@@ -75,3 +75,25 @@ class TestLoadCode:
       code = get_code(toml_data)
 
       assert code.strip() == sample_code.strip()
+
+class TestLoadSimulationOptions:
+   def test_options_default_to_empty(self, toml_data):
+      assert get_simulation_options(toml_data) == {}
+
+   def test_get_simulation_options(self):
+      options = get_simulation_options({'simulation': {'max_cycles': 1000000, 'timeout': 2}})
+
+      assert options == {'max_cycles': 1000000, 'timeout': 2.0}
+
+   @pytest.mark.parametrize('value, budget', [(30, 30), ('30', 30), ('unlimited', UNLIMITED_CYCLES), ('Unlimited', UNLIMITED_CYCLES)])
+   def test_parse_cycle_budget(self, value, budget):
+      assert parse_cycle_budget(value) == budget
+
+   @pytest.mark.parametrize('value', [0, -1, 'forever', 1.5, True])
+   def test_invalid_cycle_budget_throws_exception(self, value):
+      with pytest.raises(AssertionError):
+         parse_cycle_budget(value)
+
+   def test_invalid_timeout_throws_exception(self):
+      with pytest.raises(AssertionError):
+         get_simulation_options({'simulation': {'timeout': 0}})
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from simulator.simulation import simulate, simulate_lockstep, SimulationStatus
+
+memory_loop_code = [
+   "LOOP: LD R2, 0(R1)",
+   "      DADD R2, R2, R3",
+   "      SD R2, 8(R1)",
+   "      SUB R4, R4, R3",
+   "      DADD R1, R1, R3",
+   "      BNEZ R4, LOOP",
+   "      SD R4, (R5)"
+]
+
+def write_input(path, registers, memory, code, max_cycles=None):
+   contents = "[registers]\n" + ''.join(f"   {reg}={value}\n" for reg, value in registers.items())
+   contents += "[memory]\n" + ''.join(f"   {addr} = {value}\n" for addr, value in memory.items())
+   contents += "[code]\n   code = \"\"\"\n" + '\n'.join(code) + "\n\"\"\"\n"
+   if max_cycles is not None:
+      contents += f"[simulation]\n   max_cycles = {max_cycles}\n"
+   path.write_text(contents)
+   return path
+
+def run_lockstep(tmp_path, code, inputs):
+   "returns the status and output of each input simulated in lockstep and simulated on its own in functional mode"
+   paths = [write_input(tmp_path / f"input_{i}.toml", input[0], input[1], code, *input[2:]) for i, input in enumerate(inputs)]
+   outputs = [tmp_path / f"output_{i}.txt" for i in range(len(inputs))]
+   statuses = simulate_lockstep(paths, outputs)
+
+   expected = []
+   for i, path in enumerate(paths):
+      status = simulate(path, tmp_path / f"expected_{i}.txt", mode='functional')
+      expected.append((status, (tmp_path / f"expected_{i}.txt").read_text()))
+   return list(zip(statuses, [output.read_text() for output in outputs])), expected
+
+class TestSimulateLockstep():
+   @pytest.mark.parametrize('inputs', [
+      # same number of iterations, the lanes never diverge
+      [({'R1': 0, 'R3': 1, 'R4': 4}, {0: 3}), ({'R1': 10, 'R3': 1, 'R4': 4}, {10: 7, 11: 2})],
+      # different numbers of iterations and strides, lanes leave the loop at different steps
+      [({'R1': 0, 'R3': 1, 'R4': 6}, {0: 3}), ({'R1': 5, 'R3': 2, 'R4': 4}, {5: 1}), ({'R1': 2, 'R3': 1, 'R4': 1, 'R5': 100}, {})],
+   ])
+   def test_outputs_match_functional_mode(self, tmp_path, inputs):
+      results, expected = run_lockstep(tmp_path, memory_loop_code, inputs)
+
+      assert results == expected
+
+   def test_budget_per_input(self, tmp_path):
+      inputs = [({'R1': 0, 'R3': 1, 'R4': 6}, {}, 10), ({'R1': 0, 'R3': 1, 'R4': 1}, {}, 10)]
+      results, expected = run_lockstep(tmp_path, memory_loop_code, inputs)
+
+      assert [status for status, _ in results] == [SimulationStatus.CycleBudgetExhausted, SimulationStatus.Finished]
+      assert results == expected
+
+   def test_registers_beyond_64_bits(self, tmp_path):
+      code = ["DADD R1, R1, R1", "DADD R1, R1, R1", "SD R2, (R2)"]
+      inputs = [({'R1': 3, 'R2': 4}, {}), ({'R1': 2 ** 62, 'R2': 5}, {}), ({'R1': 2 ** 70, 'R2': 6}, {})]
+      results, expected = run_lockstep(tmp_path, code, inputs)
+
+      assert f"R1 {2 ** 64}\n" in results[1][1]
+      assert results == expected
+
+   def test_invalid_memory_write_throws_exception(self, tmp_path):
+      with pytest.raises(AssertionError, match="Memory writeback to invalid memory address 1000"):
+         run_lockstep(tmp_path, ["SD R1, 0(R2)"], [({'R1': 1, 'R2': 3}, {}), ({'R1': 1, 'R2': 1000}, {})])
+
+   def test_different_code_throws_exception(self, tmp_path):
+      first = write_input(tmp_path / "input_0.toml", {'R3': 1}, {}, memory_loop_code)
+      second = write_input(tmp_path / "input_1.toml", {'R3': 1}, {}, memory_loop_code[:-1])
+      with pytest.raises(AssertionError):
+         simulate_lockstep([first, second], [tmp_path / "output_0.txt", tmp_path / "output_1.txt"])
+
+   def test_sparse_memory_throws_exception(self, tmp_path):
+      path = write_input(tmp_path / "input_0.toml", {'R3': 1}, {}, memory_loop_code)
+      with pytest.raises(AssertionError):
+         simulate_lockstep([path], [tmp_path / "output_0.txt"], memory_backend='dict')
@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import pytest
+
+from simulator.lib.generics.memory import DictMemory, FlatMemory, MmapMemory, build_memory
+from simulator.lib.generics.vcpu import VCpu
+
+@pytest.fixture(params=['flat', 'mmap', 'dict'])
+def memory(request):
+   return build_memory(request.param, 99, {16: 60, 8: 40})
+
+class TestMemoryBackends():
+   def test_read_initial_values(self, memory):
+      assert memory.read(8) == 40
+      assert memory.read(16) == 60
+
+   def test_read_unwritten_and_out_of_range_addresses_as_zero(self, memory):
+      assert memory.read(4) == 0
+      assert memory.read(500) == 0
+
+   def test_items_lists_touched_words_in_first_touch_order(self, memory):
+      memory.write(2, 0)
+      memory.write(8, 41)
+
+      assert list(memory.items()) == [(16, 60), (8, 41), (2, 0)]
+
+   @pytest.mark.parametrize('value', [1 << 63, -(1 << 63) - 1])
+   def test_value_beyond_64_bits(self, memory, value):
+      if isinstance(memory, DictMemory): # unbounded
+         memory.write(3, value)
+         assert memory.read(3) == value
+      else:
+         with pytest.raises(AssertionError, match=f"{value} to address 3 does not fit a 64 bit memory word"):
+            memory.write(3, value)
+         assert memory.read(3) == 0
+         assert (3, 0) not in memory.items()
+
+   def test_initial_value_out_of_range_raises(self):
+      with pytest.raises(AssertionError):
+         FlatMemory(99, {100: 1})
+
+class TestMemoryImages():
+   def test_image_round_trip(self, tmp_path: Path):
+      image = tmp_path / 'memory.bin'
+      FlatMemory(9, {3: 5, 7: -2}).dump_image(image)
+
+      memory = MmapMemory(9)
+      memory.load_image(image)
+
+      assert memory.read(3) == 5
+      assert memory.read(7) == -2
+      assert list(memory.items()) == [(3, 5), (7, -2)]
+
+   def test_image_larger_than_memory_raises(self, tmp_path: Path):
+      image = tmp_path / 'memory.bin'
+      FlatMemory(19).dump_image(image)
+
+      with pytest.raises(AssertionError):
+         FlatMemory(9).load_image(image)
+
+class TestVCpuMemory():
+   def test_set_memory_value_bounds_checked(self):
+      vcpu = VCpu({}, {}, 99)
+
+      vcpu.set_memory_value(99, 1)
+      with pytest.raises(AssertionError):
+         vcpu.set_memory_value(100, 1)
+      with pytest.raises(AssertionError):
+         vcpu.set_memory_value(-1, 1)
+
+   def test_dict_initial_memory_uses_flat_backend(self):
+      vcpu = VCpu({}, {3: 5}, 99)
+
+      assert isinstance(vcpu.memory, FlatMemory)
+      assert vcpu.get_memory_value(3) == 5
@@ -0,0 +1,55 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble
+from simulator.lib.generics.mipsprogram import MipsProgram
+from simulator.lib.generics.vcpu import VCpu
+
+sample_code = [
+         "LD R2, 0(R1)",
+         "DADD R4, R2, R3",
+         "BNEZ R4, #0"
+]
+
+program: MipsProgram = None
+vcpu: VCpu = None
+
+@pytest.fixture(autouse=True)
+def program_init():
+   global program, vcpu
+   program = MipsProgram(assemble(preprocess(list(sample_code))))
+   vcpu = VCpu({}, {}, 99)
+
+class TestNextInstruction():
+   def test_next_instruction_shares_decoded_opcode(self):
+      first = program.next_instruction(vcpu)
+      vcpu.set_pc(0)
+      second = program.next_instruction(vcpu)
+
+      assert first.opcode is program.opcodes[0]
+      assert second.opcode is program.opcodes[0]
+      assert first.operands is second.operands
+
+   def test_next_instruction_assigns_exe_id_and_pc(self):
+      first = program.next_instruction(vcpu)
+      second = program.next_instruction(vcpu)
+
+      assert (first.exe_id, first.pc) == (1, 0)
+      assert (second.exe_id, second.pc) == (2, 1)
+      assert vcpu.get_pc().value == 2
+
+   def test_next_instruction_state_is_per_execution(self):
+      first = program.next_instruction(vcpu)
+      vcpu.set_pc(0)
+      second = program.next_instruction(vcpu)
+
+      first.invalidate()
+
+      assert first.noop
+      assert not second.noop
+      assert not program.opcodes[0].noop
+
+   def test_next_instruction_returns_none_past_end_of_program(self):
+      vcpu.set_pc(len(program.opcodes))
+
+      assert program.next_instruction(vcpu) is None
+      assert program.is_finished
@@ -0,0 +1,120 @@
+import pytest
+
+from simulator.simulation import simulate, simulate_multicore, SimulationStatus
+
+shared_input = """
+[memory]
+   0 = 5
+
+[[cores]]
+   code = \"\"\"
+         LD R1, 0(R0)
+   LOOP: SUB R1, R1, R2
+         SD R1, 1(R0)
+         BNEZ R1, LOOP
+         SD R2, 2(R0)
+   \"\"\"
+   [cores.registers]
+      R2 = 1
+
+[[cores]]
+   code = \"\"\"
+         LD R3, 0(R0)
+         DADD R4, R3, R3
+         SD R4, 2(R0)
+         LD R5, 1(R0)
+   \"\"\"
+
+[simulation]
+   max_cycles = 'unlimited'
+"""
+
+single_core_input = """
+[registers]
+   R1 = 3
+   R2 = 2
+
+[memory]
+   4 = 7
+
+[code]
+   code = \"\"\"
+         LD R3, 1(R1)
+         DADD R4, R3, R2
+         SD R4, (R2)
+   \"\"\"
+"""
+
+@pytest.fixture
+def shared(tmp_path):
+   path = tmp_path / 'input_shared.toml'
+   path.write_text(shared_input)
+   return path
+
+def memory_section(output: str) -> str:
+   return output[output.index('MEMORY\n'):]
+
+class TestMulticore():
+   def test_single_core_matches_simulation(self, tmp_path):
+      single = tmp_path / 'input_single.toml'
+      single.write_text(single_core_input)
+      multi = tmp_path / 'input_multi.toml'
+      multi.write_text(
+         "[memory]\n   4 = 7\n[[cores]]\n   code = \"\"\"\n LD R3, 1(R1)\n DADD R4, R3, R2\n SD R4, (R2)\n\"\"\"\n"
+         "   [cores.registers]\n      R1 = 3\n      R2 = 2\n"
+      )
+
+      simulate(single, tmp_path / 'single.txt')
+      simulate(multi, tmp_path / 'multi.txt')
+
+      assert (tmp_path / 'multi.txt').read_text() == 'CORE 0\n' + (tmp_path / 'single.txt').read_text()
+
+   def test_output_lists_each_core(self, shared, tmp_path):
+      statuses = simulate_multicore(shared, tmp_path / 'output.txt')
+
+      output = (tmp_path / 'output.txt').read_text()
+      assert statuses == [SimulationStatus.Finished, SimulationStatus.Finished]
+      assert output.startswith('CORE 0\nc#1 ')
+      assert '\nCORE 1\nc#1 ' in output
+      assert not list(tmp_path.glob('output.txt.core*')) # per core cycles are merged into the output
+
+   def test_highest_core_write_wins(self, shared, tmp_path):
+      simulate_multicore(shared, tmp_path / 'output.txt', sync_cycles=1000)
+
+      # both cores write word 2 before synchronizing at the end, core 1 wrote 10
+      assert '\n2 10\n' in memory_section((tmp_path / 'output.txt').read_text())
+
+   def test_writes_visible_after_synchronization(self, shared, tmp_path):
+      simulate_multicore(shared, tmp_path / 'every_cycle.txt', sync_cycles=1)
+      simulate_multicore(shared, tmp_path / 'at_end.txt', sync_cycles=1000)
+
+      # core 1 loads word 1 after core 0 stored to it, but only sees the store once synchronized
+      assert 'R5 4\n' in (tmp_path / 'every_cycle.txt').read_text()
+      assert 'R5' not in (tmp_path / 'at_end.txt').read_text()
+
+   @pytest.mark.parametrize('sync_cycles', [1, 4])
+   def test_core_processes_match_single_process(self, shared, tmp_path, sync_cycles):
+      simulate_multicore(shared, tmp_path / 'single.txt', sync_cycles=sync_cycles)
+      statuses = simulate_multicore(shared, tmp_path / 'processes.txt', core_processes=True, sync_cycles=sync_cycles)
+
+      assert [status.value for status in statuses] == ['finished', 'finished']
+      assert (tmp_path / 'processes.txt').read_text() == (tmp_path / 'single.txt').read_text()
+
+   @pytest.mark.parametrize('core_processes', [False, True])
+   def test_cycle_budget_stops_every_core(self, shared, tmp_path, core_processes):
+      statuses = simulate_multicore(shared, tmp_path / 'output.txt', max_cycles=20, core_processes=core_processes)
+
+      assert [status.value for status in statuses] == ['cycle budget exhausted', 'finished']
+
+   def test_failing_core_process_throws_exception(self, tmp_path):
+      path = tmp_path / 'input_fail.toml'
+      path.write_text(shared_input.replace('SD R4, 2(R0)', 'SD R4, 2000(R0)'))
+
+      with pytest.raises(AssertionError, match="invalid memory address 2000"):
+         simulate_multicore(path, tmp_path / 'output.txt', core_processes=True)
+
+   def test_unsupported_options_throw_exception(self, shared, tmp_path):
+      with pytest.raises(AssertionError):
+         simulate(shared, tmp_path / 'output.txt', mode='functional')
+      with pytest.raises(AssertionError):
+         simulate(shared, tmp_path / 'output.txt', sync_cycles=0)
@@ -0,0 +1,125 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble
+from simulator.mips_virtualization.impl.mips_stage import DEFAULT_PROFILE, build_pipeline
+from simulator.lib.generics.register import Register
+from simulator.lib.generics.vcpu import VCpu
+from simulator.lib.vcpu_simulator import VCpuSimulator, PipelineLogger
+from simulator.lib.performance_counters import PerformanceCounters
+
+loop_code = [
+   "LOOP: SUB R1, R1, R3",
+   "      BNEZ R1, LOOP",
+   "      DADD R5, R3, R2",
+   "      DADD R3, R5, R2"
+]
+
+load_use_code = [
+   "LD R2, (R4)",
+   "DADD R3, R2, R1"
+]
+
+alu_use_code = [
+   "DADD R2, R1, R1",
+   "DADD R3, R2, R1"
+]
+
+def build_simulator(code, registers, forwarding='full', core='arrays') -> VCpuSimulator:
+   vcpu = VCpu({name: Register(value) for name, value in registers.items()}, {}, 992)
+   stages = build_pipeline(DEFAULT_PROFILE, forwarding=DEFAULT_PROFILE.forwarding_network(forwarding), core=core)
+   simulator = VCpuSimulator(vcpu, stages, PipelineLogger())
+   simulator.load_program(assemble(preprocess(list(code))))
+   return simulator
+
+def count(code, registers, forwarding='full', core='arrays') -> dict:
+   simulator = build_simulator(code, registers, forwarding, core)
+   counters = PerformanceCounters()
+   counters.attach(simulator)
+   simulator.simulate(max_cycles=None)
+   return counters.statistics()
+
+class TestPerformanceCounters():
+   def test_counts_cycles_of_trace(self):
+      simulator = build_simulator(loop_code, {'R1': 4, 'R2': 6, 'R3': 2})
+      counters = PerformanceCounters()
+      counters.attach(simulator)
+
+      simulator.simulate(max_cycles=None)
+
+      assert counters.cycles == len(simulator.logger.logs)
+      assert counters.statistics()['retired_instructions'] == simulator.program.completed
+
+   def test_counts_load_use_hazard(self):
+      statistics = count(load_use_code, {'R1': 1, 'R4': 8})
+
+      assert statistics['cycles'] == 11
+      assert statistics['retired_instructions'] == 2
+      assert statistics['cpi'] == pytest.approx(5.5)
+      assert statistics['stall_cycles']['EX'] == 2
+      assert sum(statistics['stall_cycles'].values()) == 2
+      assert statistics['hazard_stalls'] == {'Ld': {'MEM1': 1, 'MEM2': 1}}
+
+   @pytest.mark.parametrize('core', ['arrays', 'stages'])
+   def test_counts_hazards_without_forwarding_path(self, core):
+      forwarded = count(alu_use_code, {'R1': 1}, 'full', core)
+      statistics = count(alu_use_code, {'R1': 1}, 'none', core)
+
+      assert forwarded['hazard_stalls'] == {}
+      # the result waits in each stage up to writeback, which the register file reads
+      assert statistics['stall_cycles']['EX'] == 3
+      assert statistics['hazard_stalls'] == {'Dadd': {'MEM1': 1, 'MEM2': 1, 'MEM3': 1}}
+
+   def test_counts_branch_flushes(self):
+      statistics = count(loop_code, {'R1': 4, 'R2': 6, 'R3': 2})
+
+      assert statistics['flushes'] == {'Bnez': 1}
+      assert statistics['squashed_instructions'] > 0
+
+   def test_lines_of_statistics_section(self):
+      simulator = build_simulator(load_use_code, {'R1': 1, 'R4': 8})
+      counters = PerformanceCounters()
+      counters.attach(simulator)
+      simulator.simulate()
+
+      lines = counters.lines()
+
+      assert lines[:4] == ['cycles 11\n', 'retired 2\n', 'CPI 5.500\n', 'squashed 0\n']
+      assert 'stalls EX 2\n' in lines
+      assert 'hazard_stalls Ld MEM1 1\n' in lines
+
+   def test_statistics_section_written_after_memory(self, tmp_path):
+      simulator = build_simulator(load_use_code, {'R1': 1, 'R4': 8})
+      counters = PerformanceCounters()
+      counters.attach(simulator)
+      simulator.simulate()
+      simulator.logger.statistics = counters.lines()
+
+      simulator.logger.write_to_file(tmp_path / 'output.txt')
+
+      contents = (tmp_path / 'output.txt').read_text()
+      assert contents.index('MEMORY\n') < contents.index('STATISTICS\ncycles 11\n')
+
+   def test_trace_unchanged_by_counting(self):
+      plain = build_simulator(loop_code, {'R1': 4, 'R2': 6, 'R3': 2})
+      counted = build_simulator(loop_code, {'R1': 4, 'R2': 6, 'R3': 2})
+      PerformanceCounters().attach(counted)
+
+      plain.simulate()
+      counted.simulate()
+
+      assert counted.logger.logs == plain.logger.logs
+
+   def test_restore_continues_counting(self):
+      counters = PerformanceCounters()
+      counters.attach(build_simulator(loop_code, {'R1': 4, 'R2': 6, 'R3': 2}))
+      counters.cycles = 5
+      counters.stall_cycles['ID'] = 3
+      counters.flushes['Bnez'] = 1
+
+      restored = PerformanceCounters()
+      restored.attach(build_simulator(loop_code, {'R1': 4, 'R2': 6, 'R3': 2}))
+      restored.restore(counters.state())
+
+      assert restored.cycles == 5
+      assert restored.stall_cycles['ID'] == 3
+      assert restored.flushes == {'Bnez': 1}
@@ -0,0 +1,102 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble, opcode_timings, INSTRUCTION_MAP
+from simulator.mips_virtualization.impl.mips_stage import MipsStage, DEFAULT_PROFILE, build_pipeline
+from simulator.lib.generics.pipeline_profile import parse_pipeline_profile
+from simulator.lib.generics.register import Register
+from simulator.lib.generics.vcpu import VCpu
+from simulator.lib.vcpu_simulator import VCpuSimulator, PipelineLogger
+
+five_stage = {
+   'pipeline': {'name': 'classic_5_stage', 'stages': ['IF', 'ID', 'EX', 'MEM', 'WB']},
+   'opcodes': {
+      'DADD': {'operands': 'EX', 'executes': 'EX', 'forwardable': 'MEM'},
+      'SUB': {'operands': 'EX', 'executes': 'EX', 'forwardable': 'MEM'},
+      'LD': {'operands': 'MEM', 'executes': 'MEM', 'forwardable': 'WB'},
+      'SD': {'operands': 'MEM', 'executes': 'MEM'},
+      'BNEZ': {'target': 'ID', 'condition': 'EX', 'resolves': 'EX'}
+   }
+}
+
+def run(profile, code, registers, memory) -> PipelineLogger:
+   vcpu = VCpu({reg: Register(value) for reg, value in registers.items()}, dict(memory), 992)
+   simulator = VCpuSimulator(vcpu, build_pipeline(profile), PipelineLogger())
+   simulator.load_program(assemble(preprocess(list(code))), opcode_timings(profile))
+   simulator.simulate(max_cycles=None)
+   return simulator.logger
+
+class TestDefaultProfile():
+   def test_stages_of_8_stage_pipeline(self):
+      assert [stage.name for stage in MipsStage] == ['IF1', 'IF2', 'ID', 'EX', 'MEM1', 'MEM2', 'MEM3', 'WB']
+      assert [int(stage) for stage in MipsStage] == list(range(8))
+
+   def test_opcode_classes_use_default_timings(self):
+      timings = opcode_timings(DEFAULT_PROFILE)
+
+      for opcode_cls, timing in timings.items():
+         assert opcode_cls.timing.stages() == timing.stages()
+      assert timings[INSTRUCTION_MAP['LD']].stages() == {'operands': MipsStage.MEM2, 'executes': MipsStage.MEM2, 'forwardable': MipsStage.MEM3}
+      assert timings[INSTRUCTION_MAP['BNEZ']].stages() == {'target': MipsStage.ID, 'condition': MipsStage.EX, 'resolves': MipsStage.MEM1}
+
+class TestPipelineProfile():
+   def test_pipeline_linked_in_order(self):
+      stages = build_pipeline(parse_pipeline_profile(five_stage))
+
+      assert [stage.stage_id.name for stage in stages] == ['IF', 'ID', 'EX', 'MEM', 'WB']
+      assert stages[0].prev is None
+      assert stages[-1].next is None
+      for prev, next in zip(stages, stages[1:]):
+         assert prev.next is next
+         assert next.prev is prev
+
+   def test_load_use_stall_in_5_stage_pipeline(self):
+      logger = run(parse_pipeline_profile(five_stage), ["LD R2, (R4)", "DADD R3, R2, R1"], {'R1': 1, 'R4': 8}, {8: 4})
+
+      assert logger.logs == [
+         "c#1 I1-IF \n",
+         "c#2 I1-ID I2-IF \n",
+         "c#3 I1-EX I2-ID \n",
+         "c#4 I1-MEM I2-stall \n",
+         "c#5 I1-WB I2-EX \n",
+         "c#6 I2-MEM \n",
+         "c#7 I2-WB \n"
+      ]
+      assert logger.registers == ["R1 1\n", "R4 8\n", "R2 4\n", "R3 5\n"]
+
+   def test_branch_resolved_earlier_squashes_fewer(self):
+      code = ["LOOP: SUB R1, R1, R3", "      BNEZ R1, LOOP", "      DADD R5, R3, R3"]
+      logger = run(parse_pipeline_profile(five_stage), code, {'R1': 2, 'R3': 1}, {})
+
+      assert logger.logs[2] == "c#3 I1-EX I2-ID I3-IF \n"
+      assert logger.logs[3] == "c#4 I1-MEM I2-EX I4-IF \n" # I3 squashed when I2 resolved in EX
+      assert logger.registers[-1] == "R5 2\n"
+
+   @pytest.mark.parametrize('contents', [
+         {'pipeline': {'stages': ['IF']}},
+         {'pipeline': {'stages': ['IF', 'IF']}},
+         {'pipeline': {'stages': ['IF', 'MEM 1']}},
+         {'pipeline': {'stages': ['IF', 'EX']}, 'opcodes': {'DADD': {'operands': 'MEM'}}},
+         {'pipeline': {'stages': ['IF', 'EX']}, 'opcodes': {'DADD': {'latency': 'EX'}}}
+      ])
+   def test_invalid_profile(self, contents):
+      with pytest.raises(AssertionError):
+         parse_pipeline_profile(contents)
+
+   @pytest.mark.parametrize('opcode, table', [
+         ('DADD', {'operands': 'EX', 'executes': 'EX'}),
+         ('LD', {'operands': 'MEM', 'executes': 'MEM', 'forwardable': 'EX'}),
+         ('BNEZ', {'target': 'EX', 'condition': 'EX', 'resolves': 'ID'})
+      ])
+   def test_invalid_opcode_timing(self, opcode, table):
+      contents = {'pipeline': five_stage['pipeline'], 'opcodes': dict(five_stage['opcodes'])}
+      contents['opcodes'][opcode] = table
+
+      with pytest.raises(AssertionError, match=opcode):
+         opcode_timings(parse_pipeline_profile(contents))
+
+   def test_missing_opcode(self):
+      contents = {'pipeline': five_stage['pipeline'], 'opcodes': dict(five_stage['opcodes'])}
+      del contents['opcodes']['SD']
+
+      with pytest.raises(AssertionError, match='SD'):
+         opcode_timings(parse_pipeline_profile(contents))
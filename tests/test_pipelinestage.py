@@ -10,6 +10,7 @@ from simulator.lib.generics.opcode import Opcode
 from simulator.lib.generics.operand import Operand
 from simulator.lib.generics.mipsprogram import MipsProgram
 from simulator.lib.generics.pipelinestage import PipelineStage
+from simulator.lib.generics.scoreboard import Scoreboard, ScoreboardPipelineStage
 from simulator.lib.generics.pipelineoperations import PipelineOperations
 from simulator.lib.generics.addressing_modes import AddressingMode
 from simulator.lib.generics.vcpu import VCpu
@@ -43,12 +44,21 @@ opcode2: StubOpcode = StubOpcode([], [])
 opcode3: StubOpcode = StubOpcode([], [])
 vcpu: VCpu = None
 
-@pytest.fixture(autouse=True)
-def pipeline_init():
+def build_recursive_stage():
+   return lambda stage_id: PipelineStage(stage_id)
+
+def build_scoreboard_stage():
+   scoreboard = Scoreboard()
+   return lambda stage_id: ScoreboardPipelineStage(stage_id, scoreboard)
+
+# every case runs against both hazard detection implementations
+@pytest.fixture(autouse=True, params=[build_recursive_stage, build_scoreboard_stage], ids=['recursive', 'scoreboard'])
+def pipeline_init(request):
    global stage1, stage2, stage3, program, vcpu
-   stage1 = PipelineStage(0)
-   stage2 = PipelineStage(1)
-   stage3 = PipelineStage(2)
+   build_stage = request.param()
+   stage1 = build_stage(0)
+   stage2 = build_stage(1)
+   stage3 = build_stage(2)
 
    stage1.next = stage2
    stage2.prev = stage1
@@ -72,10 +82,6 @@ class TestPipelineStage():
       assert stage1.instruction.noop
 
    def test_is_data_hazard_returns_true_if_next_stage_has_pending_value(self, monkeypatch):
-      stage1.instruction = opcode3
-      stage2.instruction = opcode2
-      stage3.instruction = opcode1
-
       opcode2.operands.append(StubOperand(1, 'R1'))
       opcode1.output_operands.append(StubOperand(2, 'R1'))
 
@@ -84,15 +90,15 @@ class TestPipelineStage():
 
       monkeypatch.setattr(StubOpcode, "output_operands_forwardable", mock_forwardable)
 
+      stage1.instruction = opcode3
+      stage2.instruction = opcode2
+      stage3.instruction = opcode1
+
       hazard = stage3.is_data_hazard(opcode2.operands)
 
       assert hazard
 
    def test_is_data_hazard_returns_false_if_next_stage_has_fowardable_value(self, monkeypatch):
-      stage1.instruction = opcode3
-      stage2.instruction = opcode2
-      stage3.instruction = opcode1
-
       opcode2.operands.append(StubOperand(1, 'R1'))
       opcode1.output_operands.append(StubOperand(2, 'R1'))
 
@@ -101,15 +107,15 @@ class TestPipelineStage():
 
       monkeypatch.setattr(StubOpcode, "output_operands_forwardable", mock_forwardable)
 
+      stage1.instruction = opcode3
+      stage2.instruction = opcode2
+      stage3.instruction = opcode1
+
       hazard = stage3.is_data_hazard(opcode2.operands)
 
       assert not hazard
 
    def test_is_data_hazard_returns_false_if_next_stages_do_not_use_register(self, monkeypatch):
-      stage1.instruction = opcode3
-      stage2.instruction = opcode2
-      stage3.instruction = opcode1
-
       opcode2.operands.append(StubOperand(1, 'R1'))
 
       def mock_forwardable(*args, **kwargs):
@@ -117,6 +123,10 @@ class TestPipelineStage():
 
       monkeypatch.setattr(StubOpcode, "output_operands_forwardable", mock_forwardable)
 
+      stage1.instruction = opcode3
+      stage2.instruction = opcode2
+      stage3.instruction = opcode1
+
       hazard = stage3.is_data_hazard(opcode2.operands)
 
       assert not hazard
@@ -0,0 +1,73 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble
+from simulator.mips_virtualization.impl.mips_stage import build_8_stage_pipeline
+from simulator.lib.generics.register import Register
+from simulator.lib.generics.vcpu import VCpu
+from simulator.lib.vcpu_simulator import VCpuSimulator, PipelineLogger
+from simulator.lib.profiler import PipelineProfiler, PHASES
+
+loop_code = [
+   "LOOP: SUB R1, R1, R3",
+   "      BNEZ R1, LOOP",
+   "      DADD R5, R3, R2",
+   "      DADD R3, R5, R2"
+]
+
+def build_simulator() -> VCpuSimulator:
+   vcpu = VCpu({'R1': Register(4), 'R2': Register(6), 'R3': Register(2)}, {}, 992)
+   simulator = VCpuSimulator(vcpu, build_8_stage_pipeline(), PipelineLogger())
+   simulator.load_program(assemble(preprocess(list(loop_code))))
+   return simulator
+
+class TestPipelineProfiler():
+   def test_counts_every_phase_of_every_cycle(self, tmp_path):
+      simulator = build_simulator()
+      profiler = PipelineProfiler()
+      profiler.attach(simulator, tmp_path / 'profile.txt')
+
+      simulator.simulate()
+
+      cycles = simulator.cycle - 1
+      assert len(profiler.phases) == 8 * len(PHASES)
+      for (stage_name, phase), (calls, ns) in profiler.phases.items():
+         if phase != 'handle_operations':
+            assert calls == cycles
+      assert profiler.phases[('MEM1', 'handle_operations')][0] == 1 # flush of the one taken branch
+
+   def test_counts_opcode_ticks(self, tmp_path):
+      simulator = build_simulator()
+      profiler = PipelineProfiler()
+      profiler.attach(simulator, tmp_path / 'profile.txt')
+
+      simulator.simulate()
+
+      assert set(profiler.opcodes.keys()) == {'Sub', 'Bnez', 'Dadd'}
+      assert sum(calls for calls, _ in profiler.opcodes.values()) <= sum(calls for (_, phase), (calls, _) in profiler.phases.items() if phase == 'execute_instruction')
+
+   def test_report_written_after_simulate(self, tmp_path):
+      simulator = build_simulator()
+      PipelineProfiler().attach(simulator, tmp_path / 'profile.txt')
+
+      simulator.simulate()
+
+      report = (tmp_path / 'profile.txt').read_text()
+      assert 'fetch_next_instruction' in report
+      assert 'Bnez' in report
+
+   def test_trace_unchanged_by_profiling(self, tmp_path):
+      plain = build_simulator()
+      profiled = build_simulator()
+      PipelineProfiler().attach(profiled, tmp_path / 'profile.txt')
+
+      plain.simulate()
+      profiled.simulate()
+
+      assert profiled.logger.logs == plain.logger.logs
+
+   def test_unprofiled_stages_not_instrumented(self):
+      simulator = build_simulator()
+
+      for stage in simulator.stages:
+         assert not set(PHASES) & set(vars(stage))
+      assert 'simulate' not in vars(simulator)
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import simulator.mips_virtualization.program_cache as program_cache
+from simulator.mips_virtualization.program_cache import ProgramCache, source_key, describe_program, build_program
+
+sample_code = """
+         LD R2, 0(R1)
+         DADD R4, R2, R3
+         SD R4, (R1)
+         BNEZ R4, NEXT
+         DADD R2, R1, #8
+   NEXT: DADD R1, R1, R3
+"""
+
+def describe(program) -> list:
+   return [(type(opcode).__name__, [vars(operand) for operand in opcode.output_operands + opcode.operands]) for opcode in program.opcodes.values()]
+
+class TestProgramCache():
+   def test_memory_hit_skips_assembly(self, monkeypatch):
+      cache = ProgramCache()
+      first = cache.assemble(sample_code)
+      monkeypatch.setattr(program_cache, 'assemble', None)
+
+      second = cache.assemble(sample_code)
+
+      assert (cache.hits, cache.misses) == (1, 1)
+      assert second.opcodes[0] is first.opcodes[0]
+      assert second.preprocessed_code == first.preprocessed_code
+
+   def test_disk_hit_rebuilds_program_without_parsing(self, tmp_path, monkeypatch):
+      expected = ProgramCache(tmp_path).assemble(sample_code)
+      monkeypatch.setattr(program_cache, 'preprocess', None)
+      monkeypatch.setattr(program_cache, 'assemble', None)
+
+      cache = ProgramCache(tmp_path)
+      program = cache.assemble(sample_code)
+
+      assert cache.hits == 1
+      assert describe(program) == describe(expected)
+      assert program.preprocessed_code == expected.preprocessed_code
+
+   def test_describe_round_trip(self):
+      program = ProgramCache().assemble(sample_code)
+
+      rebuilt = build_program(json.loads(json.dumps(describe_program(program))))
+
+      assert describe(rebuilt) == describe(program)
+
+   def test_key_depends_on_assembler_version(self, monkeypatch):
+      key = source_key(sample_code)
+      monkeypatch.setattr(program_cache, 'ASSEMBLER_VERSION', program_cache.ASSEMBLER_VERSION + 1)
+
+      assert source_key(sample_code) != key
+
+   def test_least_recently_used_entry_evicted(self):
+      cache = ProgramCache(max_entries=2)
+      cache.assemble("DADD R1, R1, R2")
+      cache.assemble("DADD R1, R1, R3")
+      cache.assemble("DADD R1, R1, R2")
+
+      cache.assemble("DADD R1, R1, R4")
+
+      assert list(cache.entries.keys()) == [source_key("DADD R1, R1, R2"), source_key("DADD R1, R1, R4")]
+
+   def test_directory_size_limited(self, tmp_path):
+      cache = ProgramCache(tmp_path, max_bytes=1)
+
+      cache.assemble("DADD R1, R1, R2")
+      cache.assemble("DADD R1, R1, R3")
+
+      assert len(list(tmp_path.glob('*.json'))) == 0
+
+   def test_corrupt_file_is_reassembled(self, tmp_path):
+      (tmp_path / (source_key(sample_code) + '.json')).write_text('{')
+      cache = ProgramCache(tmp_path)
+
+      program = cache.assemble(sample_code)
+
+      assert cache.misses == 1
+      assert len(program.opcodes) == 6
@@ -0,0 +1,105 @@
+import io
+import re
+import pytest
+
+from simulator.simulation import simulate
+from simulator.lib.visualization.text_visualizer import TextVisualizer, parse_cycle_window, render_trace
+
+branch_input = '''
+[registers]
+   R1 = 1
+   R2 = 2
+
+[memory]
+   1 = 5
+
+[code]
+   code = """
+         LD R2, 0(R1)
+         DADD R3, R2, R2
+   AAA: SUB R2, R2, #1
+         BNEZ R2, AAA
+         SD R3, 2(R1)
+   """
+'''
+
+@pytest.fixture
+def input_path(tmp_path):
+   path = tmp_path / 'input.toml'
+   path.write_text(branch_input)
+   return path
+
+def cells(line: str) -> str:
+   return line.split('| ')[1] if '| ' in line else ''
+
+def trace_diagram(trace: str, first_cycle: int, last_cycle: int) -> dict:
+   "returns the cells of each instruction in the window, read from the c#N lines"
+   rows = {}
+   for line in trace.split('REGISTERS')[0].splitlines():
+      cycle = int(line.split(' ')[0][2:])
+      if first_cycle <= cycle <= last_cycle:
+         for exe_id, stage in re.findall(r'I(\d+)-(\S+)', line):
+            rows.setdefault(int(exe_id), {})[cycle] = stage
+   return rows
+
+class TestTextVisualizer():
+   def test_rows_are_written_in_order_once_finished(self):
+      out = io.StringIO()
+      visualizer = TextVisualizer(out, ['IF', 'ID', 'EX'], 1, 4, ['LD R1, 0(R2)', 'BNEZ R1, #0', 'SUB R3, R3, #1'])
+
+      visualizer.add_cycle(1, [(1, 1, 'IF', False)])
+      visualizer.add_cycle(2, [(1, 1, 'ID', False), (2, 2, 'IF', False)])
+      # the second instruction is squashed while the first is still in flight
+      visualizer.add_cycle(3, [(1, 1, 'EX', True), (3, 0, 'IF', False)])
+      assert out.getvalue().count('\n') == 1 # the second row waits for the first
+
+      visualizer.add_cycle(4, [(3, 0, 'ID', False)])
+      visualizer.add_cycle(5, [(3, 0, 'EX', False)]) # after the window
+      assert out.getvalue().split('\n') == [
+         'cycle                  | 1     2     3     4',
+         'I1      BNEZ R1, #0    | IF    ID    stall',
+         'I2      SUB R3, R3, #1 |       IF',
+         'I3      LD R1, 0(R2)   |             IF    ID',
+         ''
+      ]
+
+   def test_cycles_before_window_are_skipped(self):
+      out = io.StringIO()
+      visualizer = TextVisualizer(out, ['IF', 'ID'], 3, 4)
+
+      for cycle in range(1, 5):
+         visualizer.add_cycle(cycle, [(cycle - 1, None, 'ID', False), (cycle, None, 'IF', False)])
+      visualizer.finish()
+
+      assert out.getvalue().split('\n')[1:] == ['I2      | ID', 'I3      | IF    ID', 'I4      |       IF', '']
+
+   @pytest.mark.parametrize('pipeline_core', ['arrays', 'stages'])
+   def test_diagram_matches_trace(self, input_path, tmp_path, pipeline_core):
+      simulate(input_path, tmp_path / 'output.txt', max_cycles='unlimited', pipeline_core=pipeline_core, diagram=tmp_path / 'diagram.txt', diagram_cycles=(5, 20))
+
+      expected = trace_diagram((tmp_path / 'output.txt').read_text(), 5, 20)
+      lines = (tmp_path / 'diagram.txt').read_text().splitlines()
+      assert lines[1].startswith('I1      LD R2, 0(R1)    | MEM1  MEM2')
+      assert lines[5].startswith('I5      SD R3, 2(R1)    |')
+      assert len(lines) == len(expected) + 1
+      for line, (exe_id, stages) in zip(lines[1:], sorted(expected.items())):
+         row = cells(line)
+         assert line.startswith(f"I{exe_id} ")
+         assert {5 + idx // 6: row[idx:idx + 6].strip() for idx in range(0, len(row), 6) if row[idx:idx + 6].strip()} == stages
+
+   def test_binary_trace_diagram_matches_simulation(self, input_path, tmp_path):
+      simulate(input_path, tmp_path / 'trace.bin', max_cycles='unlimited', trace_format='binary', diagram=tmp_path / 'expected.txt', diagram_cycles=(10, 25))
+      render_trace(tmp_path / 'trace.bin', tmp_path / 'diagram.txt', 10, 25)
+
+      expected = (tmp_path / 'expected.txt').read_text().splitlines()
+      diagram = (tmp_path / 'diagram.txt').read_text().splitlines()
+      assert [cells(line) for line in diagram] == [cells(line) for line in expected]
+
+   @pytest.mark.parametrize('value, window', [('5:20', (5, 20)), ('7', (7, 106)), ('1:1', (1, 1))])
+   def test_parse_cycle_window(self, value, window):
+      assert parse_cycle_window(value) == window
+
+   @pytest.mark.parametrize('value', ['0:5', '9:3', 'a:b', '-1', '5:x'])
+   def test_invalid_cycle_window_throws_exception(self, value):
+      with pytest.raises(AssertionError):
+         parse_cycle_window(value)
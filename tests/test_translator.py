@@ -0,0 +1,113 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble
+from simulator.mips_virtualization.impl.mips_stage import MipsStage
+from simulator.mips_virtualization.translator import BlockTranslator, TranslatingSimulator, MAX_BLOCK_LENGTH
+from simulator.lib.generics.register import Register
+from simulator.lib.generics.memory import DictMemory, FlatMemory
+from simulator.lib.generics.vcpu import VCpu
+from simulator.lib.vcpu_simulator import PipelineLogger
+from simulator.lib.functional_simulator import FunctionalSimulator
+from simulator.simulation import simulate
+
+load_use_code = [
+         "LD R2, 0(R1)",
+         "DADD R4, R2, R3",
+         "SD R4, 0(R1)",
+         "BNEZ R4, NEXT",
+         "DADD R2, R1, #8",
+   "NEXT: DADD R1, R1, R3"
+]
+
+memory_loop_code = [
+   "LOOP: LD R2, 0(R1)",
+   "      DADD R2, R2, R3",
+   "      SD R2, 8(R1)",
+   "      SUB R4, R4, R3",
+   "      DADD R1, R1, R3",
+   "      BNEZ R4, LOOP",
+   "      SD R4, (R5)"
+]
+
+overflow_input = f'''
+[registers]
+   R1 = {(1 << 63) - 1}
+   R2 = 1
+
+[memory]
+
+[code]
+   code = """
+      DADD R3, R1, R2
+      SD R3, 0(R0)
+   """
+'''
+
+def run(simulator_cls, code, registers, memory, max_instructions=None, memory_cls=FlatMemory):
+   vcpu = VCpu({reg: Register(value) for reg, value in registers.items()}, memory_cls(992, dict(memory)), 992)
+   logger = PipelineLogger()
+   simulator = simulator_cls(vcpu, list(MipsStage), logger)
+   simulator.load_program(assemble(preprocess(list(code))))
+   status = simulator.simulate(max_instructions)
+   return status, vcpu.register_file, logger.registers, logger.memory, simulator.program.exe_id
+
+class TestBlockTranslator():
+   def test_blocks_split_at_branches_and_targets(self):
+      vcpu = VCpu({}, {}, 992)
+      translator = BlockTranslator(assemble(preprocess(list(load_use_code))), vcpu)
+
+      assert translator.leaders == {0, 4, 5}
+      assert translator.block(0).length == 4
+      assert translator.block(4).length == 1
+      assert translator.block(5).length == 1
+
+   def test_blocks_translated_once(self):
+      vcpu = VCpu({}, {}, 992)
+      translator = BlockTranslator(assemble(preprocess(list(load_use_code))), vcpu)
+
+      assert translator.block(0) is translator.block(0)
+      assert translator.block(6) is None # past the end of the program
+
+   def test_long_blocks_split(self):
+      code = [f"DADD R1, R1, #{i}" for i in range(MAX_BLOCK_LENGTH + 10)]
+      translator = BlockTranslator(assemble(preprocess(code)), VCpu({}, {}, 992))
+
+      assert translator.block(0).length == MAX_BLOCK_LENGTH
+
+class TestTranslatingSimulator():
+   @pytest.mark.parametrize('code, registers, memory', [
+         (load_use_code, {'R1': 16, 'R3': 42}, {16: 60}),
+         (load_use_code, {'R1': 16, 'R3': -60}, {16: 60}),
+         (memory_loop_code, {'R1': 8, 'R3': 1, 'R4': 20, 'R5': 900}, {8: 5})
+      ])
+   @pytest.mark.parametrize('memory_cls', [FlatMemory, DictMemory])
+   def test_state_matches_interpreter(self, code, registers, memory, memory_cls):
+      interpreted = run(FunctionalSimulator, code, registers, memory, memory_cls=memory_cls)
+      translated = run(TranslatingSimulator, code, registers, memory, memory_cls=memory_cls)
+
+      assert translated == interpreted
+
+   @pytest.mark.parametrize('max_instructions', [1, 5, 13, 50])
+   def test_budget_matches_interpreter(self, max_instructions):
+      registers = {'R1': 8, 'R3': 1, 'R4': 20, 'R5': 900}
+      interpreted = run(FunctionalSimulator, memory_loop_code, registers, {}, max_instructions)
+      translated = run(TranslatingSimulator, memory_loop_code, registers, {}, max_instructions)
+
+      assert translated == interpreted
+
+   def test_invalid_store_raises(self):
+      with pytest.raises(AssertionError, match='invalid memory address 2000'):
+         run(TranslatingSimulator, ["SD R1, (R2)"], {'R1': 3, 'R2': 2000}, {})
+
+   @pytest.mark.parametrize('memory_backend', ['flat', 'mmap', 'dict'])
+   def test_store_beyond_64_bits(self, tmp_path, memory_backend):
+      # simulate builds the memory the translator inlines the stores of, unlike run's test imports
+      input_path = tmp_path / 'input.toml'
+      input_path.write_text(overflow_input)
+
+      if memory_backend == 'dict': # unbounded
+         simulate(input_path, tmp_path / 'output.txt', mode='functional', memory_backend=memory_backend)
+         assert (tmp_path / 'output.txt').read_text().endswith(f"MEMORY\n0 {1 << 63}\n")
+      else:
+         with pytest.raises(AssertionError, match=f"{1 << 63} to address 0 does not fit a 64 bit memory word"):
+            simulate(input_path, tmp_path / 'output.txt', mode='functional', memory_backend=memory_backend)
@@ -0,0 +1,58 @@
+import pytest
+
+from simulator.lib.generics.register import Register, PC_INDEX, register_index
+from simulator.lib.generics.operand import RegisterOperand, DisplacementOperand
+from simulator.lib.generics.vcpu import VCpu
+
+vcpu: VCpu = None
+
+@pytest.fixture(autouse=True)
+def vcpu_init():
+   global vcpu
+   vcpu = VCpu({'R5': Register(8), 'R1': Register(16)}, {24: 7}, 99)
+
+class TestRegisterFile():
+   def test_initial_registers_stored_by_index(self):
+      assert vcpu.register_file[5] == 8
+      assert vcpu.register_file[1] == 16
+      assert vcpu.register_file[2] == 0
+
+   def test_pc_has_dedicated_slot(self):
+      vcpu.set_pc(4)
+
+      assert vcpu.register_file[PC_INDEX] == 4
+      assert vcpu.get_pc().value == 4
+      assert vcpu.get_pc_value() == 4
+
+   def test_registers_view_lists_initial_registers_first(self):
+      names = list(vcpu.registers.keys())
+
+      assert names[0:2] == ['R5', 'R1']
+      assert names[2:4] == ['R0', 'R2']
+      assert names[-1] == 'PC'
+      assert len(names) == 33
+
+   def test_registers_view_reflects_writes(self):
+      vcpu.set_register('R3', 42)
+
+      assert vcpu.registers['R3'].value == 42
+      assert vcpu.get_register('R3').value == 42
+
+   def test_unknown_register_raises(self):
+      with pytest.raises(AssertionError):
+         register_index('R32')
+
+class TestIndexResolvedOperands():
+   def test_register_operand_resolves_index(self):
+      operand = RegisterOperand('R7')
+      operand.write(3, vcpu)
+
+      assert operand.register_index == 7
+      assert vcpu.register_file[7] == 3
+      assert operand.read(vcpu) == 3
+
+   def test_displacement_operand_reads_memory_at_register_plus_offset(self):
+      operand = DisplacementOperand('R1', 8)
+
+      assert operand.register_index == 1
+      assert operand.read(vcpu) == 7
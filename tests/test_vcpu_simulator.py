@@ -0,0 +1,193 @@
+import pytest
+
+from simulator.mips_virtualization.assembler import preprocess, assemble
+from simulator.mips_virtualization.impl.mips_stage import build_8_stage_pipeline
+from simulator.lib.generics.register import Register
+from simulator.lib.generics.vcpu import VCpu
+from simulator.lib.vcpu_simulator import VCpuSimulator, PipelineLogger, StreamingPipelineLogger, SimulationStatus
+
+load_use_code = [
+         "LD R2, 0(R1)",
+         "DADD R4, R2, R3",
+         "SD R4, 0(R1)",
+         "BNEZ R4, NEXT",
+         "DADD R2, R1, #8",
+   "NEXT: DADD R1, R1, R3"
+]
+
+loop_code = [
+   "LOOP: SUB R1, R1, R3",
+   "      BNEZ R1, LOOP",
+   "      DADD R5, R3, R2",
+   "      DADD R3, R5, R2"
+]
+
+def build_simulator(code, registers, memory, logger: PipelineLogger = None, **pipeline_args) -> VCpuSimulator:
+   vcpu = VCpu({reg: Register(value) for reg, value in registers.items()}, dict(memory), 992)
+   logger = PipelineLogger() if logger is None else logger
+   simulator = VCpuSimulator(vcpu, build_8_stage_pipeline(**pipeline_args), logger)
+   simulator.load_program(assemble(preprocess(list(code))))
+   return simulator
+
+def run(code, registers, memory, logger: PipelineLogger = None, **pipeline_args) -> PipelineLogger:
+   simulator = build_simulator(code, registers, memory, logger, **pipeline_args)
+   simulator.simulate()
+   return simulator.logger
+
+class TestHazardDetection():
+   @pytest.mark.parametrize('code, registers, memory', [
+         (load_use_code, {'R1': 16, 'R3': 42}, {16: 60}),
+         (loop_code, {'R1': 4, 'R2': 6, 'R3': 2}, {})
+      ])
+   def test_scoreboard_trace_matches_recursive(self, code, registers, memory):
+      recursive = run(code, registers, memory, use_scoreboard=False)
+      scoreboard = run(code, registers, memory, use_scoreboard=True)
+
+      assert scoreboard.logs == recursive.logs
+      assert scoreboard.memory == recursive.memory
+      assert scoreboard.registers == recursive.registers
+
+   def test_load_use_stalls_dependent_instruction(self):
+      logger = run(load_use_code, {'R1': 16, 'R3': 42}, {16: 60})
+
+      assert logger.logs[4] == "c#5 I1-MEM1 I2-stall I3-stall I4-stall \n"
+      assert logger.logs[6] == "c#7 I1-MEM3 I2-EX I3-ID I4-IF2 I5-IF1 \n"
+
+   @pytest.mark.parametrize('use_scoreboard', [True, False])
+   def test_fetch_resumes_after_stall_behind_empty_stages(self, use_scoreboard):
+      # the branch stalls in ID after the last instruction was fetched, leaving IF1 and IF2 empty
+      code = ["LOOP: SUB R4, R4, R5", "LD R2, 0(R1)", "DADD R3, R2, R2", "BNEZ R4, LOOP"]
+      simulator = build_simulator(code, {'R1': 8, 'R4': 2, 'R5': 1}, {8: 5}, use_scoreboard=use_scoreboard)
+      simulator.simulate(max_cycles=None)
+
+      assert simulator.program.completed == 8
+      assert "R4 1\n" not in simulator.logger.registers
+
+class TestStalledStageSkipping():
+   @pytest.mark.parametrize('code, registers, memory', [
+         (load_use_code, {'R1': 16, 'R3': 42}, {16: 60}),
+         (loop_code, {'R1': 4, 'R2': 6, 'R3': 2}, {})
+      ])
+   @pytest.mark.parametrize('use_scoreboard', [True, False])
+   def test_trace_matches_ticking_every_stage(self, code, registers, memory, use_scoreboard):
+      ticked = build_simulator(code, registers, memory, use_scoreboard=use_scoreboard)
+      ticked.skip_stalled_stages = False
+      skipping = build_simulator(code, registers, memory, use_scoreboard=use_scoreboard)
+
+      ticked.simulate()
+      skipping.simulate()
+
+      assert skipping.logger.logs == ticked.logger.logs
+      assert skipping.logger.memory == ticked.logger.memory
+      assert skipping.logger.registers == ticked.logger.registers
+
+   def test_stalled_stages_not_ticked(self):
+      simulator = build_simulator(load_use_code, {'R1': 16, 'R3': 42}, {16: 60}, core='stages')
+      ticks = []
+      first = next(stage for stage in simulator.stages if stage.prev is None)
+      tick = first.tick
+      def counted_tick(program, vcpu):
+         ticks.append(simulator.cycle)
+         tick(program, vcpu)
+      first.tick = counted_tick
+
+      simulator.simulate()
+
+      # I2 stalls in EX for the load in cycle 5, IF1 to ID stay stalled behind it in cycle 6
+      assert 6 not in ticks
+      assert len(ticks) == simulator.cycle - 2
+
+class TestArrayPipeline():
+   @pytest.mark.parametrize('code, registers, memory', [
+         (load_use_code, {'R1': 16, 'R3': 42}, {16: 60}),
+         (loop_code, {'R1': 4, 'R2': 6, 'R3': 2}, {})
+      ])
+   @pytest.mark.parametrize('skip_stalled_stages', [True, False])
+   def test_trace_matches_linked_stages(self, code, registers, memory, skip_stalled_stages):
+      stages = run(code, registers, memory, core='stages')
+      arrays = build_simulator(code, registers, memory, core='arrays')
+      # without skipping the views are ticked one by one instead of the core simulating cycles
+      arrays.skip_stalled_stages = skip_stalled_stages
+
+      arrays.simulate()
+
+      assert arrays.logger.logs == stages.logs
+      assert arrays.logger.memory == stages.memory
+      assert arrays.logger.registers == stages.registers
+
+   def test_views_share_core_state(self):
+      simulator = build_simulator(load_use_code, {'R1': 16, 'R3': 42}, {16: 60}, core='arrays')
+      simulator.simulate(max_cycles=5)
+
+      core = simulator.stages[0].core
+      stages = sorted(simulator.stages, key=lambda stage: stage.slot)
+      assert [stage.stalled for stage in stages] == core.stalled == [True, True, True, True, False, False, False, False]
+      assert [None if stage.instruction is None else stage.instruction.exe_id for stage in stages] == [None, 4, 3, 2, 1, None, None, None]
+
+class TestStreamingPipelineLogger():
+   @pytest.mark.parametrize('chunk_lines', [1, 3, 1024])
+   def test_output_matches_pipeline_logger(self, tmp_path, chunk_lines):
+      expected_path = tmp_path / 'expected.txt'
+      streamed_path = tmp_path / 'streamed.txt'
+      run(loop_code, {'R1': 4, 'R2': 6, 'R3': 2}, {}).write_to_file(expected_path)
+
+      logger = run(loop_code, {'R1': 4, 'R2': 6, 'R3': 2}, {}, StreamingPipelineLogger(streamed_path, chunk_lines))
+      logger.write_to_file(streamed_path)
+
+      assert streamed_path.read_bytes() == expected_path.read_bytes()
+      assert logger.file.closed
+
+   def test_pending_lines_bounded_by_chunk(self, tmp_path):
+      logger = run(loop_code, {'R1': 4, 'R2': 6, 'R3': 2}, {}, StreamingPipelineLogger(tmp_path / 'out.txt', 3))
+
+      assert len(logger.logs) < 3
+      logger.close()
+
+   def test_flush_writes_logged_cycles(self, tmp_path):
+      logger = run(load_use_code, {'R1': 16, 'R3': 42}, {16: 60}, StreamingPipelineLogger(tmp_path / 'out.txt', 1024))
+
+      logger.flush()
+
+      lines = (tmp_path / 'out.txt').read_text().split('\n')
+      assert lines[4] == "c#5 I1-MEM1 I2-stall I3-stall I4-stall "
+      logger.close()
+
+class TestCycleBudget():
+   def test_finished_within_budget(self):
+      simulator = build_simulator(load_use_code, {'R1': 16, 'R3': 42}, {16: 60})
+
+      status = simulator.simulate()
+
+      assert status == SimulationStatus.Finished
+      assert simulator.pipeline_finished()
+
+   def test_budget_exhausted(self):
+      simulator = build_simulator(loop_code, {'R1': 4000, 'R3': 2}, {})
+
+      status = simulator.simulate(max_cycles=100)
+
+      assert status == SimulationStatus.CycleBudgetExhausted
+      assert simulator.logger.logs[-1].startswith("c#100 ")
+      assert not simulator.pipeline_finished()
+
+   def test_unlimited_budget_runs_to_completion(self):
+      simulator = build_simulator(loop_code, {'R1': 4000, 'R3': 2}, {})
+
+      status = simulator.simulate(max_cycles=None)
+
+      assert status == SimulationStatus.Finished
+      assert simulator.vcpu.get_register('R1').value == 0
+
+   def test_timeout(self):
+      simulator = build_simulator(loop_code, {'R1': 1, 'R3': 2}, {})
+
+      status = simulator.simulate(max_cycles=None, timeout=1e-9)
+
+      assert status == SimulationStatus.TimedOut
+
+   def test_squashed_instructions_leave_pipeline(self):
+      simulator = build_simulator(loop_code, {'R1': 4, 'R2': 6, 'R3': 2}, {}, use_scoreboard=False)
+
+      simulator.simulate()
+
+      assert simulator.program.in_flight == 0